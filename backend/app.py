@@ -5,6 +5,7 @@ from flask import Flask, request, jsonify, send_file, Response, stream_with_cont
 import json
 import threading
 import queue
+import time
 import urllib.parse
 from flask_cors import CORS
 from datetime import datetime
@@ -13,15 +14,20 @@ from werkzeug.utils import secure_filename
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from master_agent import MasterAgent
+from master_agent import MasterAgent, RESULT_FIELDS, stages_for
 from utils import CacheManager, RequestValidator, ResponseFormatter, handle_errors
-from config import API_CONFIG, STORAGE_PATHS
+from config import API_CONFIG, STORAGE_PATHS, STREAM_CONFIG
+from response_encoding import FastJSONProvider, compress_response
+from projection import Projection
+from streaming import HEARTBEAT, StreamRegistry, StreamRejected, sse_frame, encode_event
+from mit.batch_scoring import resolve_weights, WEIGHT_PRESETS
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # File upload config
@@ -29,13 +35,32 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
-ALLOWED_EXTENSIONS = {'pdf', 'txt', 'doc', 'docx'}
+ALLOWED_EXTENSIONS = {'pdf', 'txt', 'docx'}  # legacy .doc files cannot be extracted
 
-# Initialize services
-master = MasterAgent()
+# Initialize services (the MasterAgent on first use: extraction workers re-import this module)
+_master = None
+_master_lock = threading.Lock()
 cache = CacheManager(ttl=API_CONFIG.get('CACHE_TTL', 3600))
 validator = RequestValidator()
 formatter = ResponseFormatter()
+streams = StreamRegistry(
+    max_streams=STREAM_CONFIG.get('MAX_STREAMS', 256),
+    ttl=STREAM_CONFIG.get('STREAM_TTL', 300),
+    max_events=STREAM_CONFIG.get('REPLAY_EVENTS', 2048),
+    flush_interval=STREAM_CONFIG.get('TOKEN_FLUSH_MS', 50) / 1000,
+    max_bytes=STREAM_CONFIG.get('TOKEN_FLUSH_BYTES', 1024),
+    max_active=STREAM_CONFIG.get('MAX_ACTIVE_STREAMS', 16),
+    max_queued=STREAM_CONFIG.get('MAX_QUEUED_STREAMS', 32),
+    abandon_after=STREAM_CONFIG.get('ABANDON_SECONDS', 20)
+)
+
+def get_master():
+    """Process-wide MasterAgent (created on first use, never at import)"""
+    global _master
+    with _master_lock:
+        if _master is None:
+            _master = MasterAgent()
+        return _master
 
 # API Version
 API_VERSION = "1.0.0"
@@ -58,6 +83,27 @@ def health():
         "timestamp": datetime.utcnow().isoformat()
     })
 
+def query_fields(projection, required=()):
+    """
+    Top-level result fields a projected query has to compute
+
+    Args:
+        projection: Projection of the request
+        required: Fields the endpoint needs regardless of the projection
+
+    Returns:
+        (fields, variant): the fields to pass to `handle_query` (None when
+        every stage runs anyway) and the cache variant naming them
+    """
+    fields = projection.top_level(RESULT_FIELDS) | set(required)
+    if stages_for(fields) == stages_for(None):
+        return None, None
+    return fields, ",".join(sorted(fields))
+
+def stream_delta(args):
+    """Whether a /stream-query request asked for `$ref` deltas (delta=1)"""
+    return args.get('delta', '').lower() in ('1', 'true', 'yes')
+
 @app.route("/api/v1/query", methods=["POST"])
 @app.route("/query", methods=["POST"])  # Backward compatibility
 @handle_errors
@@ -68,8 +114,14 @@ def query():
     Request body:
     {
         "molecule": "string (required)",
-        "prompt": "string (required)"
+        "prompt": "string (required)",
+        "fields": "mit.innovation_score,fto_analysis (optional, also ?fields=)",
+        "exclude": "patents,trials,mit.patents (optional, also ?exclude=)"
     }
+    
+    With a projection only the pipeline stages the returned fields need
+    are run (e.g. fields=fto_analysis skips the MIT, report and internal
+    summary).
     """
     # Validate request
     data = request.get_json()
@@ -82,26 +134,32 @@ def query():
     molecule = data.get("molecule")
     prompt = data.get("prompt")
     
+    projection = Projection.from_params(data, request.args)
+    unknown = projection.unknown(RESULT_FIELDS)
+    if unknown:
+        return formatter.error(f"Unknown fields: {', '.join(unknown)}", 400)
+    fields, variant = query_fields(projection)
+    
     # Log request
     if API_CONFIG.get('LOG_REQUESTS'):
         logger.info(f"Query received - Molecule: {molecule}, Prompt length: {len(prompt)}")
     
-    # Check cache
+    # Check cache (a full result serves every projection)
     if API_CONFIG.get('CACHE_ENABLED'):
-        cached_result = cache.get(molecule, prompt)
+        cached_result = cache.get(molecule, prompt) or (variant and cache.get(molecule, prompt, variant))
         if cached_result:
-            return formatter.success(cached_result, "Results from cache")
+            return formatter.success(projection.apply(cached_result), "Results from cache")
     
     try:
         # Process query
-        result = master.handle_query(prompt, molecule)
+        result = get_master().handle_query(prompt, molecule, fields=fields)
         
         # Cache result
         if API_CONFIG.get('CACHE_ENABLED'):
-            cache.set(molecule, prompt, result)
+            cache.set(molecule, prompt, result, variant)
         
         logger.info(f"Query successful - Molecule: {molecule}")
-        return formatter.success(result, "Analysis complete")
+        return formatter.success(projection.apply(result), "Analysis complete")
     
     except Exception as e:
         logger.error(f"Query processing error: {str(e)}")
@@ -116,6 +174,10 @@ def get_mit(molecule):
     
     Parameters:
     - molecule: string (required)
+    
+    Query parameters:
+    - fields: paths to return, e.g. innovation_score,highlights (optional)
+    - exclude: paths to leave out, e.g. patents,trials,web (optional)
     """
     # Validate molecule name
     if not validator.validate_molecule_name(molecule):
@@ -123,12 +185,48 @@ def get_mit(molecule):
     
     logger.info(f"MIT retrieval requested - Molecule: {molecule}")
     
-    mit = master.get_mit(molecule)
-    if not mit:
+    projection = Projection.from_params(request.args)
+    mit = get_master().get_mit(molecule, keep=projection.keeps if projection else None)
+    if mit is None:
         logger.warning(f"MIT not found for molecule: {molecule}")
         return formatter.error(f"No MIT found for molecule: {molecule}", 404)
     
-    return formatter.success(mit, f"MIT retrieved for {molecule}")
+    return formatter.success(projection.apply(mit), f"MIT retrieved for {molecule}")
+
+@app.route("/api/v1/mit/<molecule>/similar", methods=["GET"])
+@app.route("/mit/<molecule>/similar", methods=["GET"])
+@handle_errors
+def similar_molecules(molecule):
+    """
+    Find molecules with the most similar MIT profiles (repurposing analogues)
+    
+    Query parameters:
+    - k: number of neighbours (default 5, max 100)
+    - mode: "exact" (default) or "approx"
+    """
+    if not validator.validate_molecule_name(molecule):
+        return formatter.error("Invalid molecule name format", 400)
+    
+    k = int(request.args.get('k', 5))
+    if not 1 <= k <= 100:
+        return formatter.error("k must be between 1 and 100", 400)
+    mode = request.args.get('mode', 'exact')
+    
+    start = time.perf_counter()
+    similar = get_master().find_similar(molecule, k=k, mode=mode)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    
+    if similar is None:
+        return formatter.error(f"No MIT found for molecule: {molecule}", 404)
+    
+    return formatter.success({
+        "molecule": molecule.strip().title(),
+        "k": k,
+        "mode": mode,
+        "similar": similar,
+        "indexed_molecules": len(get_master().similarity_index),
+        "elapsed_ms": elapsed_ms
+    }, f"Similar molecules for {molecule}")
 
 @app.route("/api/v1/report/<molecule>", methods=["GET"])
 @app.route("/report/<molecule>", methods=["GET"])  # Backward compatibility
@@ -147,12 +245,12 @@ def download_report(molecule):
     logger.info(f"Report download requested - Molecule: {molecule}")
     
     try:
-        mit = master.get_mit(molecule)
+        mit = get_master().get_mit(molecule)
         if not mit:
             return formatter.error(f"No MIT found for molecule: {molecule}", 404)
         
         # Generate the PDF
-        pdf_path = master.reporter.generate_pdf_summary(mit)
+        pdf_path = get_master().reporter.generate_pdf_summary(mit)
         
         if not os.path.exists(pdf_path):
             return formatter.error("Failed to generate report", 500)
@@ -173,15 +271,33 @@ def download_report(molecule):
 @app.route("/api/v1/cache/stats", methods=["GET"])
 def cache_stats():
     """Get cache statistics"""
-    return formatter.success(cache.get_stats(), "Cache statistics")
+    stats = cache.get_stats()
+    stats["analysis_memo"] = get_master().analysis_memo.get_stats()
+    stats["llm_responses"] = get_master().llm_cache.get_stats()
+    return formatter.success(stats, "Cache statistics")
 
 @app.route("/api/v1/cache/clear", methods=["POST"])
 def clear_cache():
     """Clear all cached results"""
     cache.clear()
+    get_master().llm_cache.clear()
     logger.info("Cache cleared via API")
     return formatter.success({"cleared": True}, "Cache cleared successfully")
 
+@app.route("/api/v1/llm/stats", methods=["GET"])
+def llm_stats():
+    """LLM client counters and governor queue / quota metrics"""
+    client = get_master().internal.llm
+    stats = {"client": client.stats()}
+    if client.governor is not None:
+        stats["governor"] = client.governor.get_stats()
+    return formatter.success(stats, "LLM statistics")
+
+@app.route("/api/v1/streams/stats", methods=["GET"])
+def stream_stats():
+    """Streaming executor load, rejected / cancelled analyses and replay buffer usage"""
+    return formatter.success(streams.get_stats(), "Stream statistics")
+
 @app.route("/api/v1/agents", methods=["GET"])
 def list_agents():
     """List all available agents"""
@@ -201,7 +317,7 @@ def list_agents():
 @handle_errors
 def debug_trade(molecule):
     """Debug endpoint: return EXIM trade data for molecule"""
-    result = master.exim.fetch_trade(molecule)
+    result = get_master().exim.fetch_trade(molecule)
     return formatter.success(result, f"EXIM trade data for {molecule}")
 
 
@@ -209,7 +325,7 @@ def debug_trade(molecule):
 @handle_errors
 def debug_patents(molecule):
     """Debug endpoint: return patent search results for molecule"""
-    result = master.patent.search_patents(molecule)
+    result = get_master().patent.search_patents(molecule)
     return formatter.success(result, f"Patents for {molecule}")
 
 
@@ -217,7 +333,7 @@ def debug_patents(molecule):
 @handle_errors
 def debug_trials(molecule):
     """Debug endpoint: return clinical trial search results for molecule"""
-    result = master.clinical.search_trials(molecule)
+    result = get_master().clinical.search_trials(molecule)
     return formatter.success(result, f"Clinical trials for {molecule}")
 
 # Error handlers
@@ -254,6 +370,10 @@ def upload_file():
     - multipart/form-data with:
       - file: PDF or document file
       - molecule: (optional) molecule name for context
+    
+    Responds 202 with an extraction job id; text extraction and insight
+    analysis run in a worker process (503 when the extraction queue is full).
+    Content that was extracted before responds 200 with its cached insights.
     """
     # Check if file is in request
     if 'file' not in request.files:
@@ -266,39 +386,109 @@ def upload_file():
         return formatter.error("No file selected", 400)
     
     if not allowed_file(file.filename):
-        return formatter.error("File type not allowed. Allowed: PDF, TXT, DOC, DOCX", 400)
+        return formatter.error("File type not allowed. Allowed: PDF, TXT, DOCX", 400)
     
     try:
-        # Save file
+        # Stream to the content-addressed store (hashed on the way in)
         filename = secure_filename(f"{molecule}_{file.filename}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        content_hash, blob_path, size, created = get_master().pdf_parser.store_upload(
+            file.stream, file.filename, alias=os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        )
         
-        # Parse PDF
-        parsed_insights = master.pdf_parser.parse_pdf(filepath, molecule)
+        # Extract in a worker process (or serve the cached extraction of identical content)
+        try:
+            job = get_master().pdf_parser.submit(blob_path, molecule, filename, content_hash)
+        except RuntimeError as e:
+            return formatter.error(str(e), 503)
         
-        logger.info(f"File uploaded and parsed: {filename}")
-        return formatter.success({
+        data = {
             "filename": filename,
             "molecule": molecule,
-            "insights": parsed_insights
-        }, "File uploaded and analyzed successfully")
+            "job_id": job.job_id,
+            "content_hash": content_hash,
+            "size": size,
+            "duplicate": not created,
+            "status": job.status,
+            "status_url": f"/api/v1/upload/{job.job_id}",
+            "events_url": f"/api/v1/upload/{job.job_id}/events"
+        }
+        if job.finished:
+            data["insights"] = job.insights
+            logger.info(f"File uploaded, extraction served from cache: {filename}")
+            return formatter.success(data, "File uploaded; identical content already analyzed")
+        
+        logger.info(f"File uploaded and queued for extraction: {filename} (job {job.job_id})")
+        return formatter.success(data, "File uploaded; extraction started", 202)
         
     except Exception as e:
         logger.error(f"File upload error: {str(e)}")
         return formatter.error(f"File upload failed: {str(e)}", 500)
 
+@app.route("/api/v1/upload/<job_id>", methods=["GET"])
+@handle_errors
+def get_upload_job(job_id):
+    """Status of a document extraction job (insights once done)"""
+    upload = get_master().pdf_parser.get_upload(job_id)
+    if upload is None:
+        return formatter.error(f"No extraction job {job_id}", 404)
+    return formatter.success(upload, f"Extraction {upload['status']}")
+
+@app.route("/api/v1/upload/<job_id>/events", methods=["GET"])
+def stream_upload_job(job_id):
+    """
+    Server-Sent Events stream of a document extraction
+    
+    Replays the job's events so far (queued, running, started, page, ...)
+    and then follows it until done / error / timeout.
+    """
+    job = get_master().pdf_parser.get_job(job_id)
+    if job is None:
+        return formatter.error(f"No extraction job {job_id}", 404)
+    
+    def event_stream():
+        sent = 0
+        while True:
+            events = job.wait_events(sent, timeout=15)
+            if events:
+                for event in events:
+                    yield f"data: {json.dumps(event)}\n\n"
+                sent += len(events)
+            elif job.finished:
+                break
+            else:
+                yield ": keep-alive\n\n"
+    
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }
+    return Response(stream_with_context(event_stream()), mimetype='text/event-stream', headers=headers)
+
 @app.route("/api/v1/uploads/<molecule>", methods=["GET"])
 @app.route("/uploads/<molecule>", methods=["GET"])
 @handle_errors
 def get_uploads(molecule):
-    """Get upload history for a molecule"""
+    """
+    Get upload history for a molecule, newest first
+    
+    Query parameters:
+    - limit: page size (default 50, max 500)
+    - cursor: next_cursor of the previous page
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+    except ValueError:
+        return formatter.error("limit must be an integer", 400)
+    try:
+        history = get_master().pdf_parser.get_upload_history(molecule, limit=limit, cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return formatter.error(str(e), 400)
     try:
-        uploads = master.pdf_parser.get_upload_history(molecule)
         return formatter.success({
             "molecule": molecule,
-            "uploads": uploads,
-            "total": len(uploads)
+            "uploads": history["uploads"],
+            "next_cursor": history["next_cursor"],
+            "total": history["total"]
         }, f"Upload history for {molecule}")
     except Exception as e:
         logger.error(f"Error retrieving uploads: {str(e)}")
@@ -312,16 +502,10 @@ def get_uploads(molecule):
 def analyze_unmet_needs(molecule):
     """Get unmet needs analysis for a molecule"""
     try:
-        # Get existing MIT data or perform fresh analysis
-        if molecule in master.mit_store:
-            mit = master.mit_store[molecule]
-            unmet_needs = master.unmet_needs_analyzer.analyze_unmet_needs(
-                mit.get('market'),
-                mit.get('trials'),
-                mit.get('patents'),
-                mit.get('web')
-            )
-            summary = master.unmet_needs_analyzer.get_opportunity_summary(unmet_needs)
+        # Memoized on the stored MIT's inputs
+        unmet_needs = get_master().get_unmet_needs(molecule)
+        if unmet_needs is not None:
+            summary = get_master().unmet_needs_analyzer.get_opportunity_summary(unmet_needs)
             
             return formatter.success({
                 "molecule": molecule,
@@ -341,17 +525,18 @@ def analyze_unmet_needs(molecule):
 @app.route("/fto-risk/<molecule>", methods=["GET"])
 @handle_errors
 def assess_fto_risk(molecule):
-    """Get FTO risk assessment for a molecule"""
+    """
+    Get FTO risk assessment for a molecule
+    
+    Query parameters:
+    - use: described use / formulation compared against patent claims
+      (defaults to the prompt of the last query for the molecule)
+    """
     try:
-        # Get existing MIT data
-        if molecule in master.mit_store:
-            mit = master.mit_store[molecule]
-            fto_analysis = master.fto_assessor.assess_fto_risk(
-                molecule,
-                mit.get('patents', []),
-                mit.get('trade')
-            )
-            summary = master.fto_assessor.get_fto_summary(fto_analysis)
+        # Memoized on the stored MIT's inputs (per calendar day)
+        fto_analysis = get_master().get_fto_analysis(molecule, use_description=request.args.get('use') or None)
+        if fto_analysis is not None:
+            summary = get_master().fto_assessor.get_fto_summary(fto_analysis)
             
             return formatter.success({
                 "molecule": molecule,
@@ -377,8 +562,13 @@ def batch_analyze():
     Request body:
     {
         "molecules": ["mol1", "mol2", "mol3"],
-        "prompt": "analysis prompt"
+        "prompt": "analysis prompt",
+        "fields": "fto_analysis.risk_level (optional: adds the projected result per molecule)",
+        "exclude": "... (optional)"
     }
+    
+    Only the stages behind the innovation score (and any projected
+    fields) are run per molecule.
     """
     data = request.get_json()
     molecules = data.get('molecules', [])
@@ -390,15 +580,24 @@ def batch_analyze():
     if len(molecules) > 10:
         return formatter.error("Maximum 10 molecules per batch", 400)
     
+    projection = Projection.from_params(data, request.args)
+    unknown = projection.unknown(RESULT_FIELDS)
+    if unknown:
+        return formatter.error(f"Unknown fields: {', '.join(unknown)}", 400)
+    fields, _ = query_fields(projection, required=("mit",)) if projection else ({"mit"}, None)
+    
     try:
         results = []
         for molecule in molecules:
-            result = master.handle_query(prompt, molecule)
-            results.append({
+            result = get_master().handle_query(prompt, molecule, fields=fields)
+            entry = {
                 "molecule": molecule,
                 "innovation_score": result.get('mit', {}).get('innovation_score', 0),
                 "status": "completed"
-            })
+            }
+            if projection:
+                entry["result"] = projection.apply(result)
+            results.append(entry)
         
         logger.info(f"Batch analysis completed for {len(molecules)} molecules")
         return formatter.success({
@@ -411,62 +610,268 @@ def batch_analyze():
         return formatter.error(f"Batch analysis failed: {str(e)}", 500)
 
 
+# ========== PORTFOLIO SCORING ENDPOINTS ==========
+
+@app.route("/api/v1/portfolio/rank", methods=["GET", "POST"])
+@app.route("/portfolio/rank", methods=["GET", "POST"])
+@handle_errors
+def rank_portfolio():
+    """
+    Re-rank all stored MITs under a new innovation score weighting
+    
+    Query parameters (GET) or request body (POST):
+    {
+        "preset": "default | market_focus | clinical_focus | ip_focus | evidence_focus",
+        "weights": {"points_per_trial": 8, ...},  (POST only, overrides on top of preset)
+        "top": 20
+    }
+    """
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else request.args
+    preset = data.get('preset')
+    weights = data.get('weights') if request.method == "POST" else None
+    top = data.get('top')
+    top = int(top) if top not in (None, '') else None
+    if top is not None and top <= 0:
+        return formatter.error("top must be a positive integer", 400)
+    
+    start = time.perf_counter()
+    rankings = get_master().rank_portfolio(weights=weights, preset=preset, top=top)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    
+    return formatter.success({
+        "preset": preset or "default",
+        "weights": resolve_weights(weights, preset),
+        "available_presets": sorted(WEIGHT_PRESETS),
+        "total_molecules": len(get_master().portfolio_features),
+        "rankings": rankings,
+        "elapsed_ms": elapsed_ms
+    }, "Portfolio re-ranked")
+
+
+@app.route("/api/v1/portfolio/sensitivity", methods=["POST"])
+@app.route("/portfolio/sensitivity", methods=["POST"])
+@handle_errors
+def score_sensitivity():
+    """
+    Rank stability of every stored MIT across a grid of score weightings
+    
+    Request body:
+    {
+        "base_preset": "default",
+        "ranges": {"points_per_trial": [3, 5, 8], "market_high_points": [20, 30, 40]},
+        "presets": ["market_focus", "clinical_focus"],
+        "top_k": 10,
+        "limit": 50
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    top_k = int(data.get('top_k', 10))
+    limit = data.get('limit')
+    
+    start = time.perf_counter()
+    analysis = get_master().analyze_score_sensitivity(
+        ranges=data.get('ranges'),
+        presets=data.get('presets'),
+        base_preset=data.get('base_preset'),
+        top_k=top_k
+    )
+    analysis["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    analysis["total_molecules"] = len(analysis["molecules"])
+    if limit:
+        analysis["molecules"] = analysis["molecules"][:int(limit)]
+    
+    return formatter.success(analysis, "Sensitivity analysis complete")
+
+
+@app.route("/api/v1/portfolio/fto-scan", methods=["POST"])
+@app.route("/portfolio/fto-scan", methods=["POST"])
+@handle_errors
+def portfolio_fto_scan():
+    """
+    FTO risk for every stored MIT (or a subset) in one bulk pass
+    
+    Request body:
+    {
+        "molecules": ["Aspirin", "Metformin"],  (optional, defaults to all stored MITs)
+        "include_analysis": false,  (include the full fto_analysis per molecule)
+        "limit": 50
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    molecules = data.get('molecules')
+    if molecules is not None and not isinstance(molecules, list):
+        return formatter.error("molecules must be a list", 400)
+    include_analysis = bool(data.get('include_analysis', False))
+    limit = data.get('limit')
+    
+    start = time.perf_counter()
+    analyses, missing = get_master().scan_portfolio_fto(molecules)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    
+    results = []
+    risk_levels = {}
+    for molecule, fto_analysis in analyses.items():
+        summary = get_master().fto_assessor.get_fto_summary(fto_analysis)
+        risk_levels[summary["risk_level"]] = risk_levels.get(summary["risk_level"], 0) + 1
+        entry = {
+            "molecule": molecule,
+            "risk_score": summary["risk_score"],
+            "risk_level": summary["risk_level"],
+            "active_threats": summary["active_threats"],
+            "recommendation": summary["recommendation"]
+        }
+        if include_analysis:
+            entry["fto_analysis"] = fto_analysis
+        results.append(entry)
+    results.sort(key=lambda e: -e["risk_score"])
+    if limit:
+        results = results[:int(limit)]
+    
+    return formatter.success({
+        "molecules_scanned": len(analyses),
+        "missing": missing,
+        "risk_levels": risk_levels,
+        "results": results,
+        "elapsed_ms": elapsed_ms
+    }, "Portfolio FTO scan complete")
+
+
+# ========== PATENT EXPIRY ENDPOINTS ==========
+
+@app.route("/api/v1/patents/expiring", methods=["GET"])
+@app.route("/patents/expiring", methods=["GET"])
+@handle_errors
+def patents_expiring():
+    """
+    Patents across all molecules expiring between two dates
+    
+    Query parameters:
+    - start: YYYY-MM-DD (default today)
+    - end: YYYY-MM-DD (required)
+    - active_only: true/false (default true)
+    - limit: maximum patents returned (default 500)
+    """
+    end = request.args.get('end')
+    if not end:
+        return formatter.error("end date is required (YYYY-MM-DD)", 400)
+    start = request.args.get('start') or datetime.utcnow().date()
+    active_only = request.args.get('active_only', 'true').lower() != 'false'
+    limit = int(request.args.get('limit', 500))
+    if limit < 0:
+        return formatter.error("limit must not be negative", 400)
+    
+    result = get_master().patent_index.expiring_between(start, end, active_only=active_only, limit=limit)
+    return formatter.success(result, f"{result['total']} patents expiring")
+
+
+@app.route("/api/v1/portfolio/patent-cliff", methods=["GET"])
+@app.route("/portfolio/patent-cliff", methods=["GET"])
+@handle_errors
+def patent_cliff():
+    """
+    Forecast patent expiry cliffs across the portfolio
+    
+    Query parameters:
+    - horizon_years: forecast horizon (default 5)
+    - granularity: month | quarter | year (default year)
+    - active_only: true/false (default true)
+    - top: molecules listed per bucket (default 10)
+    """
+    horizon_years = float(request.args.get('horizon_years', 5))
+    granularity = request.args.get('granularity', 'year')
+    active_only = request.args.get('active_only', 'true').lower() != 'false'
+    top = int(request.args.get('top', 10))
+    
+    forecast = get_master().patent_index.forecast_cliffs(
+        horizon_years=horizon_years,
+        granularity=granularity,
+        active_only=active_only,
+        top=top
+    )
+    return formatter.success(forecast, "Patent cliff forecast")
+
+
 @app.route("/api/v1/stream-query", methods=["GET"])
 @app.route("/stream-query", methods=["GET"])  # Backward compatibility
 @handle_errors
 def stream_query():
     """Stream partial analysis results using Server-Sent Events (SSE).
 
+    Every analysis runs once and gets a stream id; each event carries an
+    `id: <stream id>:<seq>` line. A reconnecting EventSource sends the last
+    id it saw (Last-Event-ID header) and is served the missed events from
+    the analysis' replay buffer instead of a new pipeline run.
+
+    Analyses run on a bounded executor (503 with Retry-After when it is
+    full) and are cancelled when no client has been connected for
+    STREAM_CONFIG['ABANDON_SECONDS'].
+
     Query parameters:
       - molecule: molecule name
       - prompt: query prompt (URL encoded)
+      - flush_ms: how long LLM token deltas are buffered into one frame
+        (default STREAM_CONFIG['TOKEN_FLUSH_MS']; 0 sends one frame per delta)
+      - last_event_id: resume point for clients that cannot set the
+        Last-Event-ID header
+      - delta: 1 to receive payloads sent by an earlier event as
+        `{"$ref": "<event key>"}` (the MIT's agent payloads, the whole
+        `done` result); see frontend/src/utils/sseReassembly.js
     """
-    molecule = request.args.get('molecule', '')
-    prompt = request.args.get('prompt', '')
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    stream, after = streams.resume(last_event_id) if last_event_id else (None, 0)
 
-    # Simple validation
-    validation_errors = validator.validate_query({"molecule": molecule, "prompt": prompt})
-    if validation_errors:
-        return formatter.validation_error(validation_errors)
+    if stream is None:
+        molecule = request.args.get('molecule', '')
+        prompt = request.args.get('prompt', '')
 
-    q = queue.Queue()
+        # Simple validation
+        validation_errors = validator.validate_query({"molecule": molecule, "prompt": prompt})
+        if validation_errors:
+            return formatter.validation_error(validation_errors)
 
-    def emitter(item):
-        # Ensure JSON serializable
         try:
-            q.put(json.dumps(item))
-        except Exception:
-            q.put(json.dumps({"type": "error", "message": "Failed to serialize event"}))
+            flush_ms = int(request.args.get('flush_ms', STREAM_CONFIG.get('TOKEN_FLUSH_MS', 50)))
+        except ValueError:
+            return formatter.error("flush_ms must be an integer", 400)
+        flush_ms = max(0, min(flush_ms, 1000))
 
-    def worker():
         try:
-            master.handle_query_stream(prompt, molecule, emitter)
-        except Exception as e:
-            emitter({"type": "error", "message": str(e)})
+            stream = streams.start(lambda emit, cancel: get_master().handle_query_stream(prompt, molecule, emit, cancel),
+                                   flush_interval=flush_ms / 1000, delta=stream_delta(request.args))
+        except StreamRejected as e:
+            logger.warning(f"Stream rejected: {str(e)}")
+            response, code = formatter.error("Too many analyses in progress, retry shortly", 503)
+            return response, code, {'Retry-After': str(max(1, STREAM_CONFIG.get('RETRY_MS', 3000) // 1000))}
+    elif stream.finished and after >= stream.last_seq:
+        # Nothing left to send; 204 stops the EventSource from reconnecting
+        return Response(status=204)
+
+    heartbeat = STREAM_CONFIG.get('HEARTBEAT_SECONDS', 15)
+
+    def event_stream(after):
+        # While no reader is attached for ABANDON_SECONDS the analysis is cancelled
+        stream.attach()
+        try:
+            yield f"retry: {STREAM_CONFIG.get('RETRY_MS', 3000)}\n\n"
+            while True:
+                frames, after, missed, done = stream.read(after, timeout=heartbeat)
+                if missed:
+                    yield sse_frame(encode_event({"type": "stream_gap", "missed": missed}))
+                if frames:
+                    yield "".join(frames)
+                elif done:
+                    break
+                else:
+                    yield HEARTBEAT
         finally:
-            # signal done if not already
-            q.put(json.dumps({"type": "__stream_end__"}))
+            stream.detach()
 
-    threading.Thread(target=worker, daemon=True).start()
-
-    def event_stream():
-        # yield events as they arrive
-        while True:
-            item = q.get()
-            if not item:
-                continue
-            try:
-                parsed = json.loads(item)
-            except Exception:
-                parsed = {"type": "error", "message": "malformed"}
-
-            if parsed.get('type') == '__stream_end__':
-                break
-
-            # SSE format: data: <json>\n\n
-            yield f"data: {json.dumps(parsed)}\n\n"
-
-    return Response(stream_with_context(event_stream()), mimetype='text/event-stream')
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'X-Stream-Id': stream.stream_id
+    }
+    return Response(stream_with_context(event_stream(after)), mimetype='text/event-stream', headers=headers)
 
 # Request/Response logging middleware
 @app.before_request
@@ -482,7 +887,13 @@ def log_response(response):
         logger.debug(f"Response: {response.status_code} {request.path}")
     return response
 
+@app.after_request
+def compress(response):
+    """gzip / brotli-compress large JSON and text bodies the client accepts (streams are left alone)"""
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
 if __name__ == "__main__":
     logger.info("Starting Pharma Agentic AI Platform Backend")
+    get_master()
     app.run(debug=True, port=8000)
 
@@ -0,0 +1,292 @@
+"""
+ASGI entry point - asyncio serving path for the agent pipeline
+
+The analysis routes (/query and /stream-query) are served natively on the
+event loop by `AsyncMasterAgent`: a streamed analysis is a task on the
+loop rather than an executor thread, so concurrent streams are bounded by
+STREAM_CONFIG['ASYNC_MAX_ACTIVE_STREAMS'] instead of a thread pool. Their
+JSON and SSE contracts (event ids, Last-Event-ID resume, 204 / 503,
+retry and heartbeats) are the ones of the Flask routes in app.py.
+
+Every other route is served by the Flask app through asgiref's WSGI
+adapter, a thread per request, so one process serves the whole API.
+
+Run with uvicorn (or any other ASGI server):
+    uvicorn asgi_app:app --port 8000
+    python asgi_app.py
+"""
+import asyncio
+import logging
+import threading
+import urllib.parse
+
+import uvicorn
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app, get_master, cache, validator, formatter, query_fields, stream_delta
+from async_master_agent import AsyncMasterAgent
+from config import API_CONFIG, STREAM_CONFIG
+from master_agent import RESULT_FIELDS
+from projection import Projection
+from response_encoding import compress, compressible, negotiate_encoding
+from streaming import HEARTBEAT, AsyncStreamRegistry, StreamRejected, sse_frame, encode_event
+
+logger = logging.getLogger(__name__)
+
+_async_master = None
+_async_master_lock = threading.Lock()
+streams = AsyncStreamRegistry(
+    max_streams=STREAM_CONFIG.get('MAX_STREAMS', 256),
+    ttl=STREAM_CONFIG.get('STREAM_TTL', 300),
+    max_events=STREAM_CONFIG.get('REPLAY_EVENTS', 2048),
+    flush_interval=STREAM_CONFIG.get('TOKEN_FLUSH_MS', 50) / 1000,
+    max_bytes=STREAM_CONFIG.get('TOKEN_FLUSH_BYTES', 1024),
+    max_active=STREAM_CONFIG.get('ASYNC_MAX_ACTIVE_STREAMS', 128),
+    max_queued=STREAM_CONFIG.get('MAX_QUEUED_STREAMS', 32),
+    abandon_after=STREAM_CONFIG.get('ABANDON_SECONDS', 20)
+)
+flask_asgi = WsgiToAsgi(flask_app)
+_wsgi_slots = None
+
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+
+
+def get_async_master():
+    """AsyncMasterAgent over the process-wide MasterAgent (created on first use, never at import)"""
+    global _async_master
+    with _async_master_lock:
+        if _async_master is None:
+            _async_master = AsyncMasterAgent(get_master(), max_workers=STREAM_CONFIG.get('ASYNC_AGENT_THREADS', 8))
+        return _async_master
+
+
+class _Request:
+    """Method, path, query arguments, headers and body of one ASGI HTTP request"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = {k: v[0] for k, v in urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1"),
+                                                                 keep_blank_values=True).items()}
+        self.headers = {}
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").lower()
+            value = value.decode("latin-1")
+            self.headers[name] = f"{self.headers[name]},{value}" if name in self.headers else value
+
+    async def body(self):
+        chunks = []
+        while True:
+            message = await self.receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+
+async def _send_response(send, body=b"", status=200, content_type=None, headers=None, accept_encoding=None):
+    raw_headers = list(CORS_HEADERS)
+    if content_type:
+        raw_headers.append((b"content-type", content_type.encode("latin-1")))
+        if compressible(content_type, len(body)):
+            raw_headers.append((b"vary", b"Accept-Encoding"))
+            encoding = negotiate_encoding(accept_encoding)
+            if encoding is not None:
+                body = compress(body, encoding)
+                raw_headers.append((b"content-encoding", encoding.encode("latin-1")))
+    raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode("latin-1"), str(value).encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(request, send, formatted, headers=None):
+    """Send a ResponseFormatter `(payload, code)` tuple as Flask would (same encoder and compression)"""
+    payload, code = formatted
+    body = flask_app.json.dumps_bytes(payload) + b"\n"
+    await _send_response(send, body, code, "application/json", headers, request.headers.get("accept-encoding"))
+
+
+async def query(request, send):
+    """Native POST /api/v1/query (same contract as `app.query`)"""
+    try:
+        data = flask_app.json.loads(await request.body())
+    except ValueError:
+        data = None
+
+    validation_errors = validator.validate_query(data if isinstance(data, dict) else None)
+    if validation_errors:
+        return await _send_json(request, send, formatter.validation_error(validation_errors))
+
+    molecule = data.get("molecule")
+    prompt = data.get("prompt")
+
+    try:
+        projection = Projection.from_params(data, request.args)
+    except ValueError as e:
+        return await _send_json(request, send, formatter.error(str(e), 400))
+    unknown = projection.unknown(RESULT_FIELDS)
+    if unknown:
+        return await _send_json(request, send, formatter.error(f"Unknown fields: {', '.join(unknown)}", 400))
+    fields, variant = query_fields(projection)
+
+    if API_CONFIG.get('LOG_REQUESTS'):
+        logger.info(f"Query received - Molecule: {molecule}, Prompt length: {len(prompt)}")
+
+    if API_CONFIG.get('CACHE_ENABLED'):
+        cached_result = cache.get(molecule, prompt) or (variant and cache.get(molecule, prompt, variant))
+        if cached_result:
+            return await _send_json(request, send, formatter.success(projection.apply(cached_result),
+                                                                     "Results from cache"))
+
+    try:
+        result = await get_async_master().handle_query(prompt, molecule, fields=fields)
+
+        if API_CONFIG.get('CACHE_ENABLED'):
+            cache.set(molecule, prompt, result, variant)
+
+        logger.info(f"Query successful - Molecule: {molecule}")
+        await _send_json(request, send, formatter.success(projection.apply(result), "Analysis complete"))
+
+    except Exception as e:
+        logger.error(f"Query processing error: {str(e)}")
+        await _send_json(request, send, formatter.error(f"Failed to process query: {str(e)}", 500))
+
+
+async def stream_query(request, send):
+    """Native GET /api/v1/stream-query (same contract as `app.stream_query`)"""
+    last_event_id = request.headers.get('last-event-id') or request.args.get('last_event_id')
+    stream, after = streams.resume(last_event_id) if last_event_id else (None, 0)
+
+    if stream is None:
+        molecule = request.args.get('molecule', '')
+        prompt = request.args.get('prompt', '')
+
+        validation_errors = validator.validate_query({"molecule": molecule, "prompt": prompt})
+        if validation_errors:
+            return await _send_json(request, send, formatter.validation_error(validation_errors))
+
+        try:
+            flush_ms = int(request.args.get('flush_ms', STREAM_CONFIG.get('TOKEN_FLUSH_MS', 50)))
+        except ValueError:
+            return await _send_json(request, send, formatter.error("flush_ms must be an integer", 400))
+        flush_ms = max(0, min(flush_ms, 1000))
+
+        try:
+            stream = streams.start(
+                lambda emit, cancel: get_async_master().handle_query_stream(prompt, molecule, emit, cancel),
+                flush_interval=flush_ms / 1000, delta=stream_delta(request.args)
+            )
+        except StreamRejected as e:
+            logger.warning(f"Stream rejected: {str(e)}")
+            return await _send_json(request, send, formatter.error("Too many analyses in progress, retry shortly", 503),
+                                    {'Retry-After': max(1, STREAM_CONFIG.get('RETRY_MS', 3000) // 1000)})
+    elif stream.finished and after >= stream.last_seq:
+        return await _send_response(send, status=204)
+
+    heartbeat = STREAM_CONFIG.get('HEARTBEAT_SECONDS', 15)
+    await send({"type": "http.response.start", "status": 200, "headers": CORS_HEADERS + [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+        (b"x-stream-id", stream.stream_id.encode("latin-1")),
+    ]})
+
+    async def write(text):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    # While no reader is attached for ABANDON_SECONDS the analysis is cancelled
+    stream.attach()
+    disconnected = asyncio.ensure_future(_cancel_on_disconnect(request.receive, asyncio.current_task()))
+    try:
+        await write(f"retry: {STREAM_CONFIG.get('RETRY_MS', 3000)}\n\n")
+        while True:
+            frames, after, missed, done = await stream.aread(after, timeout=heartbeat)
+            if missed:
+                await write(sse_frame(encode_event({"type": "stream_gap", "missed": missed})))
+            if frames:
+                await write("".join(frames))
+            elif done:
+                break
+            else:
+                await write(HEARTBEAT)
+        await send({"type": "http.response.body", "body": b""})
+    except asyncio.CancelledError:
+        # The client went away; anything else cancelling this request is re-raised
+        if not disconnected.done():
+            raise
+    finally:
+        disconnected.cancel()
+        stream.detach()
+
+
+async def stream_stats(request, send):
+    """Native GET /api/v1/streams/stats for the async registry"""
+    await _send_json(request, send, formatter.success(streams.get_stats(), "Stream statistics"))
+
+
+async def _cancel_on_disconnect(receive, task):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    task.cancel()
+
+
+ROUTES = {
+    ("POST", "/api/v1/query"): query,
+    ("POST", "/query"): query,
+    ("GET", "/api/v1/stream-query"): stream_query,
+    ("GET", "/stream-query"): stream_query,
+    ("GET", "/api/v1/streams/stats"): stream_stats,
+}
+
+
+async def wsgi_bridge(request, send):
+    """
+    Serve a request with the Flask app (asgiref's WSGI adapter)
+
+    Each request gets its own thread (a ThreadSensitiveContext), so a
+    streamed Flask response (e.g. upload job events) holds only its own
+    thread while every chunk is sent as it is produced; at most
+    WSGI_BRIDGE_THREADS requests run at once.
+    """
+    global _wsgi_slots
+    if _wsgi_slots is None:
+        _wsgi_slots = asyncio.Semaphore(STREAM_CONFIG.get('WSGI_BRIDGE_THREADS', 16))
+    async with _wsgi_slots, ThreadSensitiveContext():
+        await flask_asgi(request.scope, request.receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            logger.info("Starting Pharma Agentic AI Platform Backend (ASGI)")
+            get_async_master()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await get_master().internal.llm.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    request = _Request(scope, receive)
+    handler = ROUTES.get((request.method, request.path), wsgi_bridge)
+    if API_CONFIG.get('LOG_REQUESTS'):
+        logger.debug(f"Request: {request.method} {request.path}")
+    await handler(request, send)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, port=8000)
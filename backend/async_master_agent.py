@@ -0,0 +1,277 @@
+"""
+Async Master Agent - asyncio orchestration of the agent pipeline
+
+`AsyncMasterAgent` runs the same analysis as `MasterAgent`, over the same
+agents, stores, memo and caches (it wraps a MasterAgent), as coroutines:
+the independent data agents are fanned out concurrently, the LLM summary
+streams over asyncio connections, and blocking work (file-backed agents,
+MIT scoring, PDF rendering) runs on a bounded thread pool. An analysis
+waiting on I/O therefore holds no thread.
+
+Agents join the async protocol by defining a coroutine `a<method>` next to
+their synchronous method, taking the same arguments plus a `run_blocking`
+keyword for any blocking work (e.g. `InternalInsightsAgent.asummarize_docs`);
+agents without one have their synchronous method run on the pool.
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from master_agent import stages_for
+from streaming import CancelToken, StreamCancelled
+
+logger = logging.getLogger(__name__)
+
+# Independent data agents: result key -> (MasterAgent attribute, method, agent name)
+SOURCE_AGENTS = {
+    "iqvia": ("iqvia", "fetch_market", "IQVIA Market"),
+    "exim": ("exim", "fetch_trade", "EXIM Trade"),
+    "patent": ("patent", "search_patents", "Patent"),
+    "clinical": ("clinical", "search_trials", "Clinical"),
+    "web": ("web", "search", "Web"),
+}
+
+# Result key -> pipeline stage (master_agent.STAGE_DEPENDENCIES)
+SOURCE_STAGES = {"iqvia": "market", "exim": "trade", "patent": "patents", "clinical": "trials", "web": "web"}
+
+
+class AsyncMasterAgent:
+    """Coroutine orchestration over a MasterAgent's worker agents"""
+
+    def __init__(self, master, max_workers=8):
+        """
+        Args:
+            master: MasterAgent whose agents, stores and caches are used
+            max_workers: Threads for blocking agent work
+        """
+        self.master = master
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+
+    async def _blocking(self, func, *args, **kwargs):
+        """Run blocking `func` on the agent pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _call(self, agent, method, *args, agent_name="Unknown", **kwargs):
+        """
+        Call an agent method the async way, with MasterAgent._safe_call's error handling
+
+        Uses the agent's `a<method>` coroutine when it has one, else runs
+        `<method>` on the agent pool.
+
+        Returns:
+            Method result or None if it raised
+        """
+        try:
+            logger.debug(f"Calling {agent_name} agent")
+            native = getattr(agent, f"a{method}", None)
+            if native is not None:
+                result = await native(*args, run_blocking=self._blocking, **kwargs)
+            else:
+                result = await self._blocking(getattr(agent, method), *args, **kwargs)
+            logger.debug(f"{agent_name} agent completed successfully")
+            return result
+        except StreamCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"Error in {agent_name} agent: {str(e)}")
+            return None
+
+    async def _sources(self, molecule, on_result=None, stages=None):
+        """
+        Run the independent data agents concurrently
+
+        Args:
+            molecule: Molecule name
+            on_result: Optional coroutine function `on_result(key, data)`
+                awaited as each agent finishes
+            stages: Optional set of pipeline stages; agents whose stage is
+                not in it are skipped (their result is None)
+
+        Returns:
+            Dict of result key -> agent result
+        """
+        pending = {
+            asyncio.ensure_future(
+                self._call(getattr(self.master, attr), method, molecule, agent_name=name)
+            ): key
+            for key, (attr, method, name) in SOURCE_AGENTS.items()
+            if stages is None or SOURCE_STAGES[key] in stages
+        }
+        results = dict.fromkeys(SOURCE_AGENTS)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = pending.pop(task)
+                    results[key] = task.result()
+                    if on_result is not None:
+                        await on_result(key, results[key])
+        finally:
+            for task in pending:
+                task.cancel()
+        return results
+
+    async def _analyze(self, molecule, prompt, sources, internal, emit=None, cancel=None, stages=None):
+        """MIT, unmet needs, FTO analysis and report, or those of them in `stages` (blocking stages run on the pool)"""
+        master = self.master
+        stages = stages_for(None) if stages is None else stages
+        mit = unmet_needs = fto_analysis = report_path = None
+        market, trade, patents = sources["iqvia"], sources["exim"], sources["patent"]
+        trials, web = sources["clinical"], sources["web"]
+
+        async def stage(message):
+            if emit is not None:
+                cancel.raise_if_cancelled()
+                await emit({"type": "status", "message": message})
+
+        async def publish(kind, data):
+            if emit is not None:
+                await emit({"type": kind, "data": data})
+
+        fingerprints = master._analysis_fingerprints_for(molecule, market, trade, patents, trials, web, internal, prompt)
+
+        if "mit" in stages:
+            await stage("Building MIT profile")
+            mit = await self._blocking(master.mit_builder.build, molecule, market, trade, patents, trials, web,
+                                       internal)
+            await publish("mit", mit)
+
+        if "unmet_needs" in stages:
+            await stage("Analyzing unmet needs")
+            unmet_needs = await self._blocking(master._memo_unmet_needs, fingerprints, molecule, market, trials,
+                                               patents, web, internal)
+            await publish("unmet_needs", unmet_needs)
+
+        if "fto_analysis" in stages:
+            await stage("Assessing FTO risk")
+            fto_analysis = await self._blocking(master._memo_fto, fingerprints, molecule, patents, trade, prompt)
+            await publish("fto", fto_analysis)
+
+        if "mit" in stages:
+            await self._blocking(master._store_mit, molecule, mit, fingerprints)
+
+        if "report" in stages:
+            await stage("Generating report")
+            report_path = await self._call(master.reporter, "generate_pdf_summary", mit,
+                                           agent_name="Report Generation")
+            await publish("report", report_path)
+        return mit, unmet_needs, fto_analysis, report_path
+
+    def _result(self, molecule, sources, internal, analysis, start_time, fields=None):
+        mit, unmet_needs, fto_analysis, report_path = analysis
+        result = {
+            "molecule": molecule,
+            "market": sources["iqvia"] or {},
+            "trade": sources["exim"] or {},
+            "patents": sources["patent"] or [],
+            "trials": sources["clinical"] or [],
+            "web": sources["web"] or {},
+            "internal": internal or {},
+            "mit": mit,
+            "unmet_needs": unmet_needs,
+            "fto_analysis": fto_analysis,
+            "report": report_path,
+            "processing_time_seconds": round(time.time() - start_time, 2),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if fields is not None:
+            result = {key: value for key, value in result.items()
+                      if key in fields or key in ("molecule", "processing_time_seconds", "timestamp")}
+        return result
+
+    def _molecule(self, prompt, molecule):
+        if not molecule:
+            molecule = self.master.extract_molecule(prompt) or "Unknown Molecule"
+        return molecule.strip().title()
+
+    async def handle_query(self, prompt, molecule, fields=None):
+        """
+        Coroutine version of `MasterAgent.handle_query` (same result dict)
+
+        Args:
+            fields: Optional top-level result fields to compute, as in
+                `MasterAgent.handle_query`
+        """
+        start_time = time.time()
+        molecule = self._molecule(prompt, molecule)
+        logger.info(f"Processing query for molecule: {molecule}")
+        stages = stages_for(fields)
+
+        try:
+            sources = await self._sources(molecule, stages=stages)
+            internal = None
+            if "internal" in stages:
+                internal = await self._call(self.master.internal, "summarize_docs", molecule, agent_name="Internal")
+            analysis = await self._analyze(molecule, prompt, sources, internal, stages=stages)
+            result = self._result(molecule, sources, internal, analysis, start_time,
+                                  fields=None if fields is None else stages)
+
+            with self.master._history_lock:
+                self.master.query_history.append({
+                    "molecule": molecule,
+                    "prompt": prompt[:100],
+                    "timestamp": result["timestamp"],
+                    "processing_time": result["processing_time_seconds"]
+                })
+
+            logger.info(f"Query completed for {molecule} in {result['processing_time_seconds']}s")
+            return result
+
+        except Exception as e:
+            logger.error(f"Error processing query for {molecule}: {str(e)}")
+            raise
+
+    async def handle_query_stream(self, prompt, molecule, emit, cancel=None):
+        """
+        Coroutine version of `MasterAgent.handle_query_stream`
+
+        Emits the same events; the data agents run concurrently, so their
+        `agent` events arrive in completion order.
+
+        Args:
+            prompt: User query/prompt
+            molecule: Molecule name to analyze
+            emit: Coroutine function receiving each event dict
+            cancel: Optional CancelToken; checked before every stage and passed
+                to the LLM stream
+
+        Returns:
+            Final result dict (also emitted with type 'done')
+
+        Raises:
+            StreamCancelled: if `cancel` is set before the analysis completes
+        """
+        cancel = cancel or CancelToken()
+        start_time = time.time()
+        molecule = self._molecule(prompt, molecule)
+
+        async def source_done(key, data):
+            cancel.raise_if_cancelled()
+            await emit({"type": "agent", "agent": key, "data": data})
+
+        try:
+            await emit({"type": "status", "message": f"Starting analysis for {molecule}"})
+            sources = await self._sources(molecule, on_result=source_done)
+
+            cancel.raise_if_cancelled()
+            # The internal agent streams LLM tokens through the same emitter
+            internal = await self._call(self.master.internal, "summarize_docs", molecule, emit, "interactive",
+                                        cancel, agent_name="Internal")
+            await emit({"type": "agent", "agent": "internal", "data": internal})
+
+            cancel.raise_if_cancelled()
+            analysis = await self._analyze(molecule, prompt, sources, internal, emit=emit, cancel=cancel)
+
+            result = self._result(molecule, sources, internal, analysis, start_time)
+            await emit({"type": "done", "result": result})
+            return result
+
+        except StreamCancelled:
+            raise
+        except Exception as e:
+            await emit({"type": "error", "message": str(e)})
+            raise
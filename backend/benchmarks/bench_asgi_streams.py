@@ -0,0 +1,183 @@
+"""
+Benchmark: concurrent /stream-query analyses, Flask threads vs ASGI event loop
+
+Starts the bundled LLM stub (slow first token, steady token rate, like a
+hosted model) and opens N concurrent streamed analyses against the real
+pipeline, once through the Flask app (a thread per connection plus an
+executor thread per analysis, as under a threaded WSGI server) and once
+through asgi_app (one event loop; only blocking agent work uses threads).
+Each mode runs in its own process. Reports wall time, time to the done
+event, peak threads and peak RSS.
+
+Usage:
+    python benchmarks/bench_asgi_streams.py [--streams 50 200] [--first-token-ms 500] [--token-ms 20] [--tokens 50]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+QUERY = "molecule=Aspirin&prompt=Summarize%20internal%20evidence%20for%20aspirin"
+
+
+class ThreadPeak:
+    """Samples the process' thread count"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+def setup(base_url, streams):
+    """Point the shared pipeline at the stub (no cache, no governor) and size the registries for N streams"""
+    os.environ["OPENAI_API_KEY"] = "stub"
+    logging.disable(logging.CRITICAL)
+    import app as flask_module
+    import asgi_app
+    from llm_client import LLMClient
+    from streaming import AsyncStreamRegistry, StreamRegistry
+
+    internal = flask_module.get_master().internal
+    internal._llm = LLMClient(base_url, api_key="stub", governor=None, pool_size=streams)
+    internal.response_cache = None
+    flask_module.streams = StreamRegistry(max_active=streams, max_queued=streams)
+    asgi_app.streams = AsyncStreamRegistry(max_active=streams, max_queued=streams)
+    return flask_module, asgi_app
+
+
+def run_flask(flask_module, streams):
+    client = flask_module.app.test_client()
+    done_ms, lock = [], threading.Lock()
+
+    def connection():
+        started = time.perf_counter()
+        response = client.get(f"/api/v1/stream-query?{QUERY}", buffered=False)
+        for chunk in response.response:
+            if b'"type":"done"' in chunk:
+                with lock:
+                    done_ms.append((time.perf_counter() - started) * 1000)
+                break
+        response.close()
+
+    threads = [threading.Thread(target=connection) for _ in range(streams)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return done_ms
+
+
+def run_asgi(asgi_app, streams):
+    done_ms = []
+
+    async def connection():
+        started = time.perf_counter()
+        finished = asyncio.Event()
+        scope = {"type": "http", "method": "GET", "path": "/api/v1/stream-query",
+                 "query_string": QUERY.encode(), "headers": [], "http_version": "1.1"}
+
+        async def receive():
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if b'"type":"done"' in message.get("body", b""):
+                done_ms.append((time.perf_counter() - started) * 1000)
+                finished.set()
+
+        await asgi_app.app(scope, receive, send)
+
+    async def main():
+        await asyncio.gather(*(connection() for _ in range(streams)))
+
+    asyncio.run(main())
+    return done_ms
+
+
+def worker(args):
+    flask_module, asgi_app = setup(args.base_url, args.streams)
+    peak = ThreadPeak()
+    started = time.perf_counter()
+    done_ms = (run_flask if args.worker == "flask" else run_asgi)(
+        flask_module if args.worker == "flask" else asgi_app, args.streams)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "elapsed": elapsed,
+        "done_ms": sorted(done_ms),
+        "threads": peak.stop(),
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask vs ASGI streaming benchmark")
+    parser.add_argument("--streams", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--first-token-ms", type=float, default=500)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--worker", choices=("flask", "asgi"), help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.streams = args.streams[0]
+        return worker(args)
+
+    port = free_port()
+    stub = subprocess.Popen([sys.executable, os.path.join(BACKEND, "llm_stub_server.py"), "--port", str(port),
+                             "--first-token-ms", str(args.first_token_ms), "--token-ms", str(args.token_ms),
+                             "--tokens", str(args.tokens)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        print(f"LLM stub: first token {args.first_token_ms:g} ms, {args.tokens} tokens every {args.token_ms:g} ms")
+        for streams in args.streams:
+            print(f"{streams} concurrent streamed analyses")
+            for mode, label in (("flask", "Flask threads"), ("asgi", "ASGI event loop")):
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", mode,
+                                      "--streams", str(streams), "--base-url", f"http://127.0.0.1:{port}/v1"],
+                                     capture_output=True, text=True, cwd=BACKEND, check=True)
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                done = result["done_ms"]
+                print(f"  {label:<16} {result['elapsed']:6.2f} s  done {len(done):>4}/{streams}  "
+                      f"p50 {done[len(done) // 2]:7.0f} ms  p95 {done[int(len(done) * 0.95)]:7.0f} ms  "
+                      f"peak threads {result['threads']:>4}  peak RSS {result['rss_mb']:6.1f} MB")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
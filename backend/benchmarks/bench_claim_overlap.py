@@ -0,0 +1,106 @@
+"""
+Benchmark: MinHash/LSH claim overlap index
+
+Indexes synthetic patent claims, plants descriptions that overlap one known
+claim each, and reports build, persist/load and query times. Queries through
+the LSH band tables are compared with a linear scan of every signature, and
+recall is the share of planted patents found by the LSH lookup.
+
+Usage:
+    python benchmarks/bench_claim_overlap.py [--claims 300000] [--queries 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from claim_overlap import ClaimIndex, shingle_hashes
+
+CLAIMS_PER_PATENT = 3
+
+
+def make_claims(n_claims, vocab_size=20000, seed=11):
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"term{i}" for i in range(vocab_size)])
+    # Zipf-like word frequencies, as in real claim language
+    weights = 1.0 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+    lengths = rng.integers(25, 80, n_claims)
+    words = rng.choice(vocab, size=int(lengths.sum()), p=weights)
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    return [" ".join(words[bounds[i]:bounds[i + 1]]) for i in range(n_claims)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--bands", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    claims = make_claims(args.claims)
+    patents = [
+        {"patent_id": f"US{20_000_000 + p}", "claims": claims[p * CLAIMS_PER_PATENT:(p + 1) * CLAIMS_PER_PATENT]}
+        for p in range(-(-len(claims) // CLAIMS_PER_PATENT))
+    ]
+
+    # Each query is a contiguous 12-word excerpt of one claim plus a few extra words
+    planted = rng.choice(len(claims), args.queries, replace=False)
+    queries = []
+    for c in planted:
+        words = claims[c].split()
+        start = rng.integers(0, len(words) - 12)
+        queries.append((
+            f"US{20_000_000 + c // CLAIMS_PER_PATENT}",
+            " ".join(words[start:start + 12]) + " extended release oral formulation"
+        ))
+
+    index = ClaimIndex(num_perm=args.num_perm, bands=args.bands)
+    start = time.perf_counter()
+    index.add_patents(patents)
+    index._snapshot()
+    t_build = time.perf_counter() - start
+    print(f"indexed {len(index)} claims of {index.patents} patents in {t_build:.1f}s "
+          f"({t_build / len(index) * 1e6:.0f} us/claim)")
+
+    path = os.path.join(tempfile.mkdtemp(), "claim_index")
+    start = time.perf_counter()
+    index.save(path)
+    t_save = time.perf_counter() - start
+    loaded = ClaimIndex(num_perm=args.num_perm, bands=args.bands)
+    start = time.perf_counter()
+    loaded.load(path)
+    t_load = time.perf_counter() - start
+    print(f"persist: save {t_save:.2f}s, load {t_load:.2f}s ({os.path.getsize(path + '.npz') / 1e6:.0f} MB)")
+
+    found, lsh_times = 0, []
+    for patent_id, text in queries:
+        start = time.perf_counter()
+        matches = loaded.query(text, top=10)
+        lsh_times.append(time.perf_counter() - start)
+        found += any(m["patent_id"] == patent_id for m in matches)
+
+    signatures = loaded._signatures
+    scan_times = []
+    for _, text in queries[:20]:
+        start = time.perf_counter()
+        signature = loaded.hasher.signature(shingle_hashes(text, loaded.shingle_size))
+        scores = (signatures == signature).mean(axis=1)
+        np.argpartition(-scores, 10)[:10]
+        scan_times.append(time.perf_counter() - start)
+
+    lsh_ms = np.array(lsh_times) * 1000
+    print(f"LSH query:   mean {lsh_ms.mean():.2f} ms, p95 {np.percentile(lsh_ms, 95):.2f} ms, "
+          f"recall@10 {found / len(queries):.2f}")
+    print(f"linear scan: mean {np.mean(scan_times) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
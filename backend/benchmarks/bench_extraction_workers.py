@@ -0,0 +1,74 @@
+"""
+Benchmark: extraction worker start-up with app.py as the main script
+
+Every extraction worker re-runs the parent's main script before its
+target. This runs app.py as `__main__` (its server replaced by the
+benchmark), extracts small text documents through a DocumentExtractor in
+a temporary directory and reports the time per document. It exits with
+an error if a worker failed, e.g. because re-running app.py constructed
+a MasterAgent in the worker.
+
+Run from backend/ (the fork server resolves preloaded modules from the
+working directory).
+
+Usage:
+    python benchmarks/bench_extraction_workers.py [--documents 10]
+"""
+import argparse
+import logging
+import os
+import runpy
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+logging.disable(logging.CRITICAL)
+
+import flask
+
+
+def extract(documents):
+    from document_extraction import DocumentExtractor
+    from pdf_parser import extract_insights
+
+    work_dir = tempfile.mkdtemp()
+    extractor = DocumentExtractor(os.path.join(work_dir, "extracted"), analyze=extract_insights, workers=1)
+    samples, failures = [], []
+    for i in range(documents):
+        path = os.path.join(work_dir, f"study_{i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Study {i}: the primary endpoint was met.\nUnmet need remains in elderly patients.\n")
+        started = time.perf_counter()
+        job = extractor.submit(path)
+        while not job.finished:
+            time.sleep(0.002)
+        samples.append((time.perf_counter() - started) * 1000)
+        if job.status != "done":
+            failures.append(job.error)
+    return samples, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction worker start-up benchmark")
+    parser.add_argument("--documents", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {}
+    flask.Flask.run = lambda app, *a, **kw: results.update(zip(("samples", "failures"), extract(args.documents)))
+    sys.argv = [os.path.join(BACKEND, "app.py")]
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+    samples, failures = results["samples"], results["failures"]
+    print(f"{args.documents} text documents, app.py as the main script")
+    print(f"  first document (starts the fork server) {samples[0]:7.1f} ms")
+    print(f"  median of the rest                      {statistics.median(samples[1:] or samples):7.1f} ms")
+    print(f"Failed workers: {len(failures)}" + (f" ({failures[0]})" if failures else ""))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
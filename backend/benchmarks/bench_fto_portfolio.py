@@ -0,0 +1,96 @@
+"""
+Benchmark: portfolio-wide FTO scan vs. per-molecule assessment
+
+Builds a synthetic portfolio where patents are shared between molecules
+(each patent covers several molecules), then compares calling
+FTOAssessor.assess_fto_risk once per molecule with a single
+FTOAssessor.assess_portfolio call, and checks both produce the same
+per-molecule results.
+
+Usage:
+    python benchmarks/bench_fto_portfolio.py [--molecules 10000] [--patents 1000000] [--refs 250]
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fto_assessor import FTOAssessor
+
+STATUSES = ("Active", "Granted", "Expired", "Pending", "In Force")
+OWNERS = ("Pfizer", "Novartis", "Roche", "Merck", "GSK", "Sanofi", "AstraZeneca", "Unknown")
+
+
+def make_portfolio(n_molecules, n_patents, refs_per_molecule, seed=7):
+    rng = np.random.default_rng(seed)
+    base = np.datetime64("2018-01-01")
+    expiry = (base + rng.integers(0, 365 * 20, n_patents)).astype(str)
+    status = rng.integers(0, len(STATUSES), n_patents)
+    owner = rng.integers(0, len(OWNERS), n_patents)
+    claim_sets = [[f"Claim {c}: composition and method of use" for c in range(n)] for n in range(0, 31)]
+    n_claims = rng.integers(0, 31, n_patents)
+
+    patents = [
+        {
+            "patent_id": f"US{10_000_000 + i}",
+            "status": STATUSES[status[i]],
+            "owner": OWNERS[owner[i]],
+            "expiry": expiry[i],
+            "claims": claim_sets[n_claims[i]],
+        }
+        for i in range(n_patents)
+    ]
+
+    counts = rng.integers(1, 2 * refs_per_molecule, n_molecules)
+    portfolio = {}
+    for m in range(n_molecules):
+        picks = rng.integers(0, n_patents, counts[m])
+        portfolio[f"MOL{m:06d}"] = [patents[p] for p in picks]
+    return portfolio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--molecules", type=int, default=10000)
+    parser.add_argument("--patents", type=int, default=1_000_000)
+    parser.add_argument("--refs", type=int, default=250, help="average patents per molecule")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    assessor = FTOAssessor()
+    today = datetime.now()
+
+    start = time.perf_counter()
+    portfolio = make_portfolio(args.molecules, args.patents, args.refs)
+    n_refs = sum(len(p) for p in portfolio.values())
+    print(f"portfolio: {args.molecules} molecules, {args.patents} patents, {n_refs} references "
+          f"({time.perf_counter() - start:.1f}s to generate)")
+    # Keep the generated portfolio out of cyclic GC passes so both runs pay the same
+    gc.collect()
+    gc.freeze()
+
+    start = time.perf_counter()
+    single = {m: assessor.assess_fto_risk(m, patents, today=today) for m, patents in portfolio.items()}
+    t_single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk = assessor.assess_portfolio(portfolio, today=today)
+    t_bulk = time.perf_counter() - start
+
+    mismatches = [m for m in portfolio if single[m] != bulk[m]]
+    print(f"per-molecule assess_fto_risk: {t_single:8.2f}s")
+    print(f"assess_portfolio:             {t_bulk:8.2f}s  ({t_single / t_bulk:.1f}x)")
+    print(f"identical results: {len(portfolio) - len(mismatches)}/{len(portfolio)}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
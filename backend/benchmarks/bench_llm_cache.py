@@ -0,0 +1,94 @@
+"""
+Benchmark: LLM response cache on a repeated summary workload
+
+Streams internal-summary prompts for a skewed (Zipf) mix of molecules
+through the bundled stub server, once without and once with the
+LLMResponseCache, and reports wall time, time to first token, LLM calls
+made and tokens saved. A share of the prompts differ only in
+formatting, which the semantic lookup matches.
+
+Usage:
+    python benchmarks/bench_llm_cache.py [--requests 200] [--molecules 40] [--first-token-ms 100]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_cache import LLMResponseCache
+from llm_client import LLMClient
+from llm_stub_server import StubLLMServer
+
+SYSTEM = "You are an internal R&D assistant. Summarize internal documents."
+
+
+def workload(requests, molecules, seed=3):
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(molecules)]
+    for _ in range(requests):
+        mol = rng.choices(range(molecules), weights)[0]
+        context = f"[1] trial_{mol}.pdf p.2: molecule {mol} met its primary endpoint with fewer adverse events"
+        # Some callers send the same request with different capitalisation / spacing
+        name = f"MOL{mol:03d}" if rng.random() < 0.8 else f"mol{mol:03d} "
+        yield mol, [context], [{"role": "system", "content": SYSTEM},
+                    {"role": "user", "content": f"Summarize internal documents for {name}.\n\n{context}"}]
+
+
+def run(client, cache, args):
+    first_tokens, calls = [], 0
+    started = time.perf_counter()
+    for mol, context, messages in workload(args.requests, args.molecules):
+        t0 = time.perf_counter()
+        hit = cache.lookup(client.model, messages, scope=mol, context=context) if cache else None
+        stream = cache.replay(hit) if hit else client.stream_chat(messages)
+        tokens = []
+        for token in stream:
+            if not tokens:
+                first_tokens.append((time.perf_counter() - t0) * 1000)
+            tokens.append(token)
+        if hit is None:
+            calls += 1
+            if cache:
+                cache.store(client.model, messages, tokens, scope=mol, context=context,
+                            latency_ms=(time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    first_tokens.sort()
+    return elapsed, calls, first_tokens[len(first_tokens) // 2], first_tokens[int(len(first_tokens) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM response cache benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--molecules", type=int, default=40)
+    parser.add_argument("--first-token-ms", type=float, default=100)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    args = parser.parse_args()
+
+    server = StubLLMServer(first_token_ms=args.first_token_ms, token_ms=args.token_ms, tokens=args.tokens)
+    client = LLMClient(server.start(), api_key="stub")
+    try:
+        print(f"{args.requests} summaries over {args.molecules} molecules (Zipf), "
+              f"{args.tokens} tokens, first token after {args.first_token_ms} ms")
+        for label, cache in (("no cache", None),
+                             ("exact", LLMResponseCache()),
+                             ("semantic", LLMResponseCache(semantic_threshold=args.threshold))):
+            elapsed, calls, p50, p95 = run(client, cache, args)
+            line = (f"  {label:<9} {elapsed:6.2f} s  LLM calls {calls:>4}  "
+                    f"ttft p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+            if cache:
+                stats = cache.get_stats()
+                line += (f"  hit rate {stats['hit_rate']:.1%}  saved tokens {stats['saved_tokens']}  "
+                         f"latency avoided {stats['latency_avoided_ms'] / 1000:.1f} s")
+            print(line)
+    finally:
+        client.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: pooled, retrying LLM client vs a fresh requests.post per call
+
+Runs the bundled OpenAI-compatible stub server locally and streams chat
+completions through (a) one `requests.post(..., stream=True)` per call,
+as InternalInsightsAgent used to, and (b) the shared `LLMClient`. Reports
+call latency, time to first token and connections opened, then repeats
+both with injected 429/503 failures to show the success rate with and
+without retries. No network access or API key is needed.
+
+Usage:
+    python benchmarks/bench_llm_client.py [--calls 200] [--threads 4] [--first-token-ms 5] [--fail-rate 0.2]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import LLMClient, LLMError
+from llm_stub_server import StubLLMServer
+
+MESSAGES = [{"role": "user", "content": "Summarize internal documents for aspirin."}]
+
+
+def naive_call(base_url):
+    """The previous per-call code path: new connection, no retry"""
+    started = time.perf_counter()
+    first = None
+    with requests.post(f"{base_url}/chat/completions", json={"model": "stub", "messages": MESSAGES, "stream": True},
+                       headers={"Authorization": "Bearer stub"}, stream=True, timeout=120) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            if first is None and json.loads(data)["choices"][0]["delta"].get("content"):
+                first = time.perf_counter()
+    return first - started, time.perf_counter() - started
+
+
+def pooled_call(client):
+    started = time.perf_counter()
+    first = None
+    for _ in client.stream_chat(MESSAGES):
+        if first is None:
+            first = time.perf_counter()
+    return first - started, time.perf_counter() - started
+
+
+def run(server, call, calls, threads):
+    before = dict(server.counters)
+    results, errors = [], [0]
+    lock = threading.Lock()
+    per_thread = calls // threads
+
+    def worker():
+        for _ in range(per_thread):
+            try:
+                timing = call()
+            except (requests.RequestException, LLMError):
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                results.append(timing)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    ttft = sorted(r[0] * 1000 for r in results)
+    total = sorted(r[1] * 1000 for r in results)
+    pct = lambda values, q: values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+    return {
+        "ok": len(results),
+        "failed": errors[0],
+        "calls_per_s": len(results) / elapsed,
+        "ttft_p50": pct(ttft, 0.5),
+        "ttft_p95": pct(ttft, 0.95),
+        "total_mean": statistics.fmean(total) if total else float('nan'),
+        "connections": server.counters["connections"] - before["connections"],
+        "attempts": server.counters["requests"] - before["requests"],
+    }
+
+
+def report(label, r):
+    print(f"  {label:<8} ok {r['ok']:>4}  failed {r['failed']:>3}  {r['calls_per_s']:7.1f} calls/s  "
+          f"ttft p50 {r['ttft_p50']:6.2f} ms  p95 {r['ttft_p95']:6.2f} ms  "
+          f"call {r['total_mean']:6.2f} ms  connections {r['connections']:>4}  attempts {r['attempts']:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled LLM client benchmark")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--first-token-ms", type=float, default=5)
+    parser.add_argument("--token-ms", type=float, default=0.2)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = StubLLMServer(first_token_ms=args.first_token_ms, token_ms=args.token_ms, tokens=args.tokens, seed=7)
+    base_url = server.start()
+    client = LLMClient(base_url, api_key="stub", pool_size=args.threads, backoff_base=0.01, backoff_max=0.1)
+    try:
+        print(f"{args.calls} streamed calls, {args.threads} threads, {args.tokens} tokens, "
+              f"first token after {args.first_token_ms} ms")
+        report("naive", run(server, lambda: naive_call(base_url), args.calls, args.threads))
+        report("pooled", run(server, lambda: pooled_call(client), args.calls, args.threads))
+
+        server.fail_rate = args.fail_rate
+        print(f"\nwith {args.fail_rate:.0%} injected 429/503 responses")
+        report("naive", run(server, lambda: naive_call(base_url), args.calls, args.threads))
+        report("pooled", run(server, lambda: pooled_call(client), args.calls, args.threads))
+        print(f"\nclient stats: {client.stats()}")
+    finally:
+        client.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: LLM governor under a burst of concurrent streams
+
+Runs the bundled stub server with a provider-style quota (requests per
+minute and concurrent requests) and fires a burst of streamed calls from
+many threads, a share of them in the batch lane. Without a governor,
+every thread retries on its own and the provider answers with 429
+storms; with the governor set just under the provider's quota, calls queue
+locally, interactive ones first. Reports 429s received, failed calls,
+wall time and queue wait per lane.
+
+Usage:
+    python benchmarks/bench_llm_governor.py [--calls 120] [--threads 24] [--rpm 1200] [--provider-concurrency 6]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import LLMClient, LLMError
+from llm_governor import LLMGovernor
+from llm_stub_server import StubLLMServer
+
+MESSAGES = [{"role": "user", "content": "Summarize internal documents for aspirin."}]
+
+
+def run(client, calls, threads, batch_share, seed=5):
+    rng = random.Random(seed)
+    lanes = ["batch" if rng.random() < batch_share else "interactive" for _ in range(calls)]
+    latencies = {"interactive": [], "batch": []}
+    failed = [0]
+    lock = threading.Lock()
+    next_call = iter(range(calls))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(next_call, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                for _ in client.stream_chat(MESSAGES, lane=lanes[i]):
+                    pass
+            except LLMError:
+                with lock:
+                    failed[0] += 1
+                continue
+            with lock:
+                latencies[lanes[i]].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started, failed[0], latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM governor benchmark")
+    parser.add_argument("--calls", type=int, default=120)
+    parser.add_argument("--threads", type=int, default=24)
+    parser.add_argument("--rpm", type=int, default=1200, help="provider requests per minute")
+    parser.add_argument("--provider-concurrency", type=int, default=6)
+    parser.add_argument("--headroom", type=float, default=0.95, help="governor quota as a share of the provider's")
+    parser.add_argument("--batch-share", type=float, default=0.5)
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    parser.add_argument("--tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{args.calls} streamed calls from {args.threads} threads ({args.batch_share:.0%} batch); "
+          f"provider quota {args.rpm} req/min, {args.provider_concurrency} concurrent")
+    for label in ("ungoverned", "governed"):
+        server = StubLLMServer(first_token_ms=args.first_token_ms, token_ms=2, tokens=args.tokens,
+                               requests_per_min=args.rpm, max_concurrent=args.provider_concurrency)
+        governor = None
+        if label == "governed":
+            governor = LLMGovernor(requests_per_min=int(args.rpm * args.headroom),
+                                   max_concurrent=args.provider_concurrency, queue_timeout=120, burst_seconds=1)
+        client = LLMClient(server.start(), api_key="stub", pool_size=args.threads, max_retries=3,
+                           backoff_base=0.05, backoff_max=1.0, governor=governor)
+        try:
+            elapsed, failed, latencies = run(client, args.calls, args.threads, args.batch_share)
+        finally:
+            client.close()
+            server.stop()
+        print(f"\n  {label}: {elapsed:5.2f} s  failed {failed:>3}  429s from provider "
+              f"{server.counters['rate_limited']:>4}  client retries {client.stats()['retries']:>4}")
+        for lane, values in latencies.items():
+            values.sort()
+            if values:
+                print(f"    {lane:<11} ok {len(values):>4}  call p50 {values[len(values) // 2]:8.1f} ms  "
+                      f"p95 {values[int(len(values) * 0.95)]:8.1f} ms")
+        if governor:
+            for lane, stats in governor.get_stats()["lanes"].items():
+                print(f"    {lane:<11} queue wait mean {stats['wait_ms_mean']:8.1f} ms  "
+                      f"p95 {stats['wait_ms_p95']:8.1f} ms  max {stats['wait_ms_max']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
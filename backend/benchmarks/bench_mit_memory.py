@@ -0,0 +1,102 @@
+"""
+Benchmark: bytes per stored MIT profile, plain frozen dicts vs compact records
+
+Profiles are built with the real worker agents (mock data), so the web and
+internal placeholder payloads are included as they are in production.
+Memory is measured under tracemalloc; put and get times are measured in a
+separate untraced pass. Compact reads are timed with the rendered-snapshot
+cache disabled (every read renders) and for a hot set that fits the cache.
+
+Usage:
+    python benchmarks/bench_mit_memory.py [--molecules 100000]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mit.mit_store import MITStore
+
+
+def build_profiles(n):
+    from master_agent import MasterAgent
+
+    logging.disable(logging.CRITICAL)
+    master = MasterAgent()
+    # Agent payloads for an unknown molecule are the defaults; fetch them once
+    # and substitute the molecule name the way the agents do.
+    for i in range(n):
+        molecule = f"Molecule{i:06d}"
+        yield master.mit_builder.build(
+            molecule,
+            master.iqvia.fetch_market(molecule),
+            master.exim.fetch_trade(molecule),
+            master.patent.search_patents(molecule),
+            master.clinical.search_trials(molecule),
+            master.web.search(molecule),
+            master.internal.summarize_docs(molecule),
+        )
+
+
+def timed(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def measure(store, profiles):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for profile in profiles:
+        store.put(profile["molecule"], profile)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--molecules", type=int, default=100_000)
+    args = parser.parse_args()
+
+    profiles = list(build_profiles(args.molecules))
+
+    plain, compact = MITStore(), MITStore(compact=True)
+    plain_bytes = measure(plain, profiles)
+    compact_bytes = measure(compact, profiles)
+
+    for profile in profiles[:: max(1, len(profiles) // 100)]:
+        molecule = profile["molecule"]
+        assert json.dumps(compact.get(molecule)) == json.dumps(profile) == json.dumps(plain.get(molecule))
+
+    n = args.molecules
+    print(f"molecules={n}")
+    print(f"frozen dicts   : {plain_bytes / n:8.0f} bytes/profile")
+    print(f"compact records: {compact_bytes / n:8.0f} bytes/profile")
+    print(f"reduction      : {1 - compact_bytes / plain_bytes:.1%}")
+    print(f"pool           : {compact.pool.get_stats()}")
+
+    sample = profiles[:10_000]
+    molecules = [profile["molecule"] for profile in sample]
+    hot = molecules[-compact.decoded_cache_size:]
+    uncached = MITStore(compact=True, decoded_cache_size=0)
+    print("untraced, us per call:")
+    print(f"  put  frozen {timed(lambda p: plain.put(p['molecule'], p), sample):6.1f}   "
+          f"compact {timed(lambda p: uncached.put(p['molecule'], p), sample):6.1f}   "
+          f"compact+cache {timed(lambda p: compact.put(p['molecule'], p), sample):6.1f}")
+    print(f"  get  frozen {timed(plain.get, molecules):6.1f}   "
+          f"compact {timed(uncached.get, molecules):6.1f}   "
+          f"compact+cache (hot {len(hot)}) {timed(compact.get, hot * (len(molecules) // len(hot))):6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: MIT store read throughput under concurrent writes
+
+Compares the lock-striped copy-on-write MITStore with a dict guarded by a
+single global lock (readers and writers both lock, writers copy under the
+lock), while one writer thread continuously re-stores profiles.
+
+Usage:
+    python benchmarks/bench_mit_store.py [--molecules 10000] [--seconds 2]
+"""
+import argparse
+import copy
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mit.mit_store import MITStore
+
+
+class GlobalLockStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def put(self, molecule, profile):
+        with self._lock:
+            self._data[molecule] = copy.deepcopy(profile)
+
+    def get(self, molecule, default=None):
+        with self._lock:
+            return self._data.get(molecule, default)
+
+
+def make_profile(i):
+    return {
+        "molecule": f"MOL{i:06d}",
+        "market": {"market_size": 1e8 + i, "cagr": 5.5},
+        "patents": [{"patent_id": f"US{i}{j}", "status": "active", "expiry": "2030-01-01"} for j in range(3)],
+        "trials": [{"trial_id": f"NCT{i}{j}", "phase": "Phase II"} for j in range(3)],
+        "web": {"top_papers": [{"title": f"Paper {j}"} for j in range(3)]},
+        "highlights": ["a", "b", "c"],
+        "innovation_score": 55,
+    }
+
+
+def run(store, molecules, profiles, readers, seconds):
+    stop = threading.Event()
+    counts = [0] * readers
+
+    def reader(slot):
+        n = 0
+        idx = slot
+        while not stop.is_set():
+            for _ in range(256):
+                store.get(molecules[idx % len(molecules)])
+                idx += 7
+            n += 256
+        counts[slot] = n
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            store.put(molecules[i % len(molecules)], profiles[i % len(profiles)])
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(r,)) for r in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--molecules", type=int, default=10_000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    molecules = [f"MOL{i:06d}" for i in range(args.molecules)]
+    profiles = [make_profile(i) for i in range(64)]
+
+    print(f"{'readers':>8} {'MITStore reads/s':>18} {'global lock reads/s':>20}")
+    for readers in args.readers:
+        results = []
+        for store in (MITStore(), GlobalLockStore()):
+            for i, molecule in enumerate(molecules):
+                store.put(molecule, profiles[i % len(profiles)])
+            results.append(run(store, molecules, profiles, readers, args.seconds))
+        print(f"{readers:>8} {results[0]:>18,.0f} {results[1]:>20,.0f}")
+
+
+if __name__ == "__main__":
+    main()
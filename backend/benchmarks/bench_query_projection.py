@@ -0,0 +1,87 @@
+"""
+Benchmark: /query payload size and latency with field projection
+
+Runs POST /api/v1/query through the Flask test client (cache disabled)
+for the full result and for projected requests, and reports response
+bytes, median time per request and the pipeline stages that ran. The
+report stage sleeps `--report-ms` to stand in for PDF rendering, and the
+internal summary `--internal-ms` for an LLM call, so skipped stages show
+up in the latency.
+
+Usage:
+    python benchmarks/bench_query_projection.py [--repeat 20] [--report-ms 150] [--internal-ms 300]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as flask_module
+from config import API_CONFIG
+
+CASES = (
+    ("full result", None),
+    ("fields=fto_analysis", "fields=fto_analysis"),
+    ("fields=mit.innovation_score", "fields=mit.innovation_score"),
+    ("exclude=patents,trials,web,mit", "exclude=patents,trials,web,mit"),
+)
+
+
+def instrument(master, args):
+    """Record which stages run, with stand-in costs for the report and the internal summary"""
+    ran = set()
+
+    def wrap(owner, name, stage, delay_ms=0):
+        func = getattr(owner, name)
+
+        def wrapper(*a, **kw):
+            ran.add(stage)
+            time.sleep(delay_ms / 1000)
+            return func(*a, **kw)
+        setattr(owner, name, wrapper)
+
+    wrap(master.reporter, "generate_pdf_summary", "report", args.report_ms)
+    wrap(master.internal, "summarize_docs", "internal", args.internal_ms)
+    wrap(master.mit_builder, "build", "mit")
+    wrap(master.patent, "search_patents", "patents")
+    wrap(master.clinical, "search_trials", "trials")
+    return ran
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query projection benchmark")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--report-ms", type=float, default=150)
+    parser.add_argument("--internal-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    API_CONFIG['CACHE_ENABLED'] = False
+    ran = instrument(flask_module.get_master(), args)
+    client = flask_module.app.test_client()
+    body = {"molecule": "Aspirin", "prompt": "Assess freedom to operate for aspirin"}
+
+    print(f"POST /api/v1/query, median of {args.repeat} (report {args.report_ms:g} ms, "
+          f"internal summary {args.internal_ms:g} ms)")
+    baseline = None
+    for label, params in CASES:
+        samples, size = [], 0
+        ran.clear()
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.post(f"/api/v1/query?{params or ''}", json=body)
+            samples.append((time.perf_counter() - start) * 1000)
+            size = len(response.get_data())
+        ms = statistics.median(samples)
+        baseline = baseline or (ms, size)
+        print(f"  {label:<32} {size:>7} bytes ({size / baseline[1]:6.1%})  {ms:7.1f} ms  "
+              f"{baseline[0] / ms:4.1f}x  ran: {', '.join(sorted(ran)) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
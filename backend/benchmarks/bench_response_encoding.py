@@ -0,0 +1,107 @@
+"""
+Benchmark: JSON serialization and compression of a large /query response
+
+Builds a real `handle_query` result and grows its patent, trial and web
+lists to the sizes of a well-covered molecule (the lists are shared with
+`mit`, as in the pipeline). Reports serialization time per response for
+Flask's default provider and for `response_encoding.JSONEncoder` with
+each installed encoder, with and without encoding the shared sub-objects
+once, and bytes on the wire (and compression time) per content coding.
+
+Usage:
+    python benchmarks/bench_response_encoding.py [--patents 2000] [--trials 1000] [--web 200] [--repeat 50]
+"""
+import argparse
+import copy
+import gzip
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from master_agent import MasterAgent
+from response_encoding import ENCODERS, JSONEncoder, brotli
+from utils import ResponseFormatter
+
+
+def grow(items, size, key):
+    """`size` copies of the example items with distinct ids"""
+    grown = []
+    for i in range(size):
+        item = copy.deepcopy(items[i % len(items)]) if items else {}
+        item[key] = f"{item.get(key, 'ID')}-{i}"
+        grown.append(item)
+    return grown
+
+
+def build_response(args):
+    result = MasterAgent().handle_query("Full landscape analysis", "Aspirin")
+    mit = result["mit"]
+    for name, size, key in (("patents", args.patents, "patent_id"), ("trials", args.trials, "trial_id")):
+        result[name] = mit[name] = grow(result[name], size, key)
+    web = result["web"]
+    for name, value in list(web.items()):
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            web[name] = grow(value, args.web, "url")
+    payload, _ = ResponseFormatter.success(result, "Analysis complete")
+    return payload
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response encoding benchmark")
+    parser.add_argument("--patents", type=int, default=2000)
+    parser.add_argument("--trials", type=int, default=1000)
+    parser.add_argument("--web", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    payload = build_response(args)
+    flask_default = DefaultJSONProvider(Flask(__name__))
+    encoders = [("Flask default (json, sorted)", lambda: flask_default.dumps(payload, separators=(",", ":")).encode())]
+    for name in ENCODERS:
+        for label, depth in (("", 0), (" + shared once", 3)):
+            encoder = JSONEncoder(name, default=flask_default.default, shared_depth=depth)
+            encoders.append((f"{name}{label}", lambda e=encoder: e.dumps(payload)))
+
+    print(f"/query response: {args.patents} patents, {args.trials} trials, {args.web} web results per list")
+    print("Serialization (median per response)")
+    baseline, body = None, None
+    for label, encode in encoders:
+        ms, out = timed(encode, args.repeat)
+        baseline = baseline or ms
+        body = body or out
+        print(f"  {label:<30} {ms:8.2f} ms  {baseline / ms:5.1f}x  {len(out):>9} bytes")
+
+    print("Bytes on the wire")
+    codings = [("identity", lambda: body)]
+    codings += [(f"gzip -{level}", lambda level=level: gzip.compress(body, compresslevel=level, mtime=0))
+                for level in (1, 6)]
+    if brotli is not None:
+        codings += [(f"br q{quality}", lambda quality=quality: brotli.compress(body, quality=quality))
+                    for quality in (4, 6)]
+    else:
+        print("  (brotli not installed: br skipped)")
+    for label, encode in codings:
+        ms, out = timed(encode, max(5, args.repeat // 5))
+        print(f"  {label:<10} {len(out):>9} bytes  {len(out) / len(body):6.1%}  {ms:7.2f} ms to compress")
+
+
+if __name__ == "__main__":
+    main()
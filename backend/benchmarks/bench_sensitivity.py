@@ -0,0 +1,76 @@
+"""
+Benchmark: innovation score sensitivity analysis (molecules x weight settings)
+
+Usage:
+    python benchmarks/bench_sensitivity.py [--molecules 10000] [--values 10]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from mit.innovation_score import compute_innovation_score
+from mit.batch_scoring import resolve_weights, score_features
+from mit.sensitivity import analyze_sensitivity, build_weight_grid
+
+
+def make_features(n, seed=7):
+    rng = np.random.default_rng(seed)
+    return {
+        "market_size": rng.choice([5e7, 2e8, 8e8, 1.5e9, 4e9], size=n),
+        "trials": rng.integers(0, 10, size=n).astype(np.float64),
+        "expired_patents": rng.integers(0, 6, size=n).astype(np.float64),
+        "papers": rng.integers(0, 5, size=n).astype(np.float64),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--molecules", type=int, default=10_000)
+    parser.add_argument("--values", type=int, default=10, help="candidate values per weight (3 weights varied)")
+    args = parser.parse_args()
+
+    features = make_features(args.molecules)
+    molecules = [f"MOL{i:06d}" for i in range(args.molecules)]
+    ranges = {
+        "market_high_points": list(np.linspace(15, 45, args.values)),
+        "points_per_trial": list(np.linspace(2, 10, args.values)),
+        "points_per_expired_patent": list(np.linspace(2, 10, args.values)),
+    }
+    grid = build_weight_grid(ranges=ranges)
+    settings = len(grid["max_score"])
+
+    start = time.perf_counter()
+    analyze_sensitivity(molecules, features, grid)
+    vectorized = time.perf_counter() - start
+
+    # Scalar reference: a Python loop over settings for a small sample
+    sample = 10
+    profiles = [
+        {
+            "market": {"market_size": features["market_size"][i]},
+            "trials": [{}] * int(features["trials"][i]),
+            "patents": [{"status": "expired"}] * int(features["expired_patents"][i]),
+            "web": {"top_papers": [{}] * int(features["papers"][i])},
+        }
+        for i in range(args.molecules)
+    ]
+    start = time.perf_counter()
+    for _ in range(sample):
+        [compute_innovation_score(p) for p in profiles]
+    loop_per_setting = (time.perf_counter() - start) / sample
+
+    default_scores = score_features(features, resolve_weights())
+    assert [int(s) for s in default_scores] == [compute_innovation_score(p) for p in profiles]
+
+    print(f"molecules={args.molecules} settings={settings} cells={args.molecules * settings:,}")
+    print(f"vectorized sensitivity: {vectorized:.3f}s")
+    print(f"python loop (extrapolated): {loop_per_setting * settings:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: "similar molecules" index - build time, query latency and approximate recall
+
+Usage:
+    python benchmarks/bench_similarity.py [--molecules 100000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mit.similarity import ProfileVectorizer, SimilarityIndex
+from unmet_needs_analyzer import UnmetNeedsAnalyzer
+
+PHASES = ["Phase I", "Phase II", "Phase III", "Phase IV"]
+TOPICS = ["cancer", "diabetes", "asthma", "hypertension", "infection", "alzheimer", "crohn", "obesity"]
+
+
+def make_profile(rng):
+    return {
+        "market": {"market_size": rng.choice([5e7, 2e8, 8e8, 1.5e9, 4e9]) * rng.random(), "cagr": rng.uniform(0, 12)},
+        "trials": [
+            {"phase": rng.choice(PHASES), "title": f"Study in {rng.choice(TOPICS)}"}
+            for _ in range(rng.randint(0, 6))
+        ],
+        "patents": [{"status": rng.choice(["active", "expired", "pending"])} for _ in range(rng.randint(0, 5))],
+        "web": {"top_papers": [{"title": f"Review of {rng.choice(TOPICS)}"} for _ in range(rng.randint(0, 3))]},
+        "trade": {"imports": rng.uniform(0, 1e7), "exports": rng.uniform(0, 1e7)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--molecules", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    index = SimilarityIndex(ProfileVectorizer(UnmetNeedsAnalyzer().therapy_keywords))
+
+    start = time.perf_counter()
+    for i in range(args.molecules):
+        index.upsert(f"MOL{i:06d}", make_profile(rng))
+    build = time.perf_counter() - start
+
+    queries = [f"MOL{rng.randrange(args.molecules):06d}" for _ in range(args.queries)]
+    timings = {}
+    results = {}
+    for mode in ("exact", "approx"):
+        start = time.perf_counter()
+        results[mode] = [index.similar(q, k=args.k, mode=mode) for q in queries]
+        timings[mode] = (time.perf_counter() - start) / len(queries) * 1000
+
+    recall = []
+    for exact, approx in zip(results["exact"], results["approx"]):
+        truth = {r["molecule"] for r in exact}
+        recall.append(len(truth & {r["molecule"] for r in approx}) / max(len(truth), 1))
+
+    print(f"molecules={args.molecules} build={build:.1f}s ({build / args.molecules * 1e6:.0f}us/upsert)")
+    print(f"exact  query: {timings['exact']:.2f} ms")
+    print(f"approx query: {timings['approx']:.2f} ms  recall@{args.k}={sum(recall) / len(recall):.3f}")
+
+
+if __name__ == "__main__":
+    main()
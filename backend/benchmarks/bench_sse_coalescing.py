@@ -0,0 +1,150 @@
+"""
+Benchmark: SSE framing of streamed answers, per-token vs coalesced
+
+Replays a streamed answer (agent events plus LLM token deltas arriving
+at a fixed rate) through the previous /stream-query path (json.dumps in
+the emitter, json.loads + json.dumps in the response generator, one
+frame per event) and through an AnalysisStream (events serialized once
+into the replay buffer) with and without token micro-batching. Reports frames, frames/sec, bytes and the CPU spent
+emitting and framing events per answer (thread CPU time, excluding the
+simulated token pacing).
+
+Usage:
+    python benchmarks/bench_sse_coalescing.py [--tokens 600] [--rate 400] [--answers 5] [--flush-ms 50]
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import AnalysisStream
+
+AGENT_EVENT = {"type": "agent", "agent": "clinical",
+               "data": [{"trial_id": f"NCT0{i:07d}", "phase": "Phase II", "status": "Recruiting",
+                         "title": "Study of aspirin in secondary prevention"} for i in range(20)]}
+
+
+def produce(emit, tokens, rate, cpu):
+    """
+    Agent events, then `tokens` deltas at `rate` per second (0: as fast as
+    possible), then done; adds the CPU spent inside `emit` to cpu[0]
+    """
+    def timed(event):
+        t = time.thread_time()
+        emit(event)
+        cpu[0] += time.thread_time() - t
+
+    for _ in range(5):
+        timed(AGENT_EVENT)
+    interval = 1.0 / rate if rate else 0.0
+    start = time.perf_counter()
+    for i in range(tokens):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        timed({"type": "llm_token", "data": " token" if i else "Token"})
+    timed({"type": "done", "result": {"molecule": "Aspirin", "internal": {"summary_source": "streamed_llm"}}})
+
+
+def legacy(tokens, rate, cpu):
+    q = queue.Queue()
+
+    def emitter(item):
+        q.put(json.dumps(item))
+
+    def worker():
+        produce(emitter, tokens, rate, cpu)
+        q.put(json.dumps({"type": "__stream_end__"}))
+
+    def event_stream():
+        while True:
+            parsed = json.loads(q.get())
+            if parsed.get('type') == '__stream_end__':
+                break
+            yield f"data: {json.dumps(parsed)}\n\n"
+
+    producer = threading.Thread(target=worker)
+    producer.start()
+    frames = size = 0
+    for chunk in consume(event_stream(), cpu):
+        frames += chunk.count("\n\n")
+        size += len(chunk)
+    producer.join()
+    return frames, size
+
+
+def coalesced(tokens, rate, flush_ms, cpu):
+    stream = AnalysisStream("bench", max_events=100000, flush_interval=flush_ms / 1000)
+
+    def worker():
+        produce(stream.emit, tokens, rate, cpu)
+        stream.finish()
+
+    def event_stream():
+        after = 0
+        while True:
+            frames, after, _, done = stream.read(after)
+            if frames:
+                yield "".join(frames)
+            elif done:
+                return
+
+    producer = threading.Thread(target=worker)
+    producer.start()
+    frames = size = 0
+    for chunk in consume(event_stream(), cpu):
+        frames += chunk.count("\n\n")
+        size += len(chunk)
+    producer.join()
+    return frames, size
+
+
+def consume(chunks, cpu):
+    """Iterate a response generator, adding the CPU it uses to cpu[0] (time blocked on the queue is free)"""
+    chunks = iter(chunks)
+    while True:
+        t = time.thread_time()
+        chunk = next(chunks, None)
+        cpu[0] += time.thread_time() - t
+        if chunk is None:
+            return
+        yield chunk
+
+
+def measure(label, run, answers):
+    cpu = [0.0]
+    wall0 = time.perf_counter()
+    frames = size = 0
+    for _ in range(answers):
+        f, b = run(cpu)
+        frames += f
+        size += b
+    cpu, wall = cpu[0], time.perf_counter() - wall0
+    print(f"  {label:<22} frames/answer {frames / answers:7.0f}  frames/s {frames / wall:8.0f}  "
+          f"KB/answer {size / answers / 1024:6.1f}  CPU/answer {cpu / answers * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE token coalescing benchmark")
+    parser.add_argument("--tokens", type=int, default=600)
+    parser.add_argument("--rate", type=float, default=400, help="token deltas per second (0: unthrottled)")
+    parser.add_argument("--answers", type=int, default=5)
+    parser.add_argument("--flush-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    for rate in (args.rate, 0):
+        print(f"{args.tokens} token deltas per answer at {f'{rate:.0f}/s' if rate else 'full speed'}")
+        measure("per-token (previous)", lambda cpu: legacy(args.tokens, rate, cpu), args.answers)
+        measure("serialize once", lambda cpu: coalesced(args.tokens, rate, 0, cpu), args.answers)
+        measure(f"coalesced {args.flush_ms:g} ms",
+                lambda cpu: coalesced(args.tokens, rate, args.flush_ms, cpu), args.answers)
+
+
+if __name__ == "__main__":
+    main()
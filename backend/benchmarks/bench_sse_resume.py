@@ -0,0 +1,102 @@
+"""
+Benchmark: reconnecting to a streamed analysis, restart vs resume
+
+Runs a synthetic analysis (agent stages with fixed latencies, then a
+streamed LLM summary) through a StreamRegistry. A client reads part of
+the stream, drops the connection and reconnects. The previous
+/stream-query behaviour starts the whole analysis again on reconnect (and
+the abandoned run keeps going); with replay buffers the reconnect sends
+Last-Event-ID and is served from the buffer. Reports time from reconnect
+to the done event, pipeline runs started and events delivered twice.
+
+Usage:
+    python benchmarks/bench_sse_resume.py [--clients 20] [--stage-ms 150] [--tokens 200] [--drop-after 4]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import StreamRegistry
+
+STAGES = ("clinical", "patent", "market", "trade", "internal")
+
+
+def pipeline(emit, cancel, stage_ms, tokens, token_ms, runs):
+    with runs[1]:
+        runs[0] += 1
+    for stage in STAGES:
+        time.sleep(stage_ms / 1000)
+        emit({"type": "agent", "agent": stage, "data": {"items": list(range(20))}})
+    for i in range(tokens):
+        time.sleep(token_ms / 1000)
+        emit({"type": "llm_token", "data": " token"})
+    emit({"type": "done", "result": {"molecule": "Aspirin"}})
+
+
+def read_until(stream, after, stop):
+    """Read frames from `after` until `stop(event)` is true; returns (last seq, events read)"""
+    events = 0
+    while True:
+        frames, after, _, done = stream.read(after, timeout=5)
+        for frame in frames:
+            events += 1
+            event = json.loads(frame.split("data: ", 1)[1])
+            if stop(event):
+                return int(frame.split("\n", 1)[0].rsplit(":", 1)[1]), events
+        if done:
+            return after, events
+
+
+def client(registry, args, resume, runs, results, lock):
+    run = lambda emit, cancel: pipeline(emit, cancel, args.stage_ms, args.tokens, args.token_ms, runs)
+    stream = registry.start(run)
+    agents = [0]
+
+    def dropped(event):
+        agents[0] += event["type"] == "agent"
+        return agents[0] >= args.drop_after
+    seq, first = read_until(stream, 0, dropped)
+
+    started = time.perf_counter()
+    if resume:
+        stream, seq = registry.resume(f"{stream.stream_id}:{seq}")
+    else:
+        stream, seq = registry.start(run), 0
+    _, second = read_until(stream, seq, lambda event: event["type"] == "done")
+    with lock:
+        results.append(((time.perf_counter() - started) * 1000, first + second - stream.last_seq))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE reconnect benchmark")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--stage-ms", type=float, default=150)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--drop-after", type=int, default=4, help="agent events read before the connection drops")
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {len(STAGES)} stages of {args.stage_ms:g} ms + {args.tokens} tokens, "
+          f"connection dropped after {args.drop_after} agent events")
+    for label, resume in (("restart (previous)", False), ("resume from buffer", True)):
+        registry = StreamRegistry(max_active=args.clients * 2)
+        runs, results, lock = [0, threading.Lock()], [], threading.Lock()
+        threads = [threading.Thread(target=client, args=(registry, args, resume, runs, results, lock))
+                   for _ in range(args.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        latencies = sorted(ms for ms, _ in results)
+        print(f"  {label:<20} reconnect->done p50 {latencies[len(latencies) // 2]:8.1f} ms  "
+              f"max {latencies[-1]:8.1f} ms  pipeline runs {runs[0]:>4}  "
+              f"events sent twice {sum(dup for _, dup in results) / len(results):5.1f}/client")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark: bytes per /stream-query stream, full events vs `$ref` deltas
+
+Streams the real pipeline through the Flask test client with the patent,
+trial and web results grown to the sizes of a well-covered molecule, once
+as before and once with delta=1, and reports bytes per stream and for
+the `mit` and `done` frames. The delta stream is reassembled with
+`streaming.reassemble` and checked against the full `done` result.
+
+Usage:
+    python benchmarks/bench_stream_deltas.py [--patents 200] [--trials 100] [--web 50] [--repeat 5]
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.CRITICAL)
+
+import app as flask_module
+from streaming import reassemble
+
+VOLATILE = ("processing_time_seconds", "timestamp", "report", "metadata")
+
+
+def grow(items, size, key):
+    """`size` copies of the example items with distinct ids"""
+    grown = []
+    for i in range(size):
+        item = copy.deepcopy(items[i % len(items)]) if items else {}
+        item[key] = f"{item.get(key, 'ID')}-{i}"
+        grown.append(item)
+    return grown
+
+
+def scale_agents(master, args):
+    """Make the patent, clinical and web agents return larger results"""
+    search_patents, search_trials, search = master.patent.search_patents, master.clinical.search_trials, master.web.search
+
+    def patents(molecule, *a, **kw):
+        return grow(search_patents(molecule, *a, **kw) or [], args.patents, "patent_id")
+
+    def trials(molecule, *a, **kw):
+        return grow(search_trials(molecule, *a, **kw) or [], args.trials, "trial_id")
+
+    def web(molecule, *a, **kw):
+        result = dict(search(molecule, *a, **kw) or {})
+        for name, value in list(result.items()):
+            if isinstance(value, list) and value and isinstance(value[0], dict):
+                result[name] = grow(value, args.web, "url")
+        return result
+
+    master.patent.search_patents, master.clinical.search_trials, master.web.search = patents, trials, web
+
+
+def stream(client, delta):
+    started = time.perf_counter()
+    body = client.get(f"/api/v1/stream-query?molecule=Aspirin&prompt=Landscape%20review&delta={int(delta)}").get_data()
+    elapsed = (time.perf_counter() - started) * 1000
+    frames = [frame for frame in body.decode("utf-8").split("\n\n") if "data: " in frame]
+    events = [json.loads(frame.split("data: ", 1)[1]) for frame in frames]
+    sizes = {event["type"]: len(frame.encode("utf-8")) for event, frame in zip(events, frames)}
+    return len(body), sizes, events, elapsed
+
+
+def stable(result):
+    result = {key: value for key, value in result.items() if key not in VOLATILE}
+    if isinstance(result.get("mit"), dict):
+        result["mit"] = stable(result["mit"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream delta benchmark")
+    parser.add_argument("--patents", type=int, default=200)
+    parser.add_argument("--trials", type=int, default=100)
+    parser.add_argument("--web", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    scale_agents(flask_module.get_master(), args)
+    client = flask_module.app.test_client()
+
+    print(f"/stream-query: {args.patents} patents, {args.trials} trials, {args.web} web results per list")
+    baseline, results = None, {}
+    for label, delta in (("full events", False), ("delta=1 ($ref)", True)):
+        runs = [stream(client, delta) for _ in range(args.repeat)]
+        size, sizes, events, _ = runs[-1]
+        ms = statistics.median(run[3] for run in runs)
+        baseline = baseline or size
+        results[delta] = events
+        print(f"  {label:<16} {size:>9} bytes/stream ({size / baseline:6.1%})  mit frame {sizes.get('mit', 0):>8}  "
+              f"done frame {sizes.get('done', 0):>8}  {ms:7.1f} ms")
+
+    full = next(event for event in results[False] if event["type"] == "done")["result"]
+    events, missing = reassemble(results[True])
+    rebuilt = next(event for event in events if event["type"] == "done")["result"]
+    print(f"Reassembled delta result matches: {stable(full) == stable(rebuilt)} (unresolved refs: {missing or 'none'})")
+
+
+if __name__ == "__main__":
+    main()
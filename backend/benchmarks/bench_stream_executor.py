@@ -0,0 +1,175 @@
+"""
+Benchmark: streaming query executor under a burst with disconnecting clients
+
+Fires a burst of streamed analyses (agent stages with fixed latencies,
+then an LLM token stream) where a share of the clients disconnect after
+the first stage. The previous /stream-query model starts one thread per
+request and runs every pipeline to the end; the StreamRegistry runs them
+on a bounded executor, rejects the overflow and cancels analyses whose
+client went away. Reports peak pipelines running at once, stage work
+executed (and how much of it nobody read), rejections and time to done
+for the clients that stayed.
+
+Usage:
+    python benchmarks/bench_stream_executor.py [--requests 200] [--rate 50] [--disconnect 0.5] [--max-active 32] [--stage-ms 100]
+"""
+import argparse
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import StreamRegistry, StreamRejected
+
+STAGES = 6
+
+
+class Work:
+    """Stage work done by pipelines and peak pipelines running at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = 0
+        self.wasted = 0
+        self.running = 0
+        self.peak = 0
+
+    def enter(self, delta):
+        with self.lock:
+            self.running += delta
+            self.peak = max(self.peak, self.running)
+
+    def stage(self, wasted):
+        with self.lock:
+            self.stages += 1
+            self.wasted += wasted
+
+
+def pipeline(emit, cancel, args, work, gone):
+    work.enter(1)
+    try:
+        stages(emit, cancel, args, work, gone)
+    finally:
+        work.enter(-1)
+
+
+def stages(emit, cancel, args, work, gone):
+    for stage in range(STAGES):
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        time.sleep(args.stage_ms / 1000)
+        work.stage(gone.is_set())
+        emit({"type": "agent", "agent": f"stage{stage}", "data": {"items": list(range(20))}})
+    for _ in range(args.tokens):
+        time.sleep(0.002)
+        emit({"type": "llm_token", "data": " token"})
+    emit({"type": "done"})
+
+
+def legacy(args, plan, work):
+    """Thread per request, unbounded queue, no cancellation"""
+    done_ms, workers = [], []
+
+    def request(leaves):
+        started = time.perf_counter()
+        q, gone = queue.Queue(), threading.Event()
+        worker = threading.Thread(target=pipeline, args=(q.put, None, args, work, gone), daemon=True)
+        workers.append(worker)
+        worker.start()
+        while True:
+            event = q.get()
+            if leaves and event["type"] == "agent":
+                gone.set()
+                return
+            if event["type"] == "done":
+                done_ms.append((time.perf_counter() - started) * 1000)
+                return
+
+    elapsed = run_clients(plan, request, args.rate)
+    # Abandoned pipelines keep running after their clients left
+    for worker in workers:
+        worker.join()
+    return elapsed, done_ms, None
+
+
+def bounded(args, plan, work):
+    registry = StreamRegistry(max_active=args.max_active, max_queued=args.max_queued,
+                              abandon_after=args.abandon_ms / 1000)
+    done_ms = []
+
+    def request(leaves):
+        started = time.perf_counter()
+        gone = threading.Event()
+        try:
+            stream = registry.start(lambda emit, cancel: pipeline(emit, cancel, args, work, gone))
+        except StreamRejected:
+            return
+        stream.attach()
+        try:
+            after = 0
+            while True:
+                frames, after, _, finished = stream.read(after, timeout=5)
+                if leaves and any('"agent"' in f for f in frames):
+                    gone.set()
+                    return
+                if finished or any('"done"' in f for f in frames):
+                    done_ms.append((time.perf_counter() - started) * 1000)
+                    return
+        finally:
+            stream.detach()
+
+    elapsed = run_clients(plan, request, args.rate)
+    # Let abandoned analyses notice they were cancelled
+    while registry.get_stats()["active"]:
+        time.sleep(0.05)
+    return elapsed, done_ms, registry.get_stats()
+
+
+def run_clients(plan, request, rate):
+    started = time.perf_counter()
+    clients = [threading.Thread(target=request, args=(leaves,)) for leaves in plan]
+    for i, c in enumerate(clients):
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        c.start()
+    for c in clients:
+        c.join()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming executor benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50, help="client arrivals per second")
+    parser.add_argument("--disconnect", type=float, default=0.5, help="share of clients leaving after the first stage")
+    parser.add_argument("--max-active", type=int, default=32)
+    parser.add_argument("--max-queued", type=int, default=64)
+    parser.add_argument("--abandon-ms", type=float, default=200)
+    parser.add_argument("--stage-ms", type=float, default=100)
+    parser.add_argument("--tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    plan = [rng.random() < args.disconnect for _ in range(args.requests)]
+    print(f"{args.requests} streamed analyses at {args.rate:g}/s, "
+          f"{sum(plan)} clients disconnect after the first stage")
+    for label, run in (("thread per request", legacy), ("bounded executor", bounded)):
+        work = Work()
+        elapsed, done_ms, stats = run(args, plan, work)
+        done_ms.sort()
+        line = (f"  {label:<19} {elapsed:5.2f} s  peak pipelines {work.peak:>4}  "
+                f"stages run {work.stages:>5} (unread {work.wasted:>4})  completed {len(done_ms):>4}")
+        if done_ms:
+            line += f"  done p50 {done_ms[len(done_ms) // 2]:7.0f} ms"
+        if stats:
+            line += f"  rejected {stats['rejected']:>3}  cancelled {stats['cancelled']:>3}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
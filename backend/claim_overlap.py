@@ -0,0 +1,386 @@
+"""
+Claim Overlap Engine - MinHash/LSH similarity between patent claims and a described use
+"""
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime 2^31 - 1: (a * x + b) stays below 2^63 for 32-bit x, so uint64 never overflows
+MERSENNE_PRIME = (1 << 31) - 1
+_EMPTY = np.uint32(MERSENNE_PRIME)
+
+# Multiplier used to fold a band's rows into one uint64 bucket key (wraps mod 2^64)
+_BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# Rolling combination of token hashes into shingle hashes (kept to 32 bits)
+_SHINGLE_MULTIPLIER = np.uint64(1000003)
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Boilerplate that appears in almost every claim and carries no overlap signal
+STOPWORDS = frozenset({
+    "a", "an", "the", "of", "and", "or", "in", "to", "for", "with", "by", "on", "at", "from",
+    "is", "are", "be", "as", "that", "which", "wherein", "whereby", "said", "claim", "claims",
+    "according", "comprising", "comprises", "consisting", "thereof", "least", "one", "any",
+})
+
+# Number of shingles hashed per MinHash chunk (bounds the temporary matrix size)
+_CHUNK_SHINGLES = 65536
+
+_SNIPPET_LENGTH = 160
+
+DEFAULT_SHINGLE_SIZE = 2
+
+
+def claim_texts(claims):
+    """Claim strings of a patent (claims may be strings or {"text": ...} dicts)"""
+    texts = []
+    for claim in claims or ():
+        if isinstance(claim, dict):
+            claim = claim.get('text')
+        if isinstance(claim, str) and claim.strip():
+            texts.append(claim)
+    return texts
+
+
+@lru_cache(maxsize=1 << 18)
+def _token_hash(token):
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _shingle_values(text, shingle_size):
+    """32-bit hashes of a text's word shingles, in text order (may repeat)"""
+    tokens = [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+    hashes = np.fromiter(map(_token_hash, tokens), dtype=np.uint64, count=len(tokens))
+    if len(hashes) < shingle_size:
+        return hashes
+    n = len(hashes) - shingle_size + 1
+    combined = hashes[:n]
+    for k in range(1, shingle_size):
+        combined = (combined * _SHINGLE_MULTIPLIER + hashes[k:k + n]) & _MASK32
+    return combined
+
+
+def shingle_hashes(text, shingle_size=DEFAULT_SHINGLE_SIZE):
+    """
+    Hash the word shingles of a text
+
+    Args:
+        text: Claim or use description text
+        shingle_size: Words per shingle (short texts fall back to single words)
+
+    Returns:
+        Sorted uint64 array of distinct 32-bit shingle hashes
+    """
+    return np.unique(_shingle_values(text, shingle_size))
+
+
+def claim_containment(description, claims, shingle_size=DEFAULT_SHINGLE_SIZE):
+    """
+    Exact share of a description's shingles found in the best-matching claim
+
+    Used for patents that are not in the claim index.
+
+    Returns:
+        Containment in [0, 1], or None if there is no comparable text
+    """
+    query = shingle_hashes(description, shingle_size)
+    texts = claim_texts(claims)
+    if not len(query) or not texts:
+        return None
+    return max(
+        len(np.intersect1d(query, shingle_hashes(text, shingle_size), assume_unique=True)) / len(query)
+        for text in texts
+    )
+
+
+def _distinct_counts(hash_sets):
+    """Number of distinct hashes in each set, computed for the whole batch at once"""
+    lengths = np.fromiter(map(len, hash_sets), dtype=np.int64, count=len(hash_sets))
+    if not lengths.sum():
+        return np.zeros(len(hash_sets), dtype=np.int32)
+    owner = np.repeat(np.arange(len(hash_sets), dtype=np.uint64), lengths)
+    pairs = np.sort((owner << np.uint64(32)) | np.concatenate(hash_sets))
+    pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+    return np.bincount((pairs >> np.uint64(32)).astype(np.int64), minlength=len(hash_sets)).astype(np.int32)
+
+
+class MinHasher:
+    """MinHash signatures using (a * x + b) mod 2^31 - 1 permutations"""
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signatures(self, hash_sets):
+        """
+        MinHash signatures of many shingle sets at once
+
+        Args:
+            hash_sets: List of uint64 shingle hash arrays (repeats are allowed)
+
+        Returns:
+            (len(hash_sets), num_perm) uint32 array; empty sets get all-max rows
+        """
+        out = np.full((len(hash_sets), self.num_perm), _EMPTY, dtype=np.uint32)
+        lengths = np.fromiter(map(len, hash_sets), dtype=np.int64, count=len(hash_sets))
+        rows = np.nonzero(lengths)[0]
+        if not len(rows):
+            return out
+        values = np.concatenate([hash_sets[i] for i in rows])
+        ends = np.cumsum(lengths[rows])
+        starts = ends - lengths[rows]
+
+        # Chunks of whole sets with a bounded number of shingles
+        first = 0
+        while first < len(rows):
+            last = max(int(np.searchsorted(ends, starts[first] + _CHUNK_SHINGLES, side='right')), first + 1)
+            lo, hi = starts[first], ends[last - 1]
+            # (num_perm, chunk) layout keeps each permutation's reduction contiguous
+            permuted = self.a[:, None] * values[lo:hi] + self.b[:, None]
+            permuted %= MERSENNE_PRIME
+            out[rows[first:last]] = np.minimum.reduceat(permuted, starts[first:last] - lo, axis=1).T
+            first = last
+        return out
+
+    def signature(self, hashes):
+        return self.signatures([hashes])[0]
+
+
+class ClaimIndex:
+    """
+    LSH index over MinHash signatures of individual patent claims
+
+    Signatures are split into bands; each band's rows are folded into one
+    uint64 key and kept in a sorted array per band, so a lookup is one
+    binary search per band (sub-linear in the number of claims). Candidates
+    are re-scored with the signatures to estimate Jaccard similarity and the
+    containment of the query in each claim. The arrays are persisted with
+    np.savez and reloaded at startup instead of re-hashing the claims.
+    """
+
+    def __init__(self, num_perm=128, bands=64, shingle_size=DEFAULT_SHINGLE_SIZE, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.hasher = MinHasher(num_perm=num_perm, seed=seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.source = None  # fingerprint of the dataset the index was built from
+        self.version = 0    # bumped whenever indexed claims change
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._shingle_counts = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._claims = []         # row -> (patent_id, claim number, snippet)
+        self._patent_rows = {}    # patent_id -> (claims digest, [rows])
+        self._band_keys = np.empty((bands, 0), dtype=np.uint64)
+        self._band_order = np.empty((bands, 0), dtype=np.int32)
+        self._dirty = False
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    def __contains__(self, patent_id):
+        return patent_id in self._patent_rows
+
+    @property
+    def patents(self):
+        return len(self._patent_rows)
+
+    def _band_keys_for(self, signatures):
+        """(bands, n) uint64 bucket keys of signature rows"""
+        folded = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for r in range(self.rows):
+            keys = keys * _BAND_MULTIPLIER + folded[:, :, r]
+        return keys.T
+
+    def add_patents(self, patents):
+        """
+        Index (or re-index) the claims of many patents
+
+        Args:
+            patents: Iterable of patent dicts with "patent_id" and "claims"
+
+        Returns:
+            Number of claims added
+        """
+        pending = {}
+        for patent in patents:
+            if not isinstance(patent, dict) or not patent.get('patent_id'):
+                continue
+            texts = claim_texts(patent.get('claims'))
+            if texts:
+                pending[patent['patent_id']] = texts
+
+        with self._lock:
+            new_rows, new_hashes = [], []
+            for patent_id, texts in pending.items():
+                digest = zlib.crc32("\x00".join(texts).encode("utf-8"))
+                current = self._patent_rows.get(patent_id)
+                if current is not None and current[0] == digest:
+                    continue
+                if current is not None:
+                    self._alive[current[1]] = False
+                rows = []
+                for number, text in enumerate(texts, 1):
+                    rows.append(len(self._claims) + len(new_rows))
+                    new_rows.append((patent_id, number, " ".join(text.split())[:_SNIPPET_LENGTH]))
+                    new_hashes.append(_shingle_values(text, self.shingle_size))
+                self._patent_rows[patent_id] = (digest, rows)
+
+            if not new_rows:
+                return 0
+            self._claims.extend(new_rows)
+            self._signatures = np.concatenate([self._signatures, self.hasher.signatures(new_hashes)])
+            counts = _distinct_counts(new_hashes)
+            self._shingle_counts = np.concatenate([self._shingle_counts, counts])
+            self._alive = np.concatenate([self._alive, counts > 0])
+            self._dirty = True
+            self.version += 1
+        logger.info(f"Claim index: added {len(new_rows)} claims ({len(self)} indexed)")
+        return len(new_rows)
+
+    def _snapshot(self):
+        """Return index arrays, re-sorting the band keys if claims were added"""
+        with self._lock:
+            return self._snapshot_locked()
+
+    def _snapshot_locked(self):
+        if self._dirty:
+            keys = self._band_keys_for(self._signatures)
+            order = np.argsort(keys, axis=1, kind='stable')
+            self._band_keys = np.take_along_axis(keys, order, axis=1)
+            self._band_order = order.astype(np.int32)
+            self._dirty = False
+        return (self._signatures, self._shingle_counts, self._alive,
+                self._claims, self._band_keys, self._band_order)
+
+    def query(self, description, top=10, min_containment=0.0):
+        """
+        Patents whose claims overlap most with a described use or formulation
+
+        Args:
+            description: Free-text use / formulation description
+            top: Maximum number of patents returned
+            min_containment: Drop matches below this estimated containment
+
+        Returns:
+            List of {"patent_id", "claim_number", "similarity", "containment",
+            "claim"} (best claim per patent), sorted by containment
+        """
+        query = shingle_hashes(description or "", self.shingle_size)
+        signatures, counts, alive, claims, band_keys, band_order = self._snapshot()
+        if not len(query) or not len(signatures):
+            return []
+
+        signature = self.hasher.signature(query)
+        keys = self._band_keys_for(signature[None, :])[:, 0]
+        candidates = []
+        for band in range(self.bands):
+            lo = np.searchsorted(band_keys[band], keys[band], side='left')
+            hi = np.searchsorted(band_keys[band], keys[band], side='right')
+            if hi > lo:
+                candidates.append(band_order[band, lo:hi])
+        if not candidates:
+            return []
+        rows = np.unique(np.concatenate(candidates))
+        rows = rows[alive[rows]]
+
+        # |Q n C| = J / (1 + J) * (|Q| + |C|)
+        jaccard = (signatures[rows] == signature).mean(axis=1)
+        containment = np.minimum(jaccard / (1 + jaccard) * (len(query) + counts[rows]) / len(query), 1.0)
+
+        matches, seen = [], set()
+        for i in np.argsort(-containment, kind='stable'):
+            if containment[i] < min_containment or len(matches) >= top:
+                break
+            patent_id, number, snippet = claims[rows[i]]
+            if patent_id in seen:
+                continue
+            seen.add(patent_id)
+            matches.append({
+                "patent_id": patent_id,
+                "claim_number": number,
+                "similarity": round(float(jaccard[i]), 3),
+                "containment": round(float(containment[i]), 3),
+                "claim": snippet
+            })
+        return matches
+
+    def save(self, path):
+        """Persist signatures and LSH tables to <path>.npz plus claim ids to <path>.ids.json"""
+        with self._save_lock:
+            with self._lock:
+                # Copies: add_patents extends the claim list and marks replaced rows dead in place
+                signatures, counts, alive, claims, band_keys, band_order = self._snapshot_locked()
+                alive, claims = alive.copy(), list(claims)
+                patents = {pid: [digest, rows] for pid, (digest, rows) in self._patent_rows.items()}
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # Written to temporary files and swapped in, so a crash mid-save keeps the previous index
+            with open(path + ".npz.tmp", "wb") as f:
+                np.savez(
+                    f,
+                    signatures=signatures, shingle_counts=counts, alive=alive,
+                    band_keys=band_keys, band_order=band_order,
+                    params=np.array([self.hasher.num_perm, self.bands, self.shingle_size, self.seed], dtype=np.int64)
+                )
+            with open(path + ".ids.json.tmp", "w") as f:
+                json.dump({"source": self.source, "claims": claims, "patents": patents}, f)
+            os.replace(path + ".npz.tmp", path + ".npz")
+            os.replace(path + ".ids.json.tmp", path + ".ids.json")
+        logger.info(f"Claim index saved: {len(claims)} claims -> {path}.npz")
+
+    def load(self, path):
+        """
+        Load a persisted index built with the same parameters
+
+        Returns:
+            True if loaded, False if missing or built with other parameters
+        """
+        if not (os.path.exists(path + ".npz") and os.path.exists(path + ".ids.json")):
+            return False
+        try:
+            with np.load(path + ".npz") as data:
+                params = [int(v) for v in data["params"]]
+                if params != [self.hasher.num_perm, self.bands, self.shingle_size, self.seed]:
+                    logger.info("Claim index on disk uses other parameters; rebuilding")
+                    return False
+                arrays = {name: data[name] for name in data.files}
+            with open(path + ".ids.json") as f:
+                ids = json.load(f)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Claim index could not be loaded: {str(e)}")
+            return False
+        if len(ids["claims"]) != len(arrays["signatures"]):
+            logger.warning("Claim index files are out of step (interrupted save); rebuilding")
+            return False
+
+        with self._lock:
+            self._signatures = arrays["signatures"]
+            self._shingle_counts = arrays["shingle_counts"]
+            self._alive = arrays["alive"]
+            self._band_keys = arrays["band_keys"]
+            self._band_order = arrays["band_order"]
+            self._claims = [tuple(c) for c in ids["claims"]]
+            self._patent_rows = {pid: (digest, rows) for pid, (digest, rows) in ids["patents"].items()}
+            self.source = ids.get("source")
+            self._dirty = False
+            self.version += 1
+        logger.info(f"Claim index loaded: {len(self._claims)} claims from {path}.npz")
+        return True
@@ -22,6 +22,12 @@ API_CONFIG = {
     'CACHE_TTL': 3600,  # 1 hour
     'LOG_REQUESTS': True,
     'ALLOWED_METHODS': ['POST', 'GET'],
+    # Store MITs as compact records (interned strings, shared sub-objects)
+    'MIT_COMPACT_STORE': True,
+    # Rendered snapshots of recently stored/read MITs kept by the compact store
+    'MIT_DECODED_CACHE_SIZE': 1024,
+    # Max memoized unmet-needs / FTO analyses (LRU eviction)
+    'ANALYSIS_MEMO_SIZE': 4096,
     # LLM / provider configuration (set via environment variables for production)
     'LLM_PROVIDER': os.getenv('LLM_PROVIDER', 'openai'),
     'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY', None),
@@ -32,6 +38,96 @@ STORAGE_PATHS = {
     'reports': '../storage/reports',
     'cache': '../storage/cache',
     'logs': '../storage/logs',
+    'claims': '../storage/claims',
+}
+
+# Claim overlap engine (MinHash/LSH over patent claim text)
+CLAIM_OVERLAP_CONFIG = {
+    'SHINGLE_SIZE': 2,          # words per shingle
+    'NUM_PERM': 128,            # MinHash permutations
+    'BANDS': 64,                # LSH bands of 2 rows (NUM_PERM must be a multiple)
+    'HIGH_CONTAINMENT': 0.5,    # share of the described use found in a claim
+    'MEDIUM_CONTAINMENT': 0.25,
+}
+
+# Uploaded document extraction (runs in worker processes off the request thread)
+DOCUMENT_CONFIG = {
+    'EXTRACT_WORKERS': 2,           # concurrent extraction processes
+    'EXTRACT_TIMEOUT': 120,         # seconds per document
+    'MAX_PENDING': 32,              # queued + running documents before uploads get 503
+    'MAX_PAGE_CHARS': 200000,
+    'MAX_DOCUMENT_CHARS': 20000000,
+    'WORKER_MEMORY_MB': 1024,       # extra address space allowed per worker
+    'ANALYSIS_CHARS': 200000,       # text per document fed into unmet-needs analysis
+    'NEAR_DUPLICATE_BITS': 16,      # max SimHash distance (64-bit, over page keys) of a revision
+    'NEAR_DUPLICATE_MIN_SHARED': 0.5,   # share of pages a revision must share with its original
+    'PASSAGE_WORDS': 80,            # words per BM25-indexed passage
+    'SNIPPET_CHARS': 240,
+}
+
+# Internal insights retrieval over uploaded documents
+INTERNAL_INSIGHTS_CONFIG = {
+    'TOP_PASSAGES': 5,
+    'QUERY': 'results efficacy safety significant unmet need limited treatment recommend strategy '
+             'market patent trial',
+    'LLM_CONTEXT_BYTES': 4096,      # document text sent to the LLM per summary
+    'CONTEXT_CHUNKS': 8,            # most similar chunks considered for the LLM context
+    'EMBEDDING_DIM': 512,           # hashing-vectorizer dimensions of chunk embeddings
+    'MIN_CONTEXT_SIMILARITY': 0.08, # cosine floor; hash collisions alone score below ~0.05
+    # Passages mentioning these (prefixes) are reported as strategic implications
+    'STRATEGY_TERMS': ('strateg', 'opportunit', 'priorit', 'recommend', 'invest', 'market', 'competit', 'portfolio'),
+}
+
+# LLM client (OpenAI-compatible chat completions; point LLM_BASE_URL at
+# llm_stub_server.py to run the LLM path offline)
+LLM_CONFIG = {
+    'BASE_URL': os.getenv('LLM_BASE_URL', 'https://api.openai.com/v1'),
+    'MODEL': os.getenv('LLM_MODEL', 'gpt-4o-mini'),
+    'POOL_SIZE': 10,                # keep-alive connections to the provider
+    'MAX_RETRIES': 3,               # on 429 / 5xx / connection errors, before the first token
+    'BACKOFF_BASE': 0.5,            # seconds; full-jitter exponential backoff
+    'BACKOFF_MAX': 8.0,             # cap on any single backoff or Retry-After wait
+    'CONNECT_TIMEOUT': 5,
+    'FIRST_TOKEN_TIMEOUT': 20,      # seconds to the first token (and max stall between tokens)
+    'TOTAL_TIMEOUT': 120,           # seconds per call, retries included
+    # Provider quotas enforced by the LLM governor; set a little below the account's limits
+    'REQUESTS_PER_MIN': int(os.getenv('LLM_REQUESTS_PER_MIN', 500)),
+    'TOKENS_PER_MIN': int(os.getenv('LLM_TOKENS_PER_MIN', 200000)),
+    'RATE_BURST_SECONDS': 10,       # quota the governor lets through in one burst
+    'MAX_CONCURRENT_STREAMS': 8,
+    'INTERACTIVE_WEIGHT': 4,        # interactive admissions per batch admission when both wait
+    'QUEUE_TIMEOUT': 30,            # seconds a call may wait for a permit
+    'COMPLETION_TOKENS_ESTIMATE': 512,  # reserved per call without max_tokens, settled afterwards
+    'RESPONSE_CACHE_SIZE': 1024,    # cached completions (storage/cache/llm_responses.jsonl)
+    'RESPONSE_CACHE_TTL': None,     # seconds; keys already cover model, prompt and context
+    'SEMANTIC_CACHE_THRESHOLD': None,   # prompt cosine similarity of a near duplicate, e.g. 0.95 (None: exact only)
+}
+
+# Server-Sent Events query streams
+STREAM_CONFIG = {
+    'TOKEN_FLUSH_MS': 50,           # LLM token deltas buffered into one frame (0: frame per delta)
+    'TOKEN_FLUSH_BYTES': 1024,      # buffered token text that forces an early flush
+    'REPLAY_EVENTS': 2048,          # frames kept per analysis for Last-Event-ID resumes
+    'STREAM_TTL': 300,              # seconds a finished analysis stays resumable
+    'MAX_STREAMS': 256,             # analyses kept in memory (oldest finished dropped first)
+    'HEARTBEAT_SECONDS': 15,        # keep-alive comment interval while an analysis is idle
+    'RETRY_MS': 3000,               # EventSource reconnect delay sent to clients
+    'MAX_ACTIVE_STREAMS': 16,       # analyses running at once (executor threads)
+    'MAX_QUEUED_STREAMS': 32,       # analyses waiting for a thread; beyond this /stream-query answers 503
+    'ABANDON_SECONDS': 20,          # cancel an analysis after this long without a connected client
+    'ASYNC_MAX_ACTIVE_STREAMS': 128,  # analyses running at once on the ASGI event loop (asgi_app.py)
+    'ASYNC_AGENT_THREADS': 8,       # threads for blocking agent work under ASGI
+    'WSGI_BRIDGE_THREADS': 16,      # Flask requests served at once under ASGI (a thread each)
+}
+
+# JSON encoding and compression of API responses
+RESPONSE_CONFIG = {
+    'JSON_ENCODER': 'auto',         # auto (orjson, ujson, json, whichever is installed first) | orjson | ujson | json
+    'SORT_KEYS': False,             # sort object keys (Flask's default; costs encoding time)
+    'SHARED_DEPTH': 3,              # depth searched for sub-objects referenced twice, encoded once (json encoder only)
+    'COMPRESS_MIN_BYTES': 1024,     # smaller bodies are sent uncompressed
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,            # brotli is used when installed and accepted by the client
 }
 
 # Agent timeout settings (in seconds)
@@ -0,0 +1,559 @@
+"""
+Document Extraction - page-by-page text extraction in isolated worker processes
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import types
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # optional dependency: PDF uploads fail with a clear error without it
+    PdfReader = None
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Plain-text documents are split into pseudo-pages of roughly this many characters
+TEXT_PAGE_CHARS = 4000
+
+# Separator between pages in the extracted-text sidecar file
+PAGE_SEPARATOR = "\f"
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_FINAL_STATUSES = ("done", "failed", "timeout")
+
+# Process name prefix of extraction workers
+WORKER_NAME = "document-extraction"
+
+
+def in_extraction_worker():
+    """True inside an extraction worker, including while it re-imports the parent's main module"""
+    return multiprocessing.current_process().name.startswith(WORKER_NAME)
+
+
+def _main_imports():
+    """
+    Modules the parent's main script imported
+
+    Every worker re-runs the main script before its target; with these
+    preloaded in the fork server that costs little. The script itself is
+    never imported there.
+    """
+    main = sys.modules.get('__main__')
+    names = set()
+    for value in vars(main).values() if main is not None else ():
+        name = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, '__module__', None)
+        if isinstance(name, str) and name in sys.modules and name not in ('__main__', '__mp_main__'):
+            names.add(name)
+    return sorted(names)
+
+
+def count_pages(file_path):
+    """Number of pages of a PDF (None for formats without fixed pages)"""
+    if file_path.lower().endswith('.pdf') and PdfReader is not None:
+        return len(PdfReader(file_path).pages)
+    return None
+
+
+def page_key(data):
+    """Content key of one page (hex SHA-1 of its bytes or text)"""
+    if isinstance(data, str):
+        data = data.encode('utf-8', errors='replace')
+    return hashlib.sha1(data).hexdigest()
+
+
+def _pdf_page_key(page):
+    """Key a PDF page by its content stream, without extracting its text"""
+    try:
+        contents = page.get_contents()
+        return page_key(contents.get_data() if contents is not None else b"")
+    except Exception:
+        return None  # unreadable pages are never reused
+
+
+def iter_document_pages(file_path):
+    """
+    Yield the text of a document one page at a time
+
+    Args:
+        file_path: PDF, TXT or DOCX file
+
+    Yields:
+        Page text strings
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        if PdfReader is None:
+            raise RuntimeError("PDF extraction requires the 'pypdf' package")
+        for page in PdfReader(file_path).pages:
+            yield page.extract_text() or ""
+    elif ext == '.txt':
+        yield from _iter_text_pages(file_path)
+    elif ext == '.docx':
+        yield from _iter_docx_pages(file_path)
+    else:
+        raise ValueError(f"Text extraction is not supported for {ext or 'this'} files")
+
+
+def _iter_text_pages(file_path):
+    buffer, size = [], 0
+    with open(file_path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            for part_no, part in enumerate(line.split(PAGE_SEPARATOR)):
+                if part_no and buffer:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                buffer.append(part)
+                size += len(part)
+                if size >= TEXT_PAGE_CHARS:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _iter_docx_pages(file_path):
+    """Stream paragraphs out of word/document.xml, paging on explicit breaks or size"""
+    paragraphs, size = [], 0
+    with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as xml:
+        for _, element in ElementTree.iterparse(xml, events=('end',)):
+            if element.tag == _WORD_NS + 'br' and element.get(_WORD_NS + 'type') == 'page' and paragraphs:
+                yield "\n".join(paragraphs)
+                paragraphs, size = [], 0
+            elif element.tag == _WORD_NS + 'p':
+                text = "".join(node.text or "" for node in element.iter(_WORD_NS + 't'))
+                element.clear()
+                if text:
+                    paragraphs.append(text)
+                    size += len(text)
+                if size >= TEXT_PAGE_CHARS:
+                    yield "\n".join(paragraphs)
+                    paragraphs, size = [], 0
+    if paragraphs:
+        yield "\n".join(paragraphs)
+
+
+def _limit_memory(memory_limit_mb):
+    """Cap the worker's address space at its current size plus `memory_limit_mb`"""
+    if resource is None or not memory_limit_mb:
+        return
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+        limit = current + int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (OSError, ValueError):
+        pass
+
+
+def extract_to_file(file_path, text_path, max_page_chars, max_document_chars, on_page=None, page_texts=None):
+    """
+    Stream a document's page text into a sidecar file (pages separated by form feeds)
+
+    Args:
+        file_path: Source document
+        text_path: Destination text file
+        max_page_chars: Characters kept per page
+        max_document_chars: Characters kept in total
+        on_page: Optional callback(page_number, page_chars)
+        page_texts: Optional iterable of page texts (defaults to iter_document_pages)
+
+    Returns:
+        Tuple of (pages, characters, truncated)
+    """
+    pages, chars, truncated = 0, 0, False
+    if page_texts is None:
+        page_texts = iter_document_pages(file_path)
+    with open(text_path, 'w', encoding='utf-8', newline='') as out:
+        for text in page_texts:
+            text = text.replace(PAGE_SEPARATOR, " ")[:max_page_chars]
+            if chars + len(text) > max_document_chars:
+                text = text[:max_document_chars - chars]
+                truncated = True
+            if pages:
+                out.write(PAGE_SEPARATOR)
+            out.write(text)
+            pages += 1
+            chars += len(text)
+            if on_page:
+                on_page(pages, len(text))
+            if truncated:
+                break
+    return pages, chars, truncated
+
+
+def read_pages(text_path):
+    """Page texts of an extracted-text sidecar file (exactly as written, line endings included)"""
+    with open(text_path, encoding='utf-8', errors='replace', newline='') as f:
+        return f.read().split(PAGE_SEPARATOR)
+
+
+def _keyed_pages(page_texts, keys):
+    for text in page_texts:
+        keys.append(page_key(text))
+        yield text
+
+
+def _extract_document(file_path, text_path, analyze, limits, events, replies):
+    """
+    Worker process: stream page text to the sidecar file, then analyze it
+
+    PDF pages are keyed by their content streams before any text is
+    extracted. With planning enabled the keys are sent to the parent,
+    which may answer with pages of an earlier version whose text can be
+    reused instead of extracted. Progress and results are reported
+    through the `events` queue.
+    """
+    _limit_memory(limits.get('memory_limit_mb'))
+    try:
+        reused = {}
+        if file_path.lower().endswith('.pdf') and PdfReader is not None:
+            reader = PdfReader(file_path)
+            total = len(reader.pages)
+            keys = [_pdf_page_key(page) for page in reader.pages]
+            if limits.get('plan'):
+                events.put(("keys", keys))
+                plan = replies.get(timeout=limits['plan_timeout'])
+                if plan:
+                    source = read_pages(plan["text_path"])
+                    reused = {page: source[src] for page, src in plan["pages"].items() if src < len(source)}
+            page_texts = (
+                reused[i] if i in reused else (page.extract_text() or "")
+                for i, page in enumerate(reader.pages)
+            )
+        else:
+            total, keys = count_pages(file_path), []
+            page_texts = _keyed_pages(iter_document_pages(file_path), keys)
+        events.put(("started", total))
+        pages, chars, truncated = extract_to_file(
+            file_path, text_path, limits['max_page_chars'], limits['max_document_chars'],
+            on_page=lambda page, page_chars: events.put(("page", page, total, page_chars)),
+            page_texts=page_texts
+        )
+        insights = analyze(text_path) if analyze else None
+        reused_pages = sum(1 for page in reused if page < pages)
+        events.put(("done", pages, chars, truncated, insights, keys[:pages], reused_pages))
+    except MemoryError:
+        events.put(("failed", "Document exceeds the extraction memory limit"))
+    except Exception as e:
+        events.put(("failed", str(e)))
+
+
+class ExtractionJob:
+    """State and progress events of one document extraction"""
+
+    def __init__(self, job_id, file_path, text_path, molecule, filename, content_hash=None):
+        self.job_id = job_id
+        self.file_path = file_path
+        self.text_path = text_path
+        self.molecule = molecule
+        self.filename = filename
+        self.content_hash = content_hash
+        self.status = "queued"
+        self.total_pages = None
+        self.pages_done = 0
+        self.characters = 0
+        self.truncated = False
+        self.insights = None
+        self.page_keys = None
+        self.reused_pages = 0
+        self.near_duplicate_of = None
+        self.cached = False
+        self.error = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.finished_at = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in _FINAL_STATUSES
+
+    def _emit(self, event, **changes):
+        with self._cond:
+            for key, value in changes.items():
+                setattr(self, key, value)
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def wait_events(self, start=0, timeout=None):
+        """
+        Block until events after index `start` exist or the job finished
+
+        Returns:
+            List of new events (empty on timeout)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > start or self.finished, timeout=timeout)
+            return self.events[start:]
+
+    def to_dict(self, include_insights=True):
+        data = {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "molecule": self.molecule,
+            "status": self.status,
+            "total_pages": self.total_pages,
+            "pages_done": self.pages_done,
+            "characters": self.characters,
+            "truncated": self.truncated,
+            "content_hash": self.content_hash,
+            "cached": self.cached,
+            "reused_pages": self.reused_pages,
+            "near_duplicate_of": self.near_duplicate_of,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+        if include_insights:
+            data["insights"] = self.insights
+        return data
+
+
+class DocumentExtractor:
+    """
+    Runs document extractions in a bounded pool of worker processes
+
+    Each document is parsed in its own process (at most `workers` at a time)
+    so a large or malformed file never blocks a request thread, memory is
+    capped per process, and a document that exceeds `timeout` seconds is
+    terminated. Page text is streamed to a sidecar file instead of being
+    held in memory, and progress is published as per-page events.
+    """
+
+    def __init__(self, output_dir, analyze=None, workers=2, timeout=120, max_pending=32,
+                 max_page_chars=200000, max_document_chars=20000000, memory_limit_mb=1024,
+                 on_complete=None, max_jobs=1000, planner=None, on_finish=None):
+        """
+        Args:
+            output_dir: Directory for extracted-text sidecar files
+            analyze: Picklable (module-level) callable(text_path) run in the worker
+                on the extracted text
+            workers: Maximum concurrent extraction processes
+            timeout: Per-document time limit in seconds
+            max_pending: Maximum queued + running jobs before submissions are rejected
+            max_page_chars: Characters kept per page
+            max_document_chars: Characters kept per document
+            memory_limit_mb: Address-space limit of each worker process
+            on_complete: Optional callback(job) after a job's extraction succeeds,
+                before its "done" event is published
+            max_jobs: Finished jobs kept for status lookups
+            planner: Optional callback(job, page_keys) returning a reuse plan
+                {"text_path": earlier sidecar, "pages": {page: earlier page}} or None
+            on_finish: Optional callback(job) after any job reaches a final status
+        """
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.analyze = analyze
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.on_complete = on_complete
+        self.planner = planner
+        self.on_finish = on_finish
+        self.limits = {
+            "max_page_chars": max_page_chars,
+            "max_document_chars": max_document_chars,
+            "memory_limit_mb": memory_limit_mb,
+            "plan": planner is not None,
+            "plan_timeout": timeout
+        }
+        # Never fork this (multithreaded) process directly: a lock another thread holds at fork
+        # time (logging, sqlite, the allocator) would stay locked in the child. Workers fork from
+        # a single-threaded fork server that has imported the worker code and the main script's
+        # imports once (on 3.11 it resolves them from the working directory, i.e. backend/).
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            self._mp = multiprocessing.get_context('forkserver')
+            preload = [__name__] + ([analyze.__module__] if analyze is not None else [])
+            self._mp.set_forkserver_preload(preload + _main_imports())
+        else:
+            self._mp = multiprocessing.get_context('spawn')
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="doc-extract")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+
+    def submit(self, file_path, molecule=None, filename=None, content_hash=None):
+        """
+        Queue a document for extraction
+
+        Returns:
+            The ExtractionJob
+
+        Raises:
+            RuntimeError: if too many documents are already queued
+        """
+        job_id = uuid.uuid4().hex
+        job = ExtractionJob(
+            job_id, file_path, os.path.join(self.output_dir, f"{job_id}.txt"),
+            molecule, filename or os.path.basename(file_path), content_hash
+        )
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise RuntimeError("Too many documents are being processed; retry shortly")
+            self._pending += 1
+            self._jobs[job_id] = job
+            self._evict_finished()
+        job._emit({"type": "queued", "job_id": job_id})
+        self._executor.submit(self._run, job)
+        return job
+
+    def add_completed(self, file_path, text_path, result, molecule=None, filename=None, content_hash=None):
+        """
+        Register a job whose extraction already exists (e.g. cached by content hash)
+
+        No worker is started; the job is done as soon as it is created.
+
+        Args:
+            result: Dict with pages, characters, truncated and insights
+
+        Returns:
+            The finished ExtractionJob
+        """
+        job_id = uuid.uuid4().hex
+        job = ExtractionJob(
+            job_id, file_path, text_path, molecule, filename or os.path.basename(file_path), content_hash
+        )
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict_finished()
+        job._emit({"type": "queued", "job_id": job_id})
+        job._emit(
+            {"type": "done", "job_id": job_id, "pages": result["pages"], "characters": result["characters"],
+             "truncated": result["truncated"], "elapsed_seconds": 0.0, "cached": True,
+             "insights": result["insights"]},
+            status="done", pages_done=result["pages"], total_pages=result["pages"],
+            characters=result["characters"], truncated=result["truncated"], insights=result["insights"],
+            cached=True, finished_at=datetime.utcnow().isoformat()
+        )
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _evict_finished(self):
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((jid for jid, j in self._jobs.items() if j.finished), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+    def _run(self, job):
+        events, replies = self._mp.Queue(), self._mp.Queue()
+        process = self._mp.Process(
+            target=_extract_document,
+            args=(job.file_path, job.text_path, self.analyze, self.limits, events, replies),
+            name=f"{WORKER_NAME}-{job.job_id}",
+            daemon=True
+        )
+        start = time.monotonic()
+        deadline = start + self.timeout
+        result = None
+        try:
+            job._emit({"type": "running", "job_id": job.job_id}, status="running")
+            process.start()
+            while result is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    message = events.get(timeout=min(remaining, 0.5))
+                except queue.Empty:
+                    if not process.is_alive() and events.empty():
+                        result = ("failed", f"Extraction process exited with code {process.exitcode}")
+                    continue
+                kind = message[0]
+                if kind == "keys":
+                    plan = self._plan(job, message[1])
+                    replies.put(plan)
+                    if plan:
+                        job._emit({"type": "plan", "reused_pages": len(plan["pages"]),
+                                   "near_duplicate_of": job.near_duplicate_of})
+                elif kind == "started":
+                    job._emit({"type": "started", "total_pages": message[1]}, total_pages=message[1])
+                elif kind == "page":
+                    _, page, total, chars = message
+                    job._emit(
+                        {"type": "page", "page": page, "total_pages": total, "chars": chars},
+                        pages_done=page, characters=job.characters + chars
+                    )
+                else:
+                    result = message
+        except Exception as e:
+            result = ("failed", str(e))
+        finally:
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=5)
+            events.close()
+            replies.close()
+            with self._lock:
+                self._pending -= 1
+
+        elapsed = round(time.monotonic() - start, 3)
+        finished_at = datetime.utcnow().isoformat()
+        if result is None:
+            logger.warning(f"Document extraction timed out after {self.timeout}s: {job.filename}")
+            job._emit(
+                {"type": "timeout", "job_id": job.job_id, "pages_done": job.pages_done},
+                status="timeout", error=f"Extraction exceeded {self.timeout}s", finished_at=finished_at
+            )
+        elif result[0] == "done":
+            _, pages, chars, truncated, insights, page_keys, reused_pages = result
+            job.pages_done, job.characters, job.truncated = pages, chars, truncated
+            job.insights, job.page_keys, job.reused_pages = insights, page_keys, reused_pages
+            if self.on_complete:
+                try:
+                    self.on_complete(job)
+                except Exception as e:
+                    logger.error(f"Document completion callback failed: {str(e)}")
+            # Published after the callback so followers see its effects
+            job._emit(
+                {"type": "done", "job_id": job.job_id, "pages": pages, "characters": chars,
+                 "truncated": truncated, "elapsed_seconds": elapsed, "reused_pages": reused_pages,
+                 "near_duplicate_of": job.near_duplicate_of, "insights": insights},
+                status="done", pages_done=pages, characters=chars, truncated=truncated,
+                reused_pages=reused_pages, insights=insights, finished_at=finished_at
+            )
+            logger.info(f"Extracted {pages} pages ({chars} chars, {reused_pages} reused) "
+                        f"from {job.filename} in {elapsed}s")
+        else:
+            logger.error(f"Document extraction failed for {job.filename}: {result[1]}")
+            job._emit(
+                {"type": "error", "job_id": job.job_id, "message": result[1]},
+                status="failed", error=result[1], finished_at=finished_at
+            )
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"Document finish callback failed: {str(e)}")
+
+    def _plan(self, job, page_keys):
+        if self.planner is None:
+            return None
+        try:
+            return self.planner(job, page_keys)
+        except Exception as e:
+            logger.error(f"Page reuse planning failed for {job.filename}: {str(e)}")
+            return None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,302 @@
+"""
+Document Index - incremental BM25 passage index over extracted internal documents
+
+Extracted text is split into passages of a few dozen words. Each passage
+is posted once per distinct term into an in-memory inverted index that
+grows as documents are uploaded. Queries score only the postings of their
+own terms (Okapi BM25), can be restricted to the documents of a molecule,
+and return snippets read back from the extracted-text files, so a
+retrieval never scans the documents themselves.
+"""
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from document_extraction import PAGE_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[^\W_]+(?:[-'][^\W_]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can for from had has have in into is it its
+may more not of on or such than that the their there these they this to was
+were which will with within without we our also after before between both
+""".split())
+
+_READ_CHUNK = 64 * 1024
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords or single characters"""
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _iter_pages(text_path):
+    """Stream the pages of an extracted-text file"""
+    tail = ""
+    # newline='': "\r\n" must stay two characters for the byte offsets to match the file
+    with open(text_path, encoding='utf-8', errors='replace', newline='') as f:
+        while True:
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                break
+            pages = (tail + chunk).split(PAGE_SEPARATOR)
+            tail = pages.pop()
+            yield from pages
+    yield tail
+
+
+def iter_passages(text_path, passage_words):
+    """
+    Split an extracted-text file into passages of `passage_words` words
+
+    Passages never cross pages.
+
+    Yields:
+        Tuples of (page index, byte offset, byte length, passage text)
+    """
+    position = 0
+    for page_no, page in enumerate(_iter_pages(text_path)):
+        words = list(re.finditer(r"\S+", page))
+        cursor = 0   # character position in `page` matching `position`
+        for start in range(0, len(words), passage_words):
+            chunk = words[start:start + passage_words]
+            begin, end = chunk[0].start(), chunk[-1].end()
+            position += len(page[cursor:begin].encode('utf-8'))
+            text = page[begin:end]
+            size = len(text.encode('utf-8'))
+            yield page_no, position, size, text
+            position += size
+            cursor = end
+        position += len(page[cursor:].encode('utf-8')) + len(PAGE_SEPARATOR)
+
+
+def read_span(text_path, offset, size):
+    """Text of a byte span of an extracted-text file ("" if unreadable)"""
+    try:
+        with open(text_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size).decode('utf-8', errors='replace')
+    except OSError:
+        return ""
+
+
+class DocumentIndex:
+    """Inverted index of document passages with BM25 ranking"""
+
+    def __init__(self, passage_words=80, snippet_chars=240, k1=1.2, b=0.75):
+        """
+        Args:
+            passage_words: Words per indexed passage
+            snippet_chars: Approximate length of returned snippets
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalisation
+        """
+        self.passage_words = passage_words
+        self.snippet_chars = snippet_chars
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._docs = []             # doc id -> metadata dict
+        self._doc_ids = {}          # document key -> doc id
+        self._by_molecule = {}      # molecule key -> [doc id], oldest first
+        self._postings = {}         # term -> (array of passage ids, array of term counts)
+        self._arrays = {}           # term -> numpy copies of its postings, keyed by length
+        self._passage_arrays = None  # numpy copies of passage document / length
+        # Per passage: document, page, length in tokens, byte span in the text file
+        self._passage_doc = array('I')
+        self._passage_page = array('I')
+        self._passage_len = array('I')
+        self._passage_offset = array('q')
+        self._passage_bytes = array('I')
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._passage_doc)
+
+    @property
+    def document_count(self):
+        return len(self._docs)
+
+    def add(self, key, text_path, molecule=None, filename=None):
+        """
+        Index a document's extracted text (once per key) and attach it to a molecule
+
+        Args:
+            key: Document key (content hash)
+            text_path: Extracted-text file, pages separated by form feeds
+            molecule: Molecule the document was uploaded for
+            filename: Display name
+
+        Returns:
+            True if the document was newly indexed
+        """
+        molecule_key = (molecule or "").strip().lower()
+        with self._lock:
+            doc_id = self._doc_ids.get(key)
+            if doc_id is not None:
+                self._attach(doc_id, molecule_key)
+                return False
+
+        # Tokenize outside the lock; only the merge below is serialised
+        passages = list(self._passages(text_path))
+
+        with self._lock:
+            if key in self._doc_ids:
+                self._attach(self._doc_ids[key], molecule_key)
+                return False
+            doc_id = len(self._docs)
+            first = len(self._passage_doc)
+            for page, offset, size, counts, length in passages:
+                pid = len(self._passage_doc)
+                self._passage_doc.append(doc_id)
+                self._passage_page.append(page)
+                self._passage_len.append(length)
+                self._passage_offset.append(offset)
+                self._passage_bytes.append(size)
+                self._total_len += length
+                for term, count in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array('I'), array('I'))
+                    postings[0].append(pid)
+                    postings[1].append(count)
+            self._docs.append({
+                "key": key,
+                "filename": filename,
+                "text_path": text_path,
+                "molecules": set(),
+                "passages": len(self._passage_doc) - first,
+                "indexed_at": datetime.utcnow().isoformat()
+            })
+            self._doc_ids[key] = doc_id
+            self._attach(doc_id, molecule_key)
+        return True
+
+    def _attach(self, doc_id, molecule_key):
+        if molecule_key and molecule_key not in self._docs[doc_id]["molecules"]:
+            self._docs[doc_id]["molecules"].add(molecule_key)
+            self._by_molecule.setdefault(molecule_key, []).append(doc_id)
+
+    def _passages(self, text_path):
+        """Yield (page, byte offset, byte length, term counts, token count) per passage"""
+        for page_no, offset, size, text in iter_passages(text_path, self.passage_words):
+            tokens = tokenize(text)
+            if tokens:
+                yield page_no, offset, size, Counter(tokens), len(tokens)
+
+    def document(self, key):
+        """Metadata of an indexed document by key, or None"""
+        with self._lock:
+            doc_id = self._doc_ids.get(key)
+            if doc_id is None:
+                return None
+            return {k: v for k, v in self._docs[doc_id].items() if k != "molecules"}
+
+    def documents(self, molecule):
+        """Indexed documents of a molecule, oldest first"""
+        with self._lock:
+            ids = list(self._by_molecule.get((molecule or "").strip().lower(), ()))
+            return [{k: v for k, v in self._docs[i].items() if k != "molecules"} for i in ids]
+
+    def _term_arrays(self, term):
+        postings = self._postings.get(term)
+        if postings is None:
+            return None
+        cached = self._arrays.get(term)
+        if cached is None or len(cached[0]) != len(postings[0]):
+            cached = (np.array(postings[0], dtype=np.int64), np.array(postings[1], dtype=np.float64))
+            self._arrays[term] = cached
+        return cached
+
+    def _passage_numpy(self):
+        cached = self._passage_arrays
+        if cached is None or len(cached[0]) != len(self._passage_doc):
+            cached = (np.array(self._passage_doc, dtype=np.int64), np.array(self._passage_len, dtype=np.float64))
+            self._passage_arrays = cached
+        return cached
+
+    def search(self, query, molecule=None, top=5):
+        """
+        Top passages for a query, optionally within one molecule's documents
+
+        Args:
+            query: Free-text query
+            molecule: Optional molecule name
+            top: Number of passages
+
+        Returns:
+            List of dicts with document, filename, page, score and snippet
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n = len(self._passage_doc)
+            if not terms or not n:
+                return []
+            allowed = None
+            if molecule is not None:
+                doc_ids = self._by_molecule.get(molecule.strip().lower())
+                if not doc_ids:
+                    return []
+                allowed = np.zeros(len(self._docs), dtype=bool)
+                allowed[doc_ids] = True
+            avgdl = self._total_len / n
+            passage_doc, passage_len = self._passage_numpy()
+            term_arrays = [(t, self._term_arrays(t)) for t in terms]
+
+        ids_parts, score_parts = [], []
+        for term, arrays in term_arrays:
+            if arrays is None:
+                continue
+            ids, tf = arrays
+            if allowed is not None:
+                keep = allowed[passage_doc[ids]]
+                ids, tf = ids[keep], tf[keep]
+                if not len(ids):
+                    continue
+            df = len(arrays[0])
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * passage_len[ids] / avgdl)
+            ids_parts.append(ids)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not ids_parts:
+            return []
+
+        ids = np.concatenate(ids_parts)
+        unique, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        k = min(top, len(unique))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.lexsort((unique[best], -scores[best]))]
+        return [self._hit(int(unique[i]), float(scores[i]), terms) for i in best]
+
+    def _hit(self, pid, score, terms):
+        doc = self._docs[self._passage_doc[pid]]
+        return {
+            "document": doc["key"],
+            "filename": doc["filename"],
+            "page": self._passage_page[pid] + 1,
+            "score": round(score, 4),
+            "snippet": self._snippet(doc["text_path"], pid, terms)
+        }
+
+    def _snippet(self, text_path, pid, terms):
+        text = " ".join(read_span(text_path, self._passage_offset[pid], self._passage_bytes[pid]).split())
+        if len(text) <= self.snippet_chars:
+            return text
+        match = re.search(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")", text, re.IGNORECASE)
+        center = match.start() if match else 0
+        start = max(0, min(center - self.snippet_chars // 3, len(text) - self.snippet_chars))
+        end = start + self.snippet_chars
+        if start:
+            start = text.find(" ", start) + 1 or start
+        if end < len(text):
+            end = text.rfind(" ", start, end) if text.rfind(" ", start, end) > start else end
+        return ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
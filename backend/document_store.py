@@ -0,0 +1,255 @@
+"""
+Document Store - content-addressed upload storage and extraction cache
+
+Uploads are hashed (SHA-256) while they are streamed to disk and stored
+once per distinct content. Extracted text and insights are cached under
+the same hash, so re-uploading a document (under any name, for any
+molecule) needs no extraction at all. Documents are also fingerprinted
+with a 64-bit SimHash over their page keys: a slightly revised version of
+a stored document is flagged as its near duplicate, and its unchanged
+pages are copied from the earlier extraction instead of re-extracted.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK = 1024 * 1024
+
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+
+def simhash(page_keys):
+    """
+    64-bit SimHash of a document's pages
+
+    Each page key (hex digest) is one equally weighted feature, so the
+    Hamming distance between two documents grows with the share of pages
+    that differ.
+
+    Args:
+        page_keys: Page content keys (None entries are ignored)
+
+    Returns:
+        SimHash as an int (0 for a document without keyed pages)
+    """
+    features = np.array([int(key[:16], 16) for key in page_keys if key], dtype=np.uint64)
+    if not len(features):
+        return 0
+    ones = ((features[:, None] >> _BIT_SHIFTS) & np.uint64(1)).sum(axis=0)
+    bits = (ones * 2 > len(features)).astype(np.uint64)
+    return int((bits << _BIT_SHIFTS).sum())
+
+
+def _hamming(values, target):
+    """Hamming distances between a uint64 array and one 64-bit value"""
+    diff = (values ^ np.uint64(target)).view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(diff, axis=1).sum(axis=1)
+
+
+class DocumentStore:
+    """Content-addressed blobs plus an extraction cache keyed by content hash"""
+
+    def __init__(self, root, near_duplicate_bits=16, min_shared_pages=0.5):
+        """
+        Args:
+            root: Storage directory (blobs/ and extracted/ are created below it)
+            near_duplicate_bits: Maximum SimHash distance of a near duplicate
+            min_shared_pages: Share of a document's pages that must match an
+                earlier version before it is treated as a revision of it
+        """
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.text_dir = os.path.join(root, 'extracted')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        for path in (self.blob_dir, self.text_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+        self.near_duplicate_bits = near_duplicate_bits
+        self.min_shared_pages = min_shared_pages
+        self._lock = threading.Lock()
+        self._records = {}
+        self._sim_ids = []
+        self._sim_values = np.zeros(0, dtype=np.uint64)
+        self._load()
+
+    def _load(self):
+        for name in os.listdir(self.text_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.text_dir, name)) as f:
+                    record = json.load(f)
+                self._records[record["content_hash"]] = record
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable extraction record {name}: {str(e)}")
+        self._sim_ids = [h for h, r in self._records.items() if r.get("page_keys")]
+        self._sim_values = np.array([self._records[h]["simhash"] for h in self._sim_ids], dtype=np.uint64)
+        if self._records:
+            logger.info(f"Loaded {len(self._records)} cached document extractions")
+
+    def __len__(self):
+        return len(self._records)
+
+    def save_stream(self, stream, filename):
+        """
+        Stream an upload to disk while hashing it; identical content is stored once
+
+        Args:
+            stream: Readable binary file object
+            filename: Original file name (its extension is kept on the blob)
+
+        Returns:
+            Tuple of (content_hash, blob_path, size, created)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = stream.read(STREAM_CHUNK)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            content_hash = digest.hexdigest()
+            blob_path = self.blob_path(content_hash, filename)
+            created = not os.path.exists(blob_path)
+            if created:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_path, blob_path)
+            return content_hash, blob_path, size, created
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def blob_path(self, content_hash, filename):
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(self.blob_dir, content_hash[:2], content_hash + ext)
+
+    def link(self, blob_path, alias_path):
+        """
+        Expose a blob under a readable name (hard link, so no second copy)
+
+        Returns:
+            True if the alias points at the blob
+        """
+        try:
+            if os.path.lexists(alias_path):
+                if os.path.samefile(alias_path, blob_path):
+                    return True
+                os.remove(alias_path)
+            os.link(blob_path, alias_path)
+            return True
+        except OSError as e:
+            logger.warning(f"Could not link {alias_path} to its blob: {str(e)}")
+            return False
+
+    def text_path(self, content_hash):
+        return os.path.join(self.text_dir, content_hash + '.txt')
+
+    def get(self, content_hash):
+        """Cached extraction record for a content hash, or None"""
+        record = self._records.get(content_hash)
+        if record is not None and not os.path.exists(self.text_path(content_hash)):
+            return None
+        return record
+
+    def find_near_duplicate(self, page_keys, exclude=None):
+        """
+        Closest stored document that shares enough pages with `page_keys`
+
+        SimHash distance shortlists candidates; the shared-page share
+        confirms them.
+
+        Returns:
+            Dict with content_hash, filename, distance and shared_pages, or None
+        """
+        keys = [key for key in page_keys if key]
+        if not keys or not len(self._sim_values):
+            return None
+        with self._lock:
+            ids, values = self._sim_ids, self._sim_values
+        distances = _hamming(values, simhash(keys))
+        wanted = set(keys)
+        for i in np.argsort(distances, kind='stable'):
+            if distances[i] > self.near_duplicate_bits:
+                break
+            if ids[i] == exclude:
+                continue
+            record = self._records[ids[i]]
+            shared = len(wanted.intersection(record["page_keys"]))
+            if shared >= self.min_shared_pages * len(keys):
+                return {
+                    "content_hash": ids[i],
+                    "filename": record.get("filename"),
+                    "distance": int(distances[i]),
+                    "shared_pages": shared
+                }
+        return None
+
+    def plan_reuse(self, content_hash, page_keys):
+        """
+        Pages of an earlier version whose extracted text can be reused
+
+        Returns:
+            Tuple of (plan, near_duplicate) where plan is
+            {"text_path": ..., "pages": {page: earlier page}} or None
+        """
+        match = self.find_near_duplicate(page_keys, exclude=content_hash)
+        if match is None:
+            return None, None
+        source = self._records[match["content_hash"]]
+        source_pages = {}
+        for page, key in enumerate(source["page_keys"]):
+            if key:
+                source_pages.setdefault(key, page)
+        pages = {page: source_pages[key] for page, key in enumerate(page_keys) if key in source_pages}
+        if not pages:
+            return None, match
+        return {"text_path": self.text_path(match["content_hash"]), "pages": pages}, match
+
+    def record_extraction(self, content_hash, text_path, filename, pages, characters, truncated,
+                          insights, page_keys, near_duplicate_of=None):
+        """
+        Cache an extraction under its content hash
+
+        Args:
+            text_path: Extracted-text file; moved into the cache
+
+        Returns:
+            Path of the cached text file
+        """
+        cached_path = self.text_path(content_hash)
+        if text_path != cached_path:
+            os.replace(text_path, cached_path)
+        record = {
+            "content_hash": content_hash,
+            "filename": filename,
+            "pages": pages,
+            "characters": characters,
+            "truncated": truncated,
+            "insights": insights,
+            "page_keys": page_keys or [],
+            "simhash": simhash(page_keys or []),
+            "near_duplicate_of": near_duplicate_of,
+            "extracted_at": datetime.utcnow().isoformat()
+        }
+        tmp_path = os.path.join(self.tmp_dir, content_hash + '.json')
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, os.path.join(self.text_dir, content_hash + '.json'))
+        with self._lock:
+            is_new = content_hash not in self._records
+            self._records[content_hash] = record
+            if is_new and record["page_keys"]:
+                self._sim_ids = self._sim_ids + [content_hash]
+                self._sim_values = np.append(self._sim_values, np.uint64(record["simhash"]))
+        return cached_path
@@ -0,0 +1,253 @@
+"""
+Embedding Store - local chunk embeddings for retrieval-augmented prompts
+
+Document passages are embedded on the CPU with a signed hashing vectorizer
+(word unigrams and bigrams hashed into a fixed number of dimensions, no
+model download, no vocabulary to fit) and appended to a raw float32
+matrix file. The matrix is read through a memory map and a JSON-lines
+sidecar maps each row to its document and byte span, so adding a document
+only appends to both files and never rewrites existing rows. Retrieval is
+one matrix-vector product over the candidate rows.
+
+A small metadata file records the store format, the embedding dimensions
+and the chunk size. A store written with different ones is discarded at
+startup, so its documents are chunked and embedded again when they are
+re-added.
+"""
+import json
+import logging
+import os
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from document_index import iter_passages, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Bump when stored rows stop matching what add_document would write today
+# 2: byte offsets of sidecars read without newline translation
+FORMAT_VERSION = 2
+
+
+@lru_cache(maxsize=1 << 17)
+def _feature_hash(feature):
+    return zlib.crc32(feature.encode('utf-8'))
+
+
+class HashingEmbedder:
+    """Signed feature hashing of word unigrams and bigrams, L2-normalised"""
+
+    def __init__(self, dim=512):
+        """
+        Args:
+            dim: Embedding dimensions
+        """
+        self.dim = dim
+
+    def embed(self, texts):
+        """
+        Embed a batch of texts
+
+        Returns:
+            float32 array of shape (len(texts), dim) with unit-length rows
+            (all-zero rows for texts without tokens)
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((_feature_hash(f) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+            counts = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+            # Sublinear term frequency keeps repeated boilerplate from dominating
+            vectors[row] = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class EmbeddingStore:
+    """Append-only memory-mapped float32 chunk matrix with a JSON-lines id sidecar"""
+
+    def __init__(self, path, embedder=None, chunk_words=80):
+        """
+        Args:
+            path: File prefix; `<path>.f32` holds the matrix, `<path>.ids.jsonl` the row ids,
+                `<path>.meta.json` the format they were written in
+            embedder: Embedder with `dim` and `embed(texts)` (default HashingEmbedder())
+            chunk_words: Words per embedded chunk
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.chunk_words = chunk_words
+        self.matrix_path = path + '.f32'
+        self.ids_path = path + '.ids.jsonl'
+        self.meta_path = path + '.meta.json'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._rows = []             # row -> (doc key, page, byte offset, byte length)
+        self._doc_rows = {}         # doc key -> (first row, row count)
+        self._mmap = None
+        self._load()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, doc_key):
+        return doc_key in self._doc_rows
+
+    def _meta(self):
+        return {"format": FORMAT_VERSION, "dim": self.dim, "chunk_words": self.chunk_words}
+
+    def _check_format(self):
+        """Discard rows written in another format (they are re-embedded as documents are re-added)"""
+        try:
+            with open(self.meta_path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = None
+        if stored == self._meta():
+            return
+        if os.path.exists(self.ids_path) or os.path.exists(self.matrix_path):
+            logger.info(f"Chunk embeddings stored as {stored or 'unversioned'}, expected {self._meta()}; "
+                        f"discarding them for re-embedding")
+        for path in (self.matrix_path, self.ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._meta(), f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _load(self):
+        self._check_format()
+        rows, expected, lines = [], {}, 0
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path) as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                        rows.append((entry["doc"], entry["page"], entry["offset"], entry["bytes"]))
+                    except (ValueError, KeyError):
+                        break  # torn final line
+                    if "chunks" in entry:
+                        expected[entry["doc"]] = entry["chunks"]
+        row_bytes = self.dim * 4
+        matrix_rows = os.path.getsize(self.matrix_path) // row_bytes if os.path.exists(self.matrix_path) else 0
+        rows = rows[:matrix_rows]
+        # A crash mid-append can leave the last document short; drop it from both files
+        if rows:
+            last = rows[-1][0]
+            first = len(rows)
+            while first and rows[first - 1][0] == last:
+                first -= 1
+            if len(rows) - first < expected.get(last, 0):
+                rows = rows[:first]
+        if os.path.exists(self.matrix_path) and os.path.getsize(self.matrix_path) != len(rows) * row_bytes:
+            os.truncate(self.matrix_path, len(rows) * row_bytes)
+        if lines != len(rows):
+            with open(self.ids_path, 'w') as f:
+                f.writelines(self._id_lines(rows))
+        for row in rows:
+            self._append_row(row)
+        if rows:
+            logger.info(f"Loaded {len(rows)} chunk embeddings for {len(self._doc_rows)} documents")
+
+    @staticmethod
+    def _id_lines(rows):
+        """Sidecar lines; a document's first row records its chunk count"""
+        counts = {}
+        for row in rows:
+            counts[row[0]] = counts.get(row[0], 0) + 1
+        seen = set()
+        for doc, page, offset, size in rows:
+            entry = {"doc": doc, "page": page, "offset": offset, "bytes": size}
+            if doc not in seen:
+                seen.add(doc)
+                entry["chunks"] = counts[doc]
+            yield json.dumps(entry) + "\n"
+
+    def _append_row(self, row):
+        first, count = self._doc_rows.get(row[0], (len(self._rows), 0))
+        self._doc_rows[row[0]] = (first, count + 1)
+        self._rows.append(row)
+
+    def add_document(self, doc_key, text_path):
+        """
+        Chunk, embed and append a document (no-op if it is already stored)
+
+        Returns:
+            Number of chunks appended
+        """
+        if doc_key in self._doc_rows:
+            return 0
+        chunks = [c for c in iter_passages(text_path, self.chunk_words) if c[3].strip()]
+        if not chunks:
+            return 0
+        vectors = self.embedder.embed([text for _, _, _, text in chunks])
+        rows = [(doc_key, page, offset, size) for page, offset, size, _ in chunks]
+        with self._lock:
+            if doc_key in self._doc_rows:
+                return 0
+            with open(self.matrix_path, 'ab') as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self.ids_path, 'a') as f:
+                f.writelines(self._id_lines(rows))
+            for row in rows:
+                self._append_row(row)
+            self._mmap = None
+        return len(rows)
+
+    def _matrix(self):
+        mmap = self._mmap
+        if mmap is None or len(mmap) != len(self._rows):
+            mmap = np.memmap(self.matrix_path, dtype=np.float32, mode='r', shape=(len(self._rows), self.dim))
+            self._mmap = mmap
+        return mmap
+
+    def search(self, query, top=8, doc_keys=None, min_score=None):
+        """
+        Chunks most similar to a query (cosine similarity)
+
+        Args:
+            query: Query text
+            top: Number of chunks
+            doc_keys: Optional documents to search within
+            min_score: Optional similarity floor
+
+        Returns:
+            List of dicts with doc, page, offset, bytes and score, best first
+        """
+        vector = self.embedder.embed([query])[0]
+        if not vector.any():
+            return []
+        with self._lock:
+            if not self._rows:
+                return []
+            matrix = self._matrix()
+            if doc_keys is None:
+                rows = None
+            else:
+                spans = [self._doc_rows[k] for k in doc_keys if k in self._doc_rows]
+                if not spans:
+                    return []
+                rows = np.concatenate([np.arange(first, first + count) for first, count in spans])
+        scores = (matrix if rows is None else matrix[rows]) @ vector
+        k = min(top, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        results = []
+        for i in best:
+            if min_score is not None and scores[i] < min_score:
+                break
+            row = int(i) if rows is None else int(rows[i])
+            doc, page, offset, size = self._rows[row]
+            results.append({"doc": doc, "page": page + 1, "offset": offset, "bytes": size,
+                            "score": round(float(scores[i]), 4)})
+        return results
@@ -3,21 +3,63 @@ FTO Risk Assessor - Freedom to Operate patent analysis
 """
 import logging
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import chain
+
+import numpy as np
+
+from claim_overlap import DEFAULT_SHINGLE_SIZE, claim_containment
 
 logger = logging.getLogger(__name__)
 
+ACTIVE_STATUSES = ('active', 'granted', 'in force')
+
+# Expiry timeline buckets (index into TIMELINE_BUCKETS; -1 = not on the timeline)
+TIMELINE_BUCKETS = ("near_term", "medium_term", "long_term")
+
+# Default containment of the described use in a claim for HIGH / MEDIUM overlap
+DEFAULT_OVERLAP_THRESHOLDS = {'high': 0.5, 'medium': 0.25}
+
+# Landscape-wide claim matches reported per FTO request
+CLAIM_MATCH_LIMIT = 10
+
+# Markers used while deduplicating patents in assess_portfolio
+_SKIP = -1
+_POSITIONAL = -2
+
+
+def patent_expiry(patent):
+    """Raw expiry string of a patent (mock data uses 'expiry', older feeds 'expiry_date')"""
+    return patent.get('expiry_date') or patent.get('expiry')
+
+
+@lru_cache(maxsize=65536)
+def parse_expiry(expiry):
+    """Parse a YYYY-MM-DD expiry string once; returns None when unparseable"""
+    try:
+        return datetime.strptime(expiry, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
 
 class FTOAssessor:
     """Assesses Freedom to Operate risks based on patent landscape"""
     
-    def __init__(self):
+    def __init__(self, claim_index=None, overlap_thresholds=None):
+        """
+        Args:
+            claim_index: Optional ClaimIndex over patent claim text
+            overlap_thresholds: Optional {'high', 'medium'} claim containment thresholds
+        """
         self.risk_thresholds = {
             'high': (70, 100),
             'medium': (40, 69),
             'low': (0, 39)
         }
+        self.claim_index = claim_index
+        self.overlap_thresholds = dict(DEFAULT_OVERLAP_THRESHOLDS, **(overlap_thresholds or {}))
     
-    def assess_fto_risk(self, molecule, patent_data, trade_data=None):
+    def assess_fto_risk(self, molecule, patent_data, trade_data=None, today=None, use_description=None):
         """
         Assess Freedom to Operate risks
         
@@ -25,6 +67,10 @@ class FTOAssessor:
             molecule: Molecule name
             patent_data: Patent information from Patent Agent
             trade_data: Trade data for market context
+            today: Reference datetime for expiry math (defaults to now)
+            use_description: Optional described use / formulation; claim text
+                is compared against it instead of estimating overlap from
+                the claim count
             
         Returns:
             Dictionary with FTO risk assessment
@@ -41,8 +87,9 @@ class FTOAssessor:
         
         if patent_data and len(patent_data) > 0:
             # Analyze patent landscape
-            fto_analysis["patent_threats"] = self._identify_patent_threats(patent_data)
-            fto_analysis["expiry_timeline"] = self._analyze_expiry_timeline(patent_data)
+            today = today or datetime.now()
+            fto_analysis["patent_threats"] = self._identify_patent_threats(patent_data, today, use_description)
+            fto_analysis["expiry_timeline"] = self._analyze_expiry_timeline(patent_data, today)
             fto_analysis["overall_fto_risk_score"] = self._calculate_risk_score(
                 patent_data,
                 fto_analysis["patent_threats"]
@@ -53,10 +100,7 @@ class FTOAssessor:
         
         # Determine risk level
         risk_score = fto_analysis["overall_fto_risk_score"]
-        for level, (min_val, max_val) in self.risk_thresholds.items():
-            if min_val <= risk_score <= max_val:
-                fto_analysis["risk_level"] = level.upper()
-                break
+        fto_analysis["risk_level"] = self._risk_level(risk_score)
         
         # Generate recommendations
         fto_analysis["recommendations"] = self._generate_recommendations(
@@ -64,36 +108,268 @@ class FTOAssessor:
             fto_analysis["patent_threats"]
         )
         
+        # Landscape-wide patents whose claims overlap the described use
+        if use_description and self.claim_index is not None:
+            fto_analysis["claim_overlaps"] = self.claim_index.query(
+                use_description, top=CLAIM_MATCH_LIMIT, min_containment=self.overlap_thresholds['medium']
+            )
+        
         logger.info(f"FTO Assessment for {molecule}: Risk Score {risk_score}, Level {fto_analysis['risk_level']}")
         return fto_analysis
     
-    def _identify_patent_threats(self, patent_data):
+    def assess_portfolio(self, patents_by_molecule, today=None, use_descriptions=None):
+        """
+        Assess FTO risk for many molecules at once, sharing work on common patents
+        
+        Patents are deduplicated across molecules, their threat attributes and
+        timeline entries are computed once per distinct patent, and the
+        per-molecule aggregation (ordering, counts, risk score) is vectorized
+        over the molecule -> patent references. Each result matches what
+        assess_fto_risk returns for that molecule; threat and timeline entries
+        of a shared patent are the same dict objects across molecules, so
+        treat the results as read-only.
+        
+        Args:
+            patents_by_molecule: Dict of molecule -> patent list
+            today: Reference datetime for expiry math (defaults to now)
+            use_descriptions: Optional dict of molecule -> described use /
+                formulation, as `use_description` of assess_fto_risk
+            
+        Returns:
+            Dict of molecule -> fto_analysis
+        """
+        today = today or datetime.now()
+        molecules = list(patents_by_molecule)
+        use_descriptions = use_descriptions or {}
+        
+        # Claim overlap depends on the described use, so a patent is distinct per (object, use)
+        uses = [use_descriptions.get(molecule) or None for molecule in molecules]
+        use_ids = {}
+        mol_use = np.fromiter((use_ids.setdefault(use, len(use_ids)) for use in uses), dtype=np.int64,
+                              count=len(molecules))
+        distinct_uses = list(use_ids)
+        
+        # Flatten the molecule -> patent references and group them by patent object
+        patent_lists = [patents_by_molecule[molecule] or () for molecule in molecules]
+        counts = np.fromiter(map(len, patent_lists), dtype=np.int64, count=len(molecules))
+        flat = list(chain.from_iterable(patent_lists))
+        object_ids = np.fromiter(map(id, flat), dtype=np.int64, count=len(flat))
+        n_mol = len(molecules)
+        ref_mol = np.repeat(np.arange(n_mol, dtype=np.int64), counts)
+        ref_use = mol_use[ref_mol]
+        keys = object_ids if len(distinct_uses) <= 1 else np.stack((object_ids, ref_use), axis=1)
+        first, ref_object = np.unique(keys, axis=0, return_index=True, return_inverse=True)[1:]
+        ref_object = ref_object.reshape(-1)
+        ref_position = np.arange(len(flat), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        
+        # Compute attributes once per distinct patent: same object, else same content.
+        # Unnamed patents are reported as Patent_<position>, so position is part of their identity
+        by_content, claims_keys, expiry_cache, status_cache = {}, {}, {}, {}
+        threats, summaries, threat_years, bucket, many_claims = [], [], [], [], []
+        object_patent = np.full(len(first), _SKIP, dtype=np.int64)
+        positional = []
+        for o, index in enumerate(first.tolist()):
+            patent = flat[index]
+            if not isinstance(patent, dict):
+                continue
+            if 'patent_id' not in patent:
+                object_patent[o] = _POSITIONAL
+                positional.append(o)
+                continue
+            object_patent[o] = self._distinct_patent(
+                patent, None, distinct_uses[ref_use[index]], today, by_content, claims_keys, expiry_cache, status_cache,
+                threats, summaries, threat_years, bucket, many_claims
+            )
+        ref_patent = object_patent[ref_object]
+        if positional:
+            for r in np.nonzero(ref_patent == _POSITIONAL)[0].tolist():
+                ref_patent[r] = self._distinct_patent(
+                    flat[r], int(ref_position[r]), distinct_uses[ref_use[r]], today, by_content, claims_keys, expiry_cache, status_cache,
+                    threats, summaries, threat_years, bucket, many_claims
+                )
+        keep = ref_patent != _SKIP
+        ref_mol, ref_patent = ref_mol[keep], ref_patent[keep]
+        
+        n = len(threats)
+        threat_years = np.array(threat_years, dtype=np.float64)
+        bucket = np.array(bucket, dtype=np.int64)
+        many_claims = np.array(many_claims, dtype=bool)
+        is_threat = np.array([t is not None for t in threats], dtype=bool)[ref_patent] if n else np.zeros(0, dtype=bool)
+        
+        # Threats: per molecule, by rounded years remaining (descending, stable)
+        t_mol, t_patent = ref_mol[is_threat], ref_patent[is_threat]
+        order = np.lexsort((-threat_years[t_patent], t_mol))
+        t_patent = t_patent[order]
+        t_bounds = np.concatenate(([0], np.cumsum(np.bincount(t_mol, minlength=n_mol))))
+        
+        # Timeline: per molecule and bucket, in patent order
+        on_timeline = bucket[ref_patent] >= 0
+        tl_mol, tl_patent = ref_mol[on_timeline], ref_patent[on_timeline]
+        tl_bucket = bucket[tl_patent]
+        order = np.lexsort((tl_bucket, tl_mol))
+        tl_patent = tl_patent[order]
+        tl_bounds = np.concatenate(([0], np.cumsum(np.bincount(
+            tl_mol * len(TIMELINE_BUCKETS) + tl_bucket, minlength=n_mol * len(TIMELINE_BUCKETS)
+        ))))
+        
+        # Risk score: base + 8 per threat + 5 per claim-heavy patent - 5 per threat expiring within 2 years
+        score = (
+            20
+            + 8 * np.bincount(t_mol, minlength=n_mol)
+            + 5 * np.bincount(ref_mol, weights=many_claims[ref_patent], minlength=n_mol).astype(np.int64)
+            - 5 * np.bincount(t_mol, weights=threat_years[ref_patent[is_threat]] < 2, minlength=n_mol).astype(np.int64)
+        )
+        score = np.clip(score, 0, 100)
+        
+        claim_overlaps = {}
+        results = {}
+        t_patent, t_bounds, tl_patent, tl_bounds = t_patent.tolist(), t_bounds.tolist(), tl_patent.tolist(), tl_bounds.tolist()
+        for m, molecule in enumerate(molecules):
+            fto_analysis = {
+                "molecule": molecule,
+                "overall_fto_risk_score": 0,
+                "risk_level": "Unknown",
+                "patent_threats": [],
+                "expiry_timeline": {},
+                "recommendations": [],
+                "confidence": 85
+            }
+            
+            if patents_by_molecule[molecule]:
+                fto_analysis["patent_threats"] = [threats[u] for u in t_patent[t_bounds[m]:t_bounds[m + 1]]]
+                base = m * len(TIMELINE_BUCKETS)
+                fto_analysis["expiry_timeline"] = {
+                    name: [summaries[u] for u in tl_patent[tl_bounds[base + b]:tl_bounds[base + b + 1]]]
+                    for b, name in enumerate(TIMELINE_BUCKETS)
+                }
+                fto_analysis["overall_fto_risk_score"] = int(score[m])
+            else:
+                fto_analysis["overall_fto_risk_score"] = 45
+            
+            fto_analysis["risk_level"] = self._risk_level(fto_analysis["overall_fto_risk_score"])
+            fto_analysis["recommendations"] = self._generate_recommendations(
+                fto_analysis["risk_level"],
+                fto_analysis["patent_threats"]
+            )
+            use_description = uses[m]
+            if use_description and self.claim_index is not None:
+                if use_description not in claim_overlaps:
+                    claim_overlaps[use_description] = self.claim_index.query(
+                        use_description, top=CLAIM_MATCH_LIMIT, min_containment=self.overlap_thresholds['medium']
+                    )
+                fto_analysis["claim_overlaps"] = claim_overlaps[use_description]
+            results[molecule] = fto_analysis
+        
+        logger.info(f"Portfolio FTO scan: {n_mol} molecules, {len(ref_patent)} patent references, {n} distinct patents")
+        return results
+    
+    def _distinct_patent(self, patent, position, use_description, today, by_content, claims_keys, expiry_cache,
+                         status_cache, threats, summaries, threat_years, bucket, many_claims):
+        """Index of a patent among the distinct patents of a scan, adding it if its content is new"""
+        expiry = patent_expiry(patent)
+        claims = patent.get('claims', [])
+        content_key = (
+            patent.get('patent_id'), position, patent.get('status', 'Unknown'),
+            expiry, patent.get('owner', 'Unknown'), self._claims_key(claims, claims_keys),
+            use_description if claims else None
+        )
+        u = by_content.get(content_key)
+        if u is None:
+            u = by_content[content_key] = len(threats)
+            self._add_patent_attributes(
+                patent, position, use_description, expiry, claims, today, expiry_cache, status_cache,
+                threats, summaries, threat_years, bucket, many_claims
+            )
+        return u
+    
+    def _add_patent_attributes(self, patent, position, use_description, expiry, claims, today, expiry_cache,
+                               status_cache, threats, summaries, threat_years, bucket, many_claims):
+        """Append the threat/timeline attributes of one distinct patent to the per-patent columns"""
+        if expiry not in expiry_cache:
+            expiry_date = parse_expiry(expiry) if expiry else None
+            years_remaining = (expiry_date - today).days / 365.25 if expiry_date else None
+            expiry_cache[expiry] = years_remaining
+        years_remaining = expiry_cache[expiry]
+        many_claims.append(len(claims or ()) > 20)
+        
+        if years_remaining is None or years_remaining < 0:
+            threats.append(None)
+            summaries.append(None)
+            threat_years.append(0.0)
+            bucket.append(-1)
+            return
+        
+        summaries.append({
+            "patent_id": patent.get('patent_id', 'Unknown'),
+            "expiry_date": expiry,
+            "years_remaining": round(years_remaining, 1)
+        })
+        bucket.append(0 if years_remaining <= 3 else 1 if years_remaining <= 7 else 2)
+        
+        status = patent.get('status', 'Unknown')
+        is_active = status_cache.get(status)
+        if is_active is None:
+            is_active = status_cache[status] = str(status).lower() in ACTIVE_STATUSES
+        
+        if is_active and years_remaining > 0:
+            threats.append({
+                "patent_id": patent.get('patent_id', f'Patent_{position}'),
+                "owner": patent.get('owner', 'Unknown'),
+                "expiry_date": expiry,
+                "years_remaining": round(years_remaining, 1),
+                "threat_severity": 'HIGH' if years_remaining > 3 else 'MEDIUM',
+                "claims_count": len(claims) if claims else 0,
+                "risk_overlap": self._assess_claim_overlap(claims, use_description)
+            })
+            threat_years.append(threats[-1]["years_remaining"])
+        else:
+            threats.append(None)
+            threat_years.append(0.0)
+    
+    @staticmethod
+    def _claims_key(claims, cache):
+        """Hashable form of a claims list, cached per list object"""
+        key = cache.get(id(claims))
+        if key is None:
+            try:
+                key = tuple(claims) if isinstance(claims, (list, tuple)) else claims
+                hash(key)
+            except TypeError:
+                key = repr(claims)
+            # Keep the list alive alongside its key so the id cannot be reused
+            cache[id(claims)] = key = (key, claims)
+        return key[0]
+    
+    def _risk_level(self, risk_score):
+        """Map a risk score onto the configured risk level thresholds"""
+        for level, (min_val, max_val) in self.risk_thresholds.items():
+            if min_val <= risk_score <= max_val:
+                return level.upper()
+        return "Unknown"
+    
+    def _identify_patent_threats(self, patent_data, today=None, use_description=None):
         """Identify active patent threats"""
         threats = []
         
-        today = datetime.now()
+        today = today or datetime.now()
         
         for i, patent in enumerate(patent_data):
             if not isinstance(patent, dict):
                 continue
             
             patent_id = patent.get('patent_id', f'Patent_{i}')
-            expiry = patent.get('expiry_date')
+            expiry = patent_expiry(patent)
             status = patent.get('status', 'Unknown')
             claims = patent.get('claims', [])
             
             # Check if patent is still active
-            is_active = status.lower() in ['active', 'granted', 'in force']
+            is_active = status.lower() in ACTIVE_STATUSES
             
-            # Parse expiry date
-            if expiry:
-                try:
-                    expiry_date = datetime.strptime(expiry, "%Y-%m-%d")
-                    years_remaining = (expiry_date - today).days / 365.25
-                    is_expired = years_remaining <= 0
-                except:
-                    is_expired = False
-                    years_remaining = 0
+            # Parse expiry date (cached across requests)
+            expiry_date = parse_expiry(expiry) if expiry else None
+            if expiry_date:
+                years_remaining = (expiry_date - today).days / 365.25
+                is_expired = years_remaining <= 0
             else:
                 is_expired = False
                 years_remaining = 0
@@ -108,17 +384,28 @@ class FTOAssessor:
                     "years_remaining": round(years_remaining, 1),
                     "threat_severity": threat_severity,
                     "claims_count": len(claims) if claims else 0,
-                    "risk_overlap": self._assess_claim_overlap(claims)
+                    "risk_overlap": self._assess_claim_overlap(claims, use_description)
                 })
         
         return sorted(threats, key=lambda x: x['years_remaining'], reverse=True)
     
-    def _assess_claim_overlap(self, claims):
+    def _assess_claim_overlap(self, claims, use_description=None):
         """Assess how much patent claims overlap with our molecule"""
         if not claims:
             return "Unknown"
         
-        # Simulate claim overlap assessment
+        # Compare claim text with the described use when both are available
+        if use_description:
+            shingle_size = self.claim_index.shingle_size if self.claim_index is not None else DEFAULT_SHINGLE_SIZE
+            containment = claim_containment(use_description, claims, shingle_size)
+            if containment is not None:
+                if containment >= self.overlap_thresholds['high']:
+                    return "HIGH"
+                elif containment >= self.overlap_thresholds['medium']:
+                    return "MEDIUM"
+                return "LOW"
+        
+        # Fall back to estimating overlap from the claim count
         overlap_score = min(len(claims) * 15, 100)  # Higher claims = higher risk
         
         if overlap_score > 70:
@@ -128,7 +415,7 @@ class FTOAssessor:
         else:
             return "LOW"
     
-    def _analyze_expiry_timeline(self, patent_data):
+    def _analyze_expiry_timeline(self, patent_data, today=None):
         """Analyze patent expiry timeline"""
         timeline = {
             "near_term": [],  # 0-3 years
@@ -136,34 +423,37 @@ class FTOAssessor:
             "long_term": []  # 7+ years
         }
         
-        today = datetime.now()
+        today = today or datetime.now()
         
         for patent in patent_data:
             if not isinstance(patent, dict):
                 continue
             
-            expiry = patent.get('expiry_date')
+            expiry = patent_expiry(patent)
             if not expiry:
                 continue
             
-            try:
-                expiry_date = datetime.strptime(expiry, "%Y-%m-%d")
-                years_remaining = (expiry_date - today).days / 365.25
-                
-                patent_summary = {
-                    "patent_id": patent.get('patent_id', 'Unknown'),
-                    "expiry_date": expiry,
-                    "years_remaining": round(years_remaining, 1)
-                }
-                
-                if 0 <= years_remaining <= 3:
-                    timeline["near_term"].append(patent_summary)
-                elif 3 < years_remaining <= 7:
-                    timeline["medium_term"].append(patent_summary)
-                else:
-                    timeline["long_term"].append(patent_summary)
-            except:
-                pass
+            expiry_date = parse_expiry(expiry)
+            if not expiry_date:
+                continue
+            
+            years_remaining = (expiry_date - today).days / 365.25
+            if years_remaining < 0:
+                # Already expired: not part of the forward-looking timeline
+                continue
+            
+            patent_summary = {
+                "patent_id": patent.get('patent_id', 'Unknown'),
+                "expiry_date": expiry,
+                "years_remaining": round(years_remaining, 1)
+            }
+            
+            if years_remaining <= 3:
+                timeline["near_term"].append(patent_summary)
+            elif years_remaining <= 7:
+                timeline["medium_term"].append(patent_summary)
+            else:
+                timeline["long_term"].append(patent_summary)
         
         return timeline
     
@@ -1,14 +1,21 @@
+import asyncio
+import functools
 import logging
 import os
-import json
+import time
 from typing import Optional
 
+from document_index import read_span
+from llm_client import LLMCancelled, get_llm_client
+from streaming import StreamCancelled
+
 logger = logging.getLogger(__name__)
 
 try:
-    from config import API_CONFIG
+    from config import API_CONFIG, INTERNAL_INSIGHTS_CONFIG
 except Exception:
     API_CONFIG = {}
+    INTERNAL_INSIGHTS_CONFIG = {}
 
 class InternalInsightsAgent:
     """Internal Knowledge and Document Analysis Agent
@@ -16,97 +23,270 @@ class InternalInsightsAgent:
     This agent can optionally call an LLM (OpenAI) to generate a summary.
     If `emitter` is provided to `summarize_docs` the agent will stream tokens
     produced by the LLM through the emitter as incremental events.
+
+    Evidence comes from the BM25 passage index over uploaded documents
+    (`DocumentIndex`): only the top passages for the molecule are used,
+    never whole documents. The LLM prompt carries the document chunks most
+    similar to the request (`EmbeddingStore`), capped at a few KB.
+    Completions are cached (`LLMResponseCache`) and replayed as a token
+    stream while the model, prompt and retrieved context are unchanged.
+    `asummarize_docs` is the coroutine version used by `AsyncMasterAgent`.
     """
 
-    def summarize_docs(self, molecule: str, emitter: Optional[callable] = None):
+    def __init__(self, document_index=None, embedding_store=None, llm_client=None, response_cache=None):
+        self.document_index = document_index
+        self.embedding_store = embedding_store
+        self.response_cache = response_cache
+        self._llm = llm_client
+
+    @property
+    def llm(self):
+        """LLM client (the shared pooled client unless one was injected)"""
+        if self._llm is None:
+            self._llm = get_llm_client()
+        return self._llm
+
+    def retrieve_passages(self, molecule: str, top: Optional[int] = None):
+        """Top-ranked passages from the molecule's uploaded documents"""
+        if self.document_index is None:
+            return []
+        query = f"{molecule} {INTERNAL_INSIGHTS_CONFIG.get('QUERY', '')}"
+        return self.document_index.search(
+            query, molecule=molecule, top=top or INTERNAL_INSIGHTS_CONFIG.get('TOP_PASSAGES', 5)
+        )
+
+    def build_context(self, molecule: str, passages=None):
+        """
+        Document text for the LLM prompt, within LLM_CONTEXT_BYTES
+
+        Uses the molecule's chunks most similar to the summary request, or
+        the BM25 passage snippets when no embedding store is available.
+
+        Returns:
+            Tuple of (context lines, bytes used)
+        """
+        budget = INTERNAL_INSIGHTS_CONFIG.get('LLM_CONTEXT_BYTES', 4096)
+        candidates = []
+        if self.embedding_store is not None and self.document_index is not None:
+            docs = {d["key"]: d for d in self.document_index.documents(molecule)}
+            hits = self.embedding_store.search(
+                f"{molecule} {INTERNAL_INSIGHTS_CONFIG.get('QUERY', '')}",
+                top=INTERNAL_INSIGHTS_CONFIG.get('CONTEXT_CHUNKS', 8), doc_keys=list(docs),
+                min_score=INTERNAL_INSIGHTS_CONFIG.get('MIN_CONTEXT_SIMILARITY')
+            )
+            for hit in hits:
+                doc = docs[hit["doc"]]
+                text = " ".join(read_span(doc["text_path"], hit["offset"], hit["bytes"]).split())
+                candidates.append((doc["filename"], hit["page"], text))
+        else:
+            candidates = [(p["filename"], p["page"], p["snippet"]) for p in passages or []]
+
+        context, used, seen = [], 0, set()
+        for filename, page, text in candidates:
+            if text in seen:
+                continue
+            seen.add(text)
+            line = f"[{len(context) + 1}] {filename} p.{page}: {text}"
+            size = len(line.encode('utf-8')) + 1
+            if used + size > budget:
+                continue
+            context.append(line)
+            used += size
+        return context, used
+
+    def summarize_docs(self, molecule: str, emitter: Optional[callable] = None, lane: str = "interactive",
+                       cancel=None):
         """Summarize internal company documents and knowledge base.
 
         If an `OPENAI_API_KEY` is available in `API_CONFIG` or the environment,
-        the agent will call OpenAI Chat Completions API with `stream=true` and
-        forward token deltas to `emitter` as they arrive.
+        the agent will stream a chat completion through the shared `LLMClient`
+        (`LLM_CONFIG['BASE_URL']`, OpenAI by default) and forward token deltas
+        to `emitter` as they arrive.
 
         Args:
             molecule: Molecule name
             emitter: Optional callable to receive streaming JSON events
+            lane: LLM governor lane ("interactive" or "batch")
+            cancel: Optional cancel token; stops the LLM stream (and closes its
+                connection) once set
         Returns:
             Summary dict (non-streaming) or a minimal dict when streaming is used.
         """
         try:
             logger.info(f"Internal: Analyzing documents for {molecule}")
+            evidence = self._evidence(molecule)
 
-            api_key = API_CONFIG.get('OPENAI_API_KEY') if isinstance(API_CONFIG, dict) else None
-            api_key = api_key or os.getenv('OPENAI_API_KEY')
-
-            if api_key and emitter:
-                # Perform streaming request to OpenAI Chat Completions
-                import requests
-
-                url = 'https://api.openai.com/v1/chat/completions'
-                headers = {
-                    'Authorization': f'Bearer {api_key}',
-                    'Content-Type': 'application/json'
-                }
-
-                system_prompt = (
-                    "You are an internal R&D assistant. Summarize internal documents and "
-                    "produce concise key takeaways, strategic implications, and suggested next steps."
-                )
-
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Summarize internal documents for {molecule}."}
-                ]
-
-                payload = {
-                    "model": API_CONFIG.get('LLM_MODEL', 'gpt-4o-mini') if isinstance(API_CONFIG, dict) else 'gpt-4o-mini',
-                    "messages": messages,
-                    "temperature": 0.2,
-                    "stream": True
-                }
-
-                # Stream response and forward token deltas
-                with requests.post(url, headers=headers, json=payload, stream=True, timeout=120) as resp:
-                    resp.raise_for_status()
-                    for line in resp.iter_lines(decode_unicode=True):
-                        if not line:
-                            continue
-                        # OpenAI streaming lines are like: "data: {json}"
-                        try:
-                            text = line.lstrip('data:').strip()
-                            if text == '[DONE]':
-                                break
-                            data = json.loads(text)
-                            # Extract token delta
-                            choices = data.get('choices', [])
-                            for ch in choices:
-                                delta = ch.get('delta', {})
-                                content = delta.get('content')
-                                if content:
-                                    emitter({"type": "llm_token", "data": content})
-                        except json.JSONDecodeError:
-                            # ignore malformed lines
-                            continue
+            if self._llm_enabled() and emitter:
+                request, cached = self._llm_request(molecule, evidence)
+                if cached is not None:
+                    # Replay the cached completion as the same token stream
+                    tokens = list(self.response_cache.replay(cached))
+                    for content in tokens:
+                        emitter({"type": "llm_token", "data": content})
+                else:
+                    # Stream response and forward token deltas (pooled connection, retried before the first token)
+                    tokens = []
+                    llm_start = time.perf_counter()
+                    for content in self.llm.stream_chat(request["messages"], model=request["model"], lane=lane,
+                                                        cancel=cancel, **request["params"]):
+                        tokens.append(content)
+                        emitter({"type": "llm_token", "data": content})
+                    self._store_completion(request, tokens, llm_start)
 
                 # When streaming finishes, emit a done event so master can proceed
                 emitter({"type": "llm_done", "message": "LLM streaming complete"})
-                # Return a placeholder; final MIT will be built by the master agent
-                return {"summary_source": "streamed_llm"}
+                return self._llm_result(evidence, request, tokens, cached)
 
-            # Fallback: no API key or no emitter — return a static summary
-            return {
-                "key_takeaways": [
-                    f"Internal research suggests {molecule} has strong potential in oncology repurposing.",
-                    f"Previous internal trials showed promising results in Phase II studies.",
-                    f"Patent landscape review indicates freedom to operate in major markets."
-                ],
-                "strategic_implications": f"High priority molecule for investment and development portfolio expansion",
-                "internal_notes": f"Recommended to proceed with Phase III clinical trials planning",
-                "documents_analyzed": 45,
-                "last_updated": "2024-12-15"
-            }
+            return self._document_summary(molecule, evidence)
 
+        except StreamCancelled:
+            raise
+        except LLMCancelled:
+            # The caller stops at its own cancellation checkpoint; a partial summary is not cached
+            logger.info(f"Internal: Summary for {molecule} cancelled")
+            return {}
         except Exception as e:
             logger.error(f"Internal: Error summarizing documents: {str(e)}")
             if emitter:
                 emitter({"type": "error", "message": str(e)})
             return {}
+
+    async def asummarize_docs(self, molecule: str, emitter=None, lane: str = "interactive", cancel=None,
+                              run_blocking=None):
+        """
+        Coroutine version of `summarize_docs` for the asyncio serving path
+
+        Passage retrieval and context building (index and file reads) run
+        through `run_blocking`; the LLM completion streams over the client's
+        asyncio connections, so a waiting summary holds no thread.
+
+        Args:
+            molecule: Molecule name
+            emitter: Optional coroutine function receiving streaming events
+            lane: LLM governor lane ("interactive" or "batch")
+            cancel: Optional cancel token
+            run_blocking: Coroutine function `run_blocking(func, *args)` running
+                blocking work off the loop (default: the loop's default executor)
+        Returns:
+            Same dicts as `summarize_docs`
+        """
+        run_blocking = run_blocking or functools.partial(asyncio.get_running_loop().run_in_executor, None)
+        try:
+            logger.info(f"Internal: Analyzing documents for {molecule}")
+            evidence = await run_blocking(self._evidence, molecule)
+
+            if self._llm_enabled() and emitter:
+                request, cached = await run_blocking(self._llm_request, molecule, evidence)
+                if cached is not None:
+                    tokens = list(self.response_cache.replay(cached))
+                    for content in tokens:
+                        await emitter({"type": "llm_token", "data": content})
+                else:
+                    tokens = []
+                    llm_start = time.perf_counter()
+                    async for content in self.llm.astream_chat(request["messages"], model=request["model"],
+                                                               lane=lane, cancel=cancel, **request["params"]):
+                        tokens.append(content)
+                        await emitter({"type": "llm_token", "data": content})
+                    await run_blocking(self._store_completion, request, tokens, llm_start)
+
+                await emitter({"type": "llm_done", "message": "LLM streaming complete"})
+                return self._llm_result(evidence, request, tokens, cached)
+
+            return self._document_summary(molecule, evidence)
+
+        except StreamCancelled:
+            raise
+        except LLMCancelled:
+            logger.info(f"Internal: Summary for {molecule} cancelled")
+            return {}
+        except Exception as e:
+            logger.error(f"Internal: Error summarizing documents: {str(e)}")
+            if emitter:
+                await emitter({"type": "error", "message": str(e)})
+            return {}
+
+    def _llm_enabled(self):
+        api_key = API_CONFIG.get('OPENAI_API_KEY') if isinstance(API_CONFIG, dict) else None
+        return bool(api_key or os.getenv('OPENAI_API_KEY'))
+
+    def _evidence(self, molecule):
+        """Top passages, retrieval time and the molecule's documents"""
+        start = time.perf_counter()
+        passages = self.retrieve_passages(molecule)
+        retrieval_ms = round((time.perf_counter() - start) * 1000, 2)
+        documents = self.document_index.documents(molecule) if self.document_index is not None else []
+        return {"passages": passages, "retrieval_ms": retrieval_ms, "documents": documents}
+
+    def _llm_request(self, molecule, evidence):
+        """Chat request for the summary and its cached completion (or None)"""
+        system_prompt = (
+            "You are an internal R&D assistant. Summarize internal documents and "
+            "produce concise key takeaways, strategic implications, and suggested next steps."
+        )
+
+        context, context_bytes = self.build_context(molecule, evidence["passages"])
+        user_prompt = f"Summarize internal documents for {molecule}."
+        if context:
+            user_prompt += "\n\nMost relevant passages:\n" + "\n".join(context)
+
+        request = {
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "model": self.llm.model,
+            "params": {"temperature": 0.2},
+            "scope": molecule.strip().lower(),
+            "context": context,
+            "context_bytes": context_bytes
+        }
+        cached = None
+        if self.response_cache is not None:
+            cached = self.response_cache.lookup(request["model"], request["messages"], request["params"],
+                                                scope=request["scope"], context=request["context"])
+        return request, cached
+
+    def _store_completion(self, request, tokens, llm_start):
+        if self.response_cache is not None and tokens:
+            self.response_cache.store(request["model"], request["messages"], tokens, request["params"],
+                                      scope=request["scope"], context=request["context"],
+                                      latency_ms=(time.perf_counter() - llm_start) * 1000)
+
+    def _llm_result(self, evidence, request, tokens, cached):
+        result = {
+            "summary_source": "cached_llm" if cached is not None else "streamed_llm",
+            "summary": "".join(tokens),
+            "passages": evidence["passages"],
+            "documents_analyzed": len(evidence["documents"]),
+            "context_chunks": len(request["context"]),
+            "context_bytes": request["context_bytes"]
+        }
+        if cached is not None:
+            result["cache_match"] = cached["match"]
+            result["cache_similarity"] = cached["similarity"]
+        return result
+
+    def _document_summary(self, molecule, evidence):
+        """Fallback without an LLM (no API key or no emitter): summarize from the retrieved passages"""
+        passages, documents = evidence["passages"], evidence["documents"]
+        if not passages:
+            return {
+                "key_takeaways": [],
+                "strategic_implications": "",
+                "internal_notes": f"No internal documents uploaded for {molecule}",
+                "documents_analyzed": len(documents),
+                "last_updated": None
+            }
+        terms = INTERNAL_INSIGHTS_CONFIG.get('STRATEGY_TERMS', ())
+        strategic = [p["snippet"] for p in passages if any(term in p["snippet"].lower() for term in terms)]
+        filenames = sorted({p["filename"] for p in passages})
+        return {
+            "key_takeaways": [p["snippet"] for p in passages[:3]],
+            "strategic_implications": " ".join(strategic),
+            "internal_notes": f"Based on {len(passages)} passages from {', '.join(filenames)}",
+            "passages": passages,
+            "documents_analyzed": len(documents),
+            "retrieval_ms": evidence["retrieval_ms"],
+            "last_updated": max(d["indexed_at"] for d in documents)
+        }
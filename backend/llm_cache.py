@@ -0,0 +1,233 @@
+"""
+LLM Cache - exact and near-duplicate cache of LLM completions
+
+A completion is stored under a fingerprint of everything that determines
+it: model, messages (system prompt plus the user prompt that carries the
+retrieved context) and sampling parameters. An unchanged request is
+answered from the cache; optionally, a request whose user prompt is a
+near duplicate (cosine similarity of hashing embeddings) of a cached one
+within the same scope, model, system prompt, parameters and retrieved
+context is answered with that completion, so only the question wording
+may differ. Cached completions keep their original token
+deltas so they can be replayed as a stream.
+
+Completions are appended to a JSON-lines file and reloaded at startup.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_store import HashingEmbedder
+from llm_client import estimate_tokens
+from utils import fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """LRU cache of LLM completions with exact and semantic lookup"""
+
+    def __init__(self, path=None, max_entries=1024, ttl=None, semantic_threshold=None, embedder=None):
+        """
+        Args:
+            path: Optional JSON-lines file persisting completions across restarts
+            max_entries: Completions kept (least recently used are evicted)
+            ttl: Optional seconds a completion stays valid
+            semantic_threshold: Cosine similarity at which a cached user prompt
+                counts as a near duplicate (None: exact matches only)
+            embedder: Prompt embedder for semantic lookup (default HashingEmbedder())
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.embedder = (embedder or HashingEmbedder()) if semantic_threshold is not None else None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> entry dict
+        self._families = {}             # (scope, model, system prompt, params, context) key -> {key: vector}
+        self._stats = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0, "stores": 0, "evictions": 0,
+                       "saved_prompt_tokens": 0, "saved_completion_tokens": 0, "latency_avoided_ms": 0.0}
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._load()
+
+    @staticmethod
+    def _split(messages):
+        system = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        user = "\n".join(m.get("content", "") for m in messages if m.get("role") != "system")
+        return system, user
+
+    def key(self, model, messages, params=None):
+        """Exact cache key of a request"""
+        return fingerprint("llm", model, messages, params or {})
+
+    def _family(self, scope, model, messages, params, context):
+        return fingerprint("llm-family", scope, model, self._split(messages)[0], params or {}, context or [])
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path) as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn final line
+                self._insert(entry)
+        if lines > len(self._entries):
+            self._rewrite()
+        if self._entries:
+            logger.info(f"Loaded {len(self._entries)} cached LLM completions")
+
+    def _rewrite(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.time() - entry["created"] > self.ttl
+
+    def _insert(self, entry):
+        if self._expired(entry):
+            return
+        self._drop(entry["key"])
+        self._entries[entry["key"]] = entry
+        if self.embedder is not None:
+            vector = self.embedder.embed([entry["prompt"]])[0]
+            self._families.setdefault(entry["family"], {})[entry["key"]] = vector
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry["family"] in self._families:
+            family = self._families[entry["family"]]
+            family.pop(key, None)
+            if not family:
+                del self._families[entry["family"]]
+
+    def lookup(self, model, messages, params=None, scope=None, context=None):
+        """
+        Cached completion for a request
+
+        Args:
+            model: Model name
+            messages: Chat messages
+            params: Sampling parameters (temperature, max_tokens, ...)
+            scope: Semantic matches never cross scopes (e.g. the molecule)
+            context: Retrieved passages carried by the prompt; semantic
+                matches require the same passages
+
+        Returns:
+            Dict with text, tokens, match ("exact" or "semantic"), similarity,
+            prompt_tokens, completion_tokens and latency_ms of the original
+            generation, or None on a miss
+        """
+        key = self.key(model, messages, params)
+        with self._lock:
+            self._stats["lookups"] += 1
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._drop(key)
+                entry = None
+            match, similarity = "exact", 1.0
+            if entry is None and self.embedder is not None:
+                entry, similarity = self._nearest(self._family(scope, model, messages, params, context), messages)
+                match = "semantic"
+            if entry is None:
+                return None
+            self._entries.move_to_end(entry["key"])
+            self._stats[f"{match}_hits"] += 1
+            self._stats["saved_prompt_tokens"] += entry["prompt_tokens"]
+            self._stats["saved_completion_tokens"] += entry["completion_tokens"]
+            self._stats["latency_avoided_ms"] += entry["latency_ms"]
+        return dict(entry, match=match, similarity=round(similarity, 4))
+
+    def _nearest(self, family_key, messages):
+        family = self._families.get(family_key)
+        if not family:
+            return None, 0.0
+        vector = self.embedder.embed([self._split(messages)[1]])[0]
+        keys = list(family)
+        scores = np.stack([family[k] for k in keys]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None, 0.0
+        entry = self._entries[keys[best]]
+        if self._expired(entry):
+            self._drop(keys[best])
+            return None, 0.0
+        return entry, float(scores[best])
+
+    def store(self, model, messages, tokens, params=None, scope=None, latency_ms=0.0, context=None):
+        """
+        Cache a completion
+
+        Args:
+            model: Model name
+            messages: Chat messages of the request
+            tokens: Completion token deltas in arrival order
+            params: Sampling parameters of the request
+            scope: Scope for semantic lookup
+            latency_ms: Time the generation took
+            context: Retrieved passages carried by the prompt
+        """
+        system, user = self._split(messages)
+        entry = {
+            "key": self.key(model, messages, params),
+            "family": self._family(scope, model, messages, params, context),
+            "model": model,
+            "prompt": user,
+            "text": "".join(tokens),
+            "tokens": list(tokens),
+            "prompt_tokens": estimate_tokens(system) + estimate_tokens(user),
+            "completion_tokens": len(tokens),
+            "latency_ms": round(latency_ms, 2),
+            "created": time.time()
+        }
+        with self._lock:
+            self._insert(entry)
+            self._stats["stores"] += 1
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry) + "\n")
+                if self._stats["stores"] % self.max_entries == 0:
+                    self._rewrite()
+
+    @staticmethod
+    def replay(entry):
+        """Yield a cached completion's token deltas as they were streamed"""
+        yield from entry["tokens"]
+
+    def clear(self):
+        """Drop all cached completions"""
+        with self._lock:
+            self._entries.clear()
+            self._families.clear()
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def get_stats(self):
+        """Hit rate, saved tokens and latency avoided"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        stats["hits"] = hits
+        stats["misses"] = stats["lookups"] - hits
+        stats["hit_rate"] = round(hits / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["saved_tokens"] = stats["saved_prompt_tokens"] + stats["saved_completion_tokens"]
+        stats["latency_avoided_ms"] = round(stats["latency_avoided_ms"], 2)
+        stats["max_entries"] = self.max_entries
+        stats["semantic_threshold"] = self.semantic_threshold
+        return stats
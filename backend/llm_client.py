@@ -0,0 +1,492 @@
+"""
+LLM Client - pooled, retrying client for OpenAI-compatible chat completions
+
+One process-wide `requests.Session` keeps connections to the provider
+alive between calls, so only the first request pays TCP/TLS setup.
+Requests rejected with 429 or 5xx (or failing to connect) are retried
+with full-jitter exponential backoff, honouring `Retry-After`. A stream is
+only retried before its first token has been handed to the caller, so no
+token is ever delivered twice.
+
+Two deadlines apply to every call: the time to the first token, and the
+total time of the call. The shared client routes every call through the
+process-wide LLMGovernor (provider quotas, concurrency, priority lanes).
+`astream_chat` does the same on an asyncio event loop through aiohttp.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency: only astream_chat (the ASGI serving path) needs it
+    aiohttp = None
+
+from llm_governor import GovernorTimeout, LLMGovernor
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import API_CONFIG, LLM_CONFIG
+except Exception:
+    API_CONFIG = {}
+    LLM_CONFIG = {}
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def estimate_tokens(text):
+    """Rough token count of prompt text (about 4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+class LLMError(Exception):
+    """LLM request failed (after retries)"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMTimeoutError(LLMError):
+    """First-token or total deadline exceeded"""
+
+
+class LLMCancelled(LLMError):
+    """The caller cancelled the call"""
+
+
+class _Retry(Exception):
+    def __init__(self, reason, retry_after=None, status=None):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.status = status
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header (delta-seconds form only), or None"""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """Chat-completions client with connection pooling, retries and deadlines"""
+
+    def __init__(self, base_url, api_key=None, model='gpt-4o-mini', pool_size=10, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, connect_timeout=5.0, first_token_timeout=20.0,
+                 total_timeout=120.0, governor=None, completion_tokens_estimate=512, permit_wait_threads=32):
+        """
+        Args:
+            base_url: API root, e.g. https://api.openai.com/v1
+            api_key: Bearer token (omitted from requests if None)
+            model: Default model
+            pool_size: Keep-alive connections kept per host
+            max_retries: Retries after the first attempt
+            backoff_base: First backoff ceiling in seconds (doubles per retry)
+            backoff_max: Cap on any single backoff or Retry-After wait
+            connect_timeout: Seconds to establish a connection
+            first_token_timeout: Seconds from sending the request to the first
+                token; also bounds any single stall between streamed chunks
+            total_timeout: Seconds for the whole call, retries included
+            governor: Optional LLMGovernor every call must get a permit from
+            completion_tokens_estimate: Completion tokens assumed when reserving
+                a permit for a call without max_tokens
+            permit_wait_threads: Threads `astream_chat` callers block in while
+                queued for a governor permit
+        """
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.first_token_timeout = first_token_timeout
+        self.total_timeout = total_timeout
+        self.governor = governor
+        self.completion_tokens_estimate = completion_tokens_estimate
+        self.pool_size = pool_size
+        self._asession = self._asession_loop = None
+        # Not the loop's default executor: permitted streams need that one for DNS lookups
+        self._permit_waits = ThreadPoolExecutor(max_workers=permit_wait_threads, thread_name_prefix="llm-permit")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0, "cancelled": 0,
+                       "first_token_ms_total": 0.0, "first_tokens": 0}
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def stats(self):
+        """Request, attempt, retry, failure and cancellation counts plus mean time to first token"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        first_tokens = stats.pop("first_tokens")
+        total = stats.pop("first_token_ms_total")
+        stats["mean_first_token_ms"] = round(total / first_tokens, 2) if first_tokens else None
+        return stats
+
+    def _backoff(self, attempt, retry_after):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def stream_chat(self, messages, model=None, lane="interactive", cancel=None, **params):
+        """
+        Stream a chat completion
+
+        With a governor, every attempt (retries included) first waits for a
+        permit in `lane`; the total deadline starts at the first admission.
+
+        Args:
+            messages: Chat messages
+            model: Model (default: the client's)
+            lane: Governor lane, "interactive" or "batch"
+            cancel: Optional cancellation flag (`is_set()` / `wait(timeout)`,
+                e.g. a threading.Event); checked before every attempt and
+                every delta, and interrupts backoff sleeps
+            **params: Extra request fields (temperature, max_tokens, ...)
+
+        Yields:
+            Content deltas (str) as they arrive
+
+        Raises:
+            LLMTimeoutError: if a deadline is exceeded or no permit was granted in time
+            LLMCancelled: once `cancel` is set (the connection is closed)
+            LLMError: on a non-retryable error or once retries are exhausted
+        """
+        payload, prompt_tokens, reserve = self._prepare(messages, model, params)
+        started = time.monotonic()
+        deadline = None
+        self._count(requests=1)
+        attempt = 0
+        while True:
+            self._check_cancel(cancel)
+            permit = self._acquire(reserve, lane)
+            if deadline is None:
+                deadline = time.monotonic() + self.total_timeout
+            self._count(attempts=1)
+            delivered, wait = 0, None
+            deltas = self._stream_once(payload, deadline)
+            try:
+                for delta in deltas:
+                    if cancel is not None and cancel.is_set():
+                        raise LLMCancelled("LLM stream cancelled")
+                    if not delivered:
+                        self._count(first_tokens=1,
+                                    first_token_ms_total=(time.monotonic() - started) * 1000)
+                    delivered += 1
+                    yield delta
+                return
+            except _Retry as e:
+                wait = self._retry_wait(e, attempt, delivered, deadline)
+                attempt += 1
+            except LLMCancelled:
+                self._count(cancelled=1)
+                raise
+            except LLMError:
+                self._count(failures=1)
+                raise
+            finally:
+                # Closes the response if the stream was abandoned mid-body
+                deltas.close()
+                # A rejected attempt used no tokens; a streamed one used its prompt plus deltas
+                if permit is not None:
+                    permit.release(prompt_tokens + delivered if delivered else 0)
+            if cancel is not None:
+                cancel.wait(wait)
+            else:
+                time.sleep(wait)
+
+    def _prepare(self, messages, model, params):
+        """Request payload, prompt token estimate and tokens to reserve with the governor"""
+        payload = dict(params, model=model or self.model, messages=messages, stream=True)
+        prompt_tokens = sum(estimate_tokens(str(m.get('content') or '')) for m in messages)
+        reserve = prompt_tokens + int(params.get('max_tokens') or self.completion_tokens_estimate)
+        return payload, prompt_tokens, reserve
+
+    def _check_cancel(self, cancel):
+        if cancel is not None and cancel.is_set():
+            self._count(cancelled=1)
+            raise LLMCancelled("LLM call cancelled")
+
+    def _retry_wait(self, e, attempt, delivered, deadline):
+        """Seconds to back off before retrying after `e`; raises LLMError if the call must fail"""
+        if delivered:
+            self._count(failures=1)
+            raise LLMError(f"LLM stream interrupted: {e}", e.status)
+        wait = self._backoff(attempt, e.retry_after)
+        if e.status == 429 and self.governor is not None:
+            # Quota exhausted: hold back every caller, not just this one
+            self.governor.throttle(wait)
+        if attempt >= self.max_retries or time.monotonic() + wait >= deadline:
+            self._count(failures=1)
+            raise LLMError(f"LLM request failed after {attempt + 1} attempts: {e}", e.status)
+        logger.warning(f"LLM request failed ({e}); retrying in {wait:.2f}s")
+        self._count(retries=1)
+        return wait
+
+    def _acquire(self, tokens, lane):
+        if self.governor is None:
+            return None
+        try:
+            return self.governor.acquire(tokens, lane)
+        except GovernorTimeout as e:
+            self._count(failures=1)
+            raise LLMTimeoutError(str(e))
+
+    def _stream_once(self, payload, deadline):
+        """One streamed attempt; raises _Retry for retryable failures"""
+        now = time.monotonic()
+        first_token_by = now + self.first_token_timeout
+        read_timeout = max(0.001, min(self.first_token_timeout, deadline - now))
+        try:
+            response = self.session.post(f"{self.base_url}/chat/completions", json=payload, stream=True,
+                                         timeout=(self.connect_timeout, read_timeout))
+        except requests.exceptions.ConnectionError as e:
+            raise _Retry(f"connection error: {e}")
+        except requests.exceptions.Timeout:
+            raise LLMTimeoutError("No response before the first-token timeout")
+
+        with response:
+            if response.status_code in RETRY_STATUSES:
+                response.content  # read the (small) error body so the connection returns to the pool
+                raise _Retry(f"HTTP {response.status_code}", _retry_after(response), response.status_code)
+            if response.status_code >= 400:
+                raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+            got_token = done = False
+            try:
+                # Read on past [DONE] to the end of the body so the connection is reused
+                for line in response.iter_lines(decode_unicode=True):
+                    if done:
+                        continue
+                    now = time.monotonic()
+                    if now > deadline:
+                        raise LLMTimeoutError(f"LLM call exceeded {self.total_timeout}s")
+                    if not got_token and now > first_token_by:
+                        raise LLMTimeoutError(f"No token within {self.first_token_timeout}s")
+                    deltas = _sse_deltas(line)
+                    if deltas is None:
+                        done = True
+                        continue
+                    for content in deltas:
+                        got_token = True
+                        yield content
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                # urllib3 reports a read timeout mid-stream as a connection error
+                if 'timed out' in str(e).lower():
+                    raise LLMTimeoutError("Stream stalled past the first-token timeout")
+                raise _Retry(f"stream broken: {e}")
+
+    def chat(self, messages, model=None, **params):
+        """
+        Complete a chat and return the full text
+
+        Streams under the hood so the first-token deadline applies.
+        """
+        return "".join(self.stream_chat(messages, model=model, **params))
+
+    async def astream_chat(self, messages, model=None, lane="interactive", cancel=None, **params):
+        """
+        Stream a chat completion on the running event loop
+
+        Same retries, deadlines, governor permits and statistics as
+        `stream_chat`, over an `aiohttp.ClientSession` kept per event loop
+        (same proxy and CA bundle settings as the session), so a waiting stream
+        costs no thread. Cancelling the task closes the connection.
+
+        Yields:
+            Content deltas (str) as they arrive
+        """
+        payload, prompt_tokens, reserve = self._prepare(messages, model, params)
+        started = time.monotonic()
+        deadline = None
+        self._count(requests=1)
+        attempt = 0
+        while True:
+            self._check_cancel(cancel)
+            # The governor queue is thread based; only waiting callers occupy a thread
+            permit = await self._aacquire(reserve, lane)
+            if deadline is None:
+                deadline = time.monotonic() + self.total_timeout
+            self._count(attempts=1)
+            delivered, wait = 0, None
+            deltas = self._astream_once(payload, deadline)
+            try:
+                async for delta in deltas:
+                    if cancel is not None and cancel.is_set():
+                        raise LLMCancelled("LLM stream cancelled")
+                    if not delivered:
+                        self._count(first_tokens=1,
+                                    first_token_ms_total=(time.monotonic() - started) * 1000)
+                    delivered += 1
+                    yield delta
+                return
+            except _Retry as e:
+                wait = self._retry_wait(e, attempt, delivered, deadline)
+                attempt += 1
+            except LLMCancelled:
+                self._count(cancelled=1)
+                raise
+            except LLMError:
+                self._count(failures=1)
+                raise
+            finally:
+                await deltas.aclose()
+                if permit is not None:
+                    permit.release(prompt_tokens + delivered if delivered else 0)
+            await asyncio.sleep(wait)
+
+    async def _aacquire(self, tokens, lane):
+        if self.governor is None:
+            return None
+        permit = self.governor.try_acquire(tokens, lane)
+        if permit is not None:
+            return permit
+        # Queue in a worker thread: the governor's lanes and timeouts are thread based
+        waiting = asyncio.get_running_loop().run_in_executor(self._permit_waits, self._acquire, tokens, lane)
+        try:
+            return await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # Hand back a permit granted after the caller went away
+            waiting.add_done_callback(
+                lambda f: f.cancelled() or f.exception() is not None or f.result().release(0))
+            raise
+
+    async def _astream_once(self, payload, deadline):
+        """One streamed attempt over the loop's pooled aiohttp session; raises _Retry for retryable failures"""
+        session = self._async_session()
+        now = time.monotonic()
+        first_token_by = now + self.first_token_timeout
+        read_timeout = max(0.001, min(self.first_token_timeout, deadline - now))
+        try:
+            async with session.post(f"{self.base_url}/chat/completions", json=payload,
+                                    timeout=aiohttp.ClientTimeout(connect=self.connect_timeout,
+                                                                  sock_read=read_timeout)) as response:
+                if response.status in RETRY_STATUSES:
+                    await response.read()
+                    raise _Retry(f"HTTP {response.status}", _retry_after(response), response.status)
+                if response.status >= 400:
+                    text = await response.text(errors='replace')
+                    raise LLMError(f"HTTP {response.status}: {text[:200]}", response.status)
+                got_token = done = False
+                # Read on past [DONE] to the end of the body so the connection is reused
+                async for raw in response.content:
+                    if done:
+                        continue
+                    now = time.monotonic()
+                    if now > deadline:
+                        raise LLMTimeoutError(f"LLM call exceeded {self.total_timeout}s")
+                    if not got_token and now > first_token_by:
+                        raise LLMTimeoutError(f"No token within {self.first_token_timeout}s")
+                    deltas = _sse_deltas(raw.decode('utf-8').rstrip('\r\n'))
+                    if deltas is None:
+                        done = True
+                        continue
+                    for content in deltas:
+                        got_token = True
+                        yield content
+        except aiohttp.ConnectionTimeoutError as e:
+            raise _Retry(f"connection error: {e}")
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError("Stream stalled past the first-token timeout")
+        except aiohttp.ClientError as e:
+            raise _Retry(f"connection error: {e}")
+
+    def _async_session(self):
+        """aiohttp session of the running event loop (its connections belong to that loop)"""
+        if aiohttp is None:
+            raise RuntimeError("The asyncio LLM client requires the 'aiohttp' package")
+        loop = asyncio.get_running_loop()
+        if self._asession is None or self._asession_loop is not loop:
+            # Same proxies (HTTPS_PROXY, NO_PROXY) and CA bundle (REQUESTS_CA_BUNDLE) as the requests session
+            verify = os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE') or self.session.verify
+            if isinstance(verify, str):
+                verify = ssl.create_default_context(cafile=None if os.path.isdir(verify) else verify,
+                                                    capath=verify if os.path.isdir(verify) else None)
+            headers = {name: value for name, value in self.session.headers.items()
+                       if name.lower() in ('content-type', 'authorization')}
+            self._asession = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0, ssl=verify), headers=headers, trust_env=True
+            )
+            self._asession_loop = loop
+        return self._asession
+
+    def close(self):
+        """Close pooled connections (an asyncio session is dropped; use `aclose` on its loop)"""
+        self.session.close()
+        self._permit_waits.shutdown(wait=False)
+        self._asession = self._asession_loop = None
+
+    async def aclose(self):
+        """Close pooled connections, including the running loop's aiohttp session"""
+        session = self._asession if self._asession_loop is asyncio.get_running_loop() else None
+        self.close()
+        if session is not None:
+            await session.close()
+
+
+def _sse_deltas(line):
+    """Content deltas in one SSE line of a chat-completions stream (None at [DONE])"""
+    if not line or not line.startswith('data:'):
+        return []
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return []
+    return [content for content in ((choice.get('delta') or {}).get('content')
+                                    for choice in chunk.get('choices', [])) if content]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Process-wide LLM client built from LLM_CONFIG (created on first use)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(
+                LLM_CONFIG.get('BASE_URL', 'https://api.openai.com/v1'),
+                api_key=API_CONFIG.get('OPENAI_API_KEY'),
+                model=LLM_CONFIG.get('MODEL', 'gpt-4o-mini'),
+                pool_size=LLM_CONFIG.get('POOL_SIZE', 10),
+                max_retries=LLM_CONFIG.get('MAX_RETRIES', 3),
+                backoff_base=LLM_CONFIG.get('BACKOFF_BASE', 0.5),
+                backoff_max=LLM_CONFIG.get('BACKOFF_MAX', 8.0),
+                connect_timeout=LLM_CONFIG.get('CONNECT_TIMEOUT', 5.0),
+                first_token_timeout=LLM_CONFIG.get('FIRST_TOKEN_TIMEOUT', 20.0),
+                total_timeout=LLM_CONFIG.get('TOTAL_TIMEOUT', 120.0),
+                governor=LLMGovernor(
+                    requests_per_min=LLM_CONFIG.get('REQUESTS_PER_MIN'),
+                    tokens_per_min=LLM_CONFIG.get('TOKENS_PER_MIN'),
+                    max_concurrent=LLM_CONFIG.get('MAX_CONCURRENT_STREAMS', 8),
+                    interactive_weight=LLM_CONFIG.get('INTERACTIVE_WEIGHT', 4),
+                    queue_timeout=LLM_CONFIG.get('QUEUE_TIMEOUT', 30.0),
+                    burst_seconds=LLM_CONFIG.get('RATE_BURST_SECONDS', 10)
+                ),
+                completion_tokens_estimate=LLM_CONFIG.get('COMPLETION_TOKENS_ESTIMATE', 512)
+            )
+        return _client
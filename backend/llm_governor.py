@@ -0,0 +1,280 @@
+"""
+LLM Governor - process-wide admission control for LLM calls
+
+Every LLM call asks the governor for a permit before it is sent. A permit
+is granted when all of these hold:
+
+- a concurrency slot is free (max concurrent streams)
+- the requests-per-minute token bucket has a request left
+- the tokens-per-minute bucket covers the call's estimated tokens
+- the provider has not asked everyone to back off (a 429 Retry-After
+  pauses all callers, not just the one that received it)
+
+Each HTTP attempt takes its own permit, so retries count against the
+quotas too. Waiting callers queue in two FIFO lanes. Interactive requests are
+admitted ahead of batch ones, but at least one batch request is admitted
+after every `interactive_weight` interactive ones, so batch work never
+starves. When a call finishes, its permit settles the tokens it actually
+used against the estimate.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+LANES = ("interactive", "batch")
+
+
+class GovernorTimeout(Exception):
+    """No permit was granted within the queue timeout"""
+
+
+class TokenBucket:
+    """Continuously refilling token bucket (may go into debt after settlement)"""
+
+    def __init__(self, per_minute, capacity=None):
+        """
+        Args:
+            per_minute: Refill rate (None disables the bucket)
+            capacity: Burst size (default: one minute's worth)
+        """
+        self.rate = per_minute / 60.0 if per_minute else None
+        self.capacity = float(capacity if capacity is not None else (per_minute or 0))
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` is available (0 if it is now)"""
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)   # a call bigger than the burst waits for a full bucket
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        if self.rate is not None:
+            self._refill(now)
+            self.level -= amount
+
+    def give(self, amount, now):
+        if self.rate is not None:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+
+class Permit:
+    """Admission of one LLM call; release it (or use it as a context manager) when done"""
+
+    def __init__(self, governor, lane, tokens, wait_ms):
+        self.governor = governor
+        self.lane = lane
+        self.tokens = tokens
+        self.wait_ms = wait_ms
+        self._released = False
+
+    def release(self, actual_tokens=None):
+        """
+        Free the concurrency slot and settle token usage
+
+        Args:
+            actual_tokens: Tokens the call really used (default: the estimate)
+        """
+        if not self._released:
+            self._released = True
+            self.governor._release(self, actual_tokens)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Waiter:
+    __slots__ = ("lane", "tokens", "enqueued")
+
+    def __init__(self, lane, tokens):
+        self.lane = lane
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+
+
+class LLMGovernor:
+    """Rate-limits and schedules LLM calls across all request threads"""
+
+    def __init__(self, requests_per_min=None, tokens_per_min=None, max_concurrent=8,
+                 interactive_weight=4, queue_timeout=30.0, burst_seconds=10, wait_samples=1024):
+        """
+        Args:
+            requests_per_min: Provider request quota (None: unlimited)
+            tokens_per_min: Provider token quota (None: unlimited)
+            max_concurrent: Maximum calls in flight
+            interactive_weight: Interactive admissions per batch admission
+                while both lanes are waiting
+            queue_timeout: Default seconds a caller may wait for a permit
+            burst_seconds: Bucket capacity in seconds of quota; providers
+                enforce per-minute quotas over shorter windows, so a full
+                minute's burst at once would still be throttled
+            wait_samples: Recent queue waits kept per lane for percentiles
+        """
+        self.requests = TokenBucket(requests_per_min, self._burst(requests_per_min, burst_seconds))
+        self.tokens = TokenBucket(tokens_per_min, self._burst(tokens_per_min, burst_seconds))
+        self.max_concurrent = max_concurrent
+        self.interactive_weight = interactive_weight
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._queues = {lane: deque() for lane in LANES}
+        self._active = 0
+        self._streak = 0                # interactive admissions since the last batch one
+        self._paused_until = 0.0
+        self._metrics = {lane: {"admitted": 0, "timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+                                "waits": deque(maxlen=wait_samples)} for lane in LANES}
+        self._throttles = 0
+
+    @staticmethod
+    def _burst(per_minute, burst_seconds):
+        return max(1.0, per_minute * burst_seconds / 60.0) if per_minute else None
+
+    def _next_waiter(self):
+        interactive, batch = self._queues["interactive"], self._queues["batch"]
+        if interactive and (not batch or self._streak < self.interactive_weight):
+            return interactive[0]
+        return batch[0] if batch else None
+
+    def acquire(self, tokens=1, lane="interactive", timeout=None):
+        """
+        Wait for a permit
+
+        Args:
+            tokens: Estimated tokens of the call (prompt plus expected completion)
+            lane: "interactive" or "batch"
+            timeout: Seconds to wait (default: the governor's queue_timeout)
+
+        Returns:
+            Permit
+
+        Raises:
+            GovernorTimeout: if no permit was granted in time
+            ValueError: on an unknown lane
+        """
+        if lane not in self._queues:
+            raise ValueError(f"Unknown lane: {lane}")
+        timeout = self.queue_timeout if timeout is None else timeout
+        waiter = _Waiter(lane, tokens)
+        deadline = waiter.enqueued + timeout
+        with self._cond:
+            self._queues[lane].append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._admission_delay(waiter, now)
+                    if delay == 0.0:
+                        return self._admit(waiter, now)
+                    if now >= deadline:
+                        self._metrics[lane]["timeouts"] += 1
+                        raise GovernorTimeout(f"No LLM permit within {timeout}s ({lane} lane)")
+                    self._cond.wait(min(delay, deadline - now))
+            finally:
+                if waiter in self._queues[lane]:
+                    self._queues[lane].remove(waiter)
+                    self._cond.notify_all()
+
+    def try_acquire(self, tokens=1, lane="interactive"):
+        """
+        Permit if one can be granted right now without queueing, else None
+
+        Never jumps the queue: returns None while any caller is waiting.
+        """
+        if lane not in self._queues:
+            raise ValueError(f"Unknown lane: {lane}")
+        waiter = _Waiter(lane, tokens)
+        with self._cond:
+            if self._queues["interactive"] or self._queues["batch"]:
+                return None
+            self._queues[lane].append(waiter)
+            now = time.monotonic()
+            if self._admission_delay(waiter, now) == 0.0:
+                return self._admit(waiter, now)
+            self._queues[lane].remove(waiter)
+            return None
+
+    def _admission_delay(self, waiter, now):
+        """0.0 if `waiter` may go now, else how long to sleep before checking again"""
+        if self._next_waiter() is not waiter:
+            return 1.0      # woken by notify when the queue head changes
+        if self._active >= self.max_concurrent:
+            return 1.0      # woken by notify when a permit is released
+        return max(self._paused_until - now,
+                   self.requests.wait_time(1, now),
+                   self.tokens.wait_time(waiter.tokens, now),
+                   0.0)
+
+    def _admit(self, waiter, now):
+        self._queues[waiter.lane].popleft()
+        self._active += 1
+        self._streak = self._streak + 1 if waiter.lane == "interactive" else 0
+        self.requests.take(1, now)
+        self.tokens.take(waiter.tokens, now)
+        wait_ms = (now - waiter.enqueued) * 1000
+        metrics = self._metrics[waiter.lane]
+        metrics["admitted"] += 1
+        metrics["wait_ms_total"] += wait_ms
+        metrics["wait_ms_max"] = max(metrics["wait_ms_max"], wait_ms)
+        metrics["waits"].append(wait_ms)
+        self._cond.notify_all()
+        return Permit(self, waiter.lane, waiter.tokens, wait_ms)
+
+    def _release(self, permit, actual_tokens):
+        with self._cond:
+            self._active -= 1
+            if actual_tokens is not None and actual_tokens != permit.tokens:
+                now = time.monotonic()
+                if actual_tokens < permit.tokens:
+                    self.tokens.give(permit.tokens - actual_tokens, now)
+                else:
+                    self.tokens.take(actual_tokens - permit.tokens, now)
+            self._cond.notify_all()
+
+    def throttle(self, seconds):
+        """Hold back every caller for `seconds` (the provider answered 429)"""
+        with self._cond:
+            until = time.monotonic() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self._throttles += 1
+                logger.warning(f"LLM governor: provider throttling, pausing admissions for {seconds:.2f}s")
+
+    def get_stats(self):
+        """Queue depths, in-flight calls, bucket levels and queue-wait metrics per lane"""
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            stats = {
+                "active": self._active,
+                "max_concurrent": self.max_concurrent,
+                "requests_available": round(self.requests.level, 2) if self.requests.rate else None,
+                "tokens_available": round(self.tokens.level, 2) if self.tokens.rate else None,
+                "paused_for_ms": round(max(0.0, self._paused_until - now) * 1000, 2),
+                "throttles": self._throttles,
+                "lanes": {}
+            }
+            for lane in LANES:
+                metrics = self._metrics[lane]
+                waits = sorted(metrics["waits"])
+                stats["lanes"][lane] = {
+                    "queued": len(self._queues[lane]),
+                    "admitted": metrics["admitted"],
+                    "timeouts": metrics["timeouts"],
+                    "wait_ms_mean": round(metrics["wait_ms_total"] / metrics["admitted"], 2) if metrics["admitted"] else 0.0,
+                    "wait_ms_p95": round(waits[int(len(waits) * 0.95)], 2) if waits else 0.0,
+                    "wait_ms_max": round(metrics["wait_ms_max"], 2)
+                }
+        return stats
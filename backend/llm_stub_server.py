@@ -0,0 +1,278 @@
+"""
+LLM Stub Server - offline OpenAI-compatible chat-completions endpoint
+
+Serves `POST /v1/chat/completions` (streamed and non-streamed) and
+`GET /v1/models` with deterministic output, configurable latency,
+injected 429/5xx failures and an optional provider-style quota, so the LLM path can be exercised and
+benchmarked without network access or an API key. Connections are kept
+alive (HTTP/1.1, chunked streams) and counted, which makes connection
+reuse by a client observable.
+
+Usage:
+    python llm_stub_server.py [--port 8089] [--first-token-ms 50] [--token-ms 5] [--fail-rate 0.1]
+
+    LLM_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub python app.py
+"""
+import argparse
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_governor import TokenBucket
+
+_WORDS = ("Internal data show consistent efficacy with a manageable safety profile; "
+          "the remaining unmet need is durable response in refractory patients, "
+          "so the next step is a focused Phase II trial.").split()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Small SSE writes on a kept-alive connection would otherwise stall on Nagle + delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/v1/models':
+            self._json(200, {"object": "list", "data": [{"id": self.server.model, "object": "model"}]})
+        else:
+            self._json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._json(404, {"error": {"message": "Not found"}})
+            return
+        self.server.count('requests')
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            self._json(400, {"error": {"message": "Invalid JSON"}})
+            return
+
+        retry_after = self.server.over_quota()
+        if retry_after is not None:
+            self.server.count('rate_limited')
+            self._json(429, {"error": {"message": "Rate limit exceeded", "type": "requests"}},
+                       {'Retry-After': f"{retry_after:.3f}"})
+            return
+        self._in_flight = True
+        try:
+            self._complete(request)
+        finally:
+            self._finished()
+
+    def _finished(self):
+        # Leave the quota before the client sees the end of the response, as a provider would
+        if self._in_flight:
+            self._in_flight = False
+            self.server.request_finished()
+
+    def _complete(self, request):
+        failure = self.server.next_failure()
+        if failure:
+            self.server.count('failures')
+            headers = {'Retry-After': str(self.server.retry_after)} if self.server.retry_after is not None else {}
+            self._finished()
+            self._json(failure, {"error": {"message": f"Injected {failure}"}}, headers)
+            return
+
+        tokens = self.server.completion(request)
+        model = request.get('model') or self.server.model
+        time.sleep(self.server.first_token_s)
+        if not request.get('stream'):
+            time.sleep(self.server.token_s * len(tokens))
+            self._finished()
+            prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in request.get('messages', []))
+            self._json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                          "total_tokens": prompt_tokens + len(tokens)}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(self.server.token_s)
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self._finished()
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """OpenAI-compatible stand-in with latency and fault injection"""
+
+    daemon_threads = True
+    # Bursts of concurrent clients would overflow the default listen backlog (5) into SYN retries
+    request_queue_size = 1024
+
+    def __init__(self, host='127.0.0.1', port=0, first_token_ms=50, token_ms=5, tokens=32,
+                 fail_rate=0.0, fail_statuses=(429, 503), fail_first=0, retry_after=None,
+                 model='stub-model', seed=None, requests_per_min=None, max_concurrent=None):
+        """
+        Args:
+            host: Bind address
+            port: Port (0 picks a free one)
+            first_token_ms: Delay before the first token
+            token_ms: Delay between tokens
+            tokens: Tokens per completion (overridable per request with max_tokens)
+            fail_rate: Share of requests answered with an injected failure
+            fail_statuses: Statuses injected failures are drawn from
+            fail_first: Fail this many requests unconditionally before fail_rate applies
+            retry_after: Retry-After seconds sent with injected failures (None: no header)
+            model: Model name reported when a request names none
+            seed: Random seed for reproducible failure injection
+            requests_per_min: Provider-style request quota; requests over it get
+                429 with the Retry-After of the next free request (None: unlimited)
+            max_concurrent: Requests served at once before further ones get 429
+        """
+        super().__init__((host, port), _Handler)
+        self.first_token_s = first_token_ms / 1000
+        self.token_s = token_ms / 1000
+        self.tokens = tokens
+        self.fail_rate = fail_rate
+        self.fail_statuses = tuple(fail_statuses)
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.model = model
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.quota = TokenBucket(requests_per_min, capacity=max(1, requests_per_min // 60) if requests_per_min else None)
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.counters = {"connections": 0, "requests": 0, "failures": 0, "rate_limited": 0, "peak_in_flight": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def handle_error(self, request, client_address):
+        # Clients dropping a kept-alive connection is routine, not a server error
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def over_quota(self):
+        """
+        Retry-After seconds if a request exceeds the quota, or None
+
+        An accepted request counts against the quota and stays in flight
+        until `request_finished`.
+        """
+        with self._lock:
+            if self.max_concurrent is not None and self.in_flight >= self.max_concurrent:
+                return 1.0
+            now = time.monotonic()
+            wait = self.quota.wait_time(1, now)
+            if wait > 0:
+                return wait
+            self.quota.take(1, now)
+            self.in_flight += 1
+            self.counters["peak_in_flight"] = max(self.counters["peak_in_flight"], self.in_flight)
+        return None
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def next_failure(self):
+        """Status of an injected failure for the next request, or None"""
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                return self._random.choice(self.fail_statuses)
+            if self.fail_rate and self._random.random() < self.fail_rate:
+                return self._random.choice(self.fail_statuses)
+        return None
+
+    def completion(self, request):
+        """Deterministic completion tokens for a request"""
+        count = int(request.get('max_tokens') or self.tokens)
+        return [(" " if i else "") + _WORDS[i % len(_WORDS)] for i in range(count)]
+
+    def start(self):
+        """Serve from a background thread; returns the base URL"""
+        self._thread = threading.Thread(target=self.serve_forever, name='llm-stub', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--first-token-ms', type=float, default=50)
+    parser.add_argument('--token-ms', type=float, default=5)
+    parser.add_argument('--tokens', type=int, default=32)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--requests-per-min', type=int, default=None)
+    parser.add_argument('--max-concurrent', type=int, default=None)
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, args.first_token_ms, args.token_ms, args.tokens,
+                           fail_rate=args.fail_rate, retry_after=args.retry_after, seed=args.seed,
+                           requests_per_min=args.requests_per_min, max_concurrent=args.max_concurrent)
+    print(f"Stub LLM server on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
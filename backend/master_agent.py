@@ -8,13 +8,18 @@ from report_generator_agent import ReportGeneratorAgent
 from unmet_needs_analyzer import UnmetNeedsAnalyzer
 from fto_assessor import FTOAssessor
 from pdf_parser import PDFParser
+from document_extraction import in_extraction_worker
+from patent_index import PatentExpiryIndex
+from claim_overlap import ClaimIndex
+from llm_cache import LLMResponseCache
 
 # Import MITBuilder by directly importing the class and its dependency
 import sys
 import os
 import logging
 import time
-from datetime import datetime
+import threading
+from datetime import datetime, date
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +36,57 @@ except Exception:
         def compute_innovation_score(profile):
             return 0
 
+from mit.batch_scoring import PortfolioFeatures
+from mit.sensitivity import analyze_sensitivity, build_weight_grid
+from mit.similarity import ProfileVectorizer, SimilarityIndex
+from mit.mit_store import MITStore
+from mit.frozen import FrozenDict, freeze
+from config import API_CONFIG, CLAIM_OVERLAP_CONFIG, LLM_CONFIG, STORAGE_PATHS
+from utils import FingerprintMemo, fingerprint
+from streaming import CancelToken, StreamCancelled
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def storage_path(name, filename):
+    """Path of a file under STORAGE_PATHS[name] (relative entries are resolved from the backend directory)"""
+    return os.path.normpath(os.path.join(BACKEND_DIR, STORAGE_PATHS[name], filename))
+
+# Stage producing each top-level field of a query result, and the stages it needs first.
+# handle_query(fields=...) runs only the stages behind the requested fields.
+RESULT_FIELDS = (
+    "molecule", "market", "trade", "patents", "trials", "web", "internal", "mit",
+    "unmet_needs", "fto_analysis", "report", "processing_time_seconds", "timestamp"
+)
+STAGE_DEPENDENCIES = {
+    "market": (), "trade": (), "patents": (), "trials": (), "web": (), "internal": (),
+    "mit": ("market", "trade", "patents", "trials", "web", "internal"),
+    "unmet_needs": ("market", "trials", "patents", "web", "internal"),
+    "fto_analysis": ("patents", "trade"),
+    "report": ("mit",),
+}
+
+
+def stages_for(fields=None):
+    """
+    Pipeline stages needed to produce the given top-level result fields
+
+    Args:
+        fields: Iterable of RESULT_FIELDS names (None: the full result)
+
+    Returns:
+        Set of STAGE_DEPENDENCIES keys
+    """
+    pending = list(STAGE_DEPENDENCIES if fields is None else (f for f in fields if f in STAGE_DEPENDENCIES))
+    stages = set()
+    while pending:
+        stage = pending.pop()
+        if stage not in stages:
+            stages.add(stage)
+            pending.extend(STAGE_DEPENDENCIES[stage])
+    return stages
+
+
 class MITBuilder:
     """Builds comprehensive Molecule Innovation Twin profiles"""
     
@@ -103,38 +159,94 @@ class MasterAgent:
     
     def __init__(self):
         """Initialize all worker agents"""
+        if in_extraction_worker():
+            # Loading the stores here would re-read (and may rewrite) the parent's files
+            raise RuntimeError("MasterAgent must not be constructed in a document extraction worker")
         self.iqvia = IQVIAAgent()
         self.exim = EXIMAgent()
         self.patent = PatentAgent()
         self.clinical = ClinicalTrialsAgent()
         self.web = WebAgent()
-        self.internal = InternalInsightsAgent()
+        self.pdf_parser = PDFParser()
+        self.llm_cache = LLMResponseCache(
+            path=storage_path('cache', 'llm_responses.jsonl'),
+            max_entries=LLM_CONFIG.get('RESPONSE_CACHE_SIZE', 1024),
+            ttl=LLM_CONFIG.get('RESPONSE_CACHE_TTL'),
+            semantic_threshold=LLM_CONFIG.get('SEMANTIC_CACHE_THRESHOLD')
+        )
+        self.internal = InternalInsightsAgent(
+            document_index=self.pdf_parser.index, embedding_store=self.pdf_parser.embeddings,
+            response_cache=self.llm_cache
+        )
         self.reporter = ReportGeneratorAgent()
         self.mit_builder = MITBuilder()
         
         # Initialize new analyzers
+        patent_dataset = self.patent.load_all()
+        self.claim_index_path = storage_path('claims', 'claim_index')
+        self.claim_index = self._load_claim_index(patent_dataset)
         self.unmet_needs_analyzer = UnmetNeedsAnalyzer()
-        self.fto_assessor = FTOAssessor()
-        self.pdf_parser = PDFParser()
+        self.fto_assessor = FTOAssessor(
+            claim_index=self.claim_index,
+            overlap_thresholds={
+                'high': CLAIM_OVERLAP_CONFIG['HIGH_CONTAINMENT'],
+                'medium': CLAIM_OVERLAP_CONFIG['MEDIUM_CONTAINMENT']
+            }
+        )
         
-        # Storage for MIT results
-        self.mit_store = {}
+        # Storage for MIT results (lock-striped, readers get frozen snapshots)
+        self.mit_store = MITStore(
+            compact=API_CONFIG.get('MIT_COMPACT_STORE', True),
+            decoded_cache_size=API_CONFIG.get('MIT_DECODED_CACHE_SIZE', 1024)
+        )
         self.query_history = []
+        # Guards query_history and _analysis_fingerprints (written by concurrent queries)
+        self._history_lock = threading.Lock()
+        
+        # Derived analyses memoized by input fingerprint; fingerprints are
+        # recorded per molecule when its MIT is stored so reads are O(1)
+        self.analysis_memo = FingerprintMemo(max_entries=API_CONFIG.get('ANALYSIS_MEMO_SIZE', 4096))
+        self._analysis_fingerprints = {}
+        
+        # Columnar scoring features for portfolio-wide re-ranking
+        self.portfolio_features = PortfolioFeatures()
+        
+        # Expiry-sorted patent index across the portfolio, seeded from the patent dataset
+        self.patent_index = PatentExpiryIndex()
+        self.patent_index.load(
+            {molecule.strip().title(): patents for molecule, patents in patent_dataset.items()}
+        )
+        
+        # Nearest-neighbour index for "similar molecule" lookups
+        self.similarity_index = SimilarityIndex(
+            ProfileVectorizer(
+                self.unmet_needs_analyzer.therapy_keywords,
+                classifier=self.unmet_needs_analyzer.therapy_classifier
+            )
+        )
         
         logger.info("MasterAgent initialized with all worker agents and analyzers")
 
-    def handle_query(self, prompt, molecule):
+    def handle_query(self, prompt, molecule, fields=None):
         """
         Handle a complete molecule analysis query
         
         Args:
             prompt: User query/prompt
             molecule: Molecule name to analyze
+            fields: Optional top-level result fields to produce; stages no
+                requested field depends on (see STAGE_DEPENDENCIES) are
+                skipped and their fields left out. The MIT is stored only
+                when it is built.
         
         Returns:
-            Dictionary with analysis results from all agents
+            Dictionary with analysis results from all agents. The dict is
+            new per call, but `unmet_needs` and `fto_analysis` are the
+            memoized read-only analyses shared with other queries; copy
+            them before changing them.
         """
         start_time = time.time()
+        stages = stages_for(fields)
         
         # Extract molecule if not provided
         if not molecule:
@@ -146,60 +258,63 @@ class MasterAgent:
         molecule = molecule.strip().title()
         
         try:
-            # Fetch data from all agents in parallel fashion
-            market = self._safe_call(self.iqvia.fetch_market, molecule, agent_name="IQVIA Market")
-            trade = self._safe_call(self.exim.fetch_trade, molecule, agent_name="EXIM Trade")
-            patents = self._safe_call(self.patent.search_patents, molecule, agent_name="Patent")
-            trials = self._safe_call(self.clinical.search_trials, molecule, agent_name="Clinical")
-            web = self._safe_call(self.web.search, molecule, agent_name="Web")
-            # Pass emitter through when available for streaming; default call remains for non-stream mode
-            internal = self._safe_call(self.internal.summarize_docs, molecule, agent_name="Internal")
+            # Fetch data from the agents the requested fields need
+            sources = {}
+            for stage, func, agent_name in (
+                ("market", self.iqvia.fetch_market, "IQVIA Market"),
+                ("trade", self.exim.fetch_trade, "EXIM Trade"),
+                ("patents", self.patent.search_patents, "Patent"),
+                ("trials", self.clinical.search_trials, "Clinical"),
+                ("web", self.web.search, "Web"),
+                # Pass emitter through when available for streaming; default call remains for non-stream mode
+                ("internal", self.internal.summarize_docs, "Internal"),
+            ):
+                if stage in stages:
+                    sources[stage] = self._safe_call(func, molecule, agent_name=agent_name)
+            market, trade, patents = sources.get("market"), sources.get("trade"), sources.get("patents")
+            trials, web, internal = sources.get("trials"), sources.get("web"), sources.get("internal")
+            
+            result = {"molecule": molecule}
+            for key, value in sources.items():
+                result[key] = value or ([] if key in ("patents", "trials") else {})
+            fingerprints = self._analysis_fingerprints_for(molecule, market, trade, patents, trials, web, internal, prompt)
 
             # Build MIT profile
-            mit = self.mit_builder.build(molecule, market, trade, patents, trials, web, internal)
+            if "mit" in stages:
+                result["mit"] = mit = self.mit_builder.build(molecule, market, trade, patents, trials, web, internal)
             
             # Analyze unmet needs
-            unmet_needs = self.unmet_needs_analyzer.analyze_unmet_needs(
-                market, trials, patents, web
-            )
+            if "unmet_needs" in stages:
+                result["unmet_needs"] = self._memo_unmet_needs(fingerprints, molecule, market, trials, patents,
+                                                               web, internal)
             
             # Assess FTO risk
-            fto_analysis = self.fto_assessor.assess_fto_risk(molecule, patents, trade)
+            if "fto_analysis" in stages:
+                result["fto_analysis"] = self._memo_fto(fingerprints, molecule, patents, trade, prompt)
             
             # Store MIT for later retrieval
-            self.mit_store[molecule] = mit
+            if "mit" in stages:
+                self._store_mit(molecule, mit, fingerprints)
             
             # Generate report
-            report_path = self._safe_call(
-                self.reporter.generate_pdf_summary, 
-                mit, 
-                "Report Generation"
-            )
+            if "report" in stages:
+                result["report"] = self._safe_call(
+                    self.reporter.generate_pdf_summary, 
+                    mit, 
+                    agent_name="Report Generation"
+                )
             
-            # Compile results
-            result = {
-                "molecule": molecule,
-                "market": market or {},
-                "trade": trade or {},
-                "patents": patents or [],
-                "trials": trials or [],
-                "web": web or {},
-                "internal": internal or {},
-                "mit": mit,
-                "unmet_needs": unmet_needs,
-                "fto_analysis": fto_analysis,
-                "report": report_path,
-                "processing_time_seconds": round(time.time() - start_time, 2),
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            result["processing_time_seconds"] = round(time.time() - start_time, 2)
+            result["timestamp"] = datetime.utcnow().isoformat()
             
             # Store in history
-            self.query_history.append({
-                "molecule": molecule,
-                "prompt": prompt[:100],  # Store first 100 chars
-                "timestamp": result["timestamp"],
-                "processing_time": result["processing_time_seconds"]
-            })
+            with self._history_lock:
+                self.query_history.append({
+                    "molecule": molecule,
+                    "prompt": prompt[:100],  # Store first 100 chars
+                    "timestamp": result["timestamp"],
+                    "processing_time": result["processing_time_seconds"]
+                })
             
             logger.info(f"Query completed for {molecule} in {result['processing_time_seconds']}s")
             return result
@@ -208,20 +323,27 @@ class MasterAgent:
             logger.error(f"Error processing query for {molecule}: {str(e)}")
             raise
 
-    def get_mit(self, molecule):
+    def get_mit(self, molecule, keep=None):
         """
         Retrieve stored MIT for a molecule
         
         Args:
             molecule: Molecule name
+            keep: Optional predicate on top-level field names; only the
+                fields it keeps are rendered (default all)
         
         Returns:
-            MIT profile dictionary or None
+            Read-only MIT profile snapshot or None
         """
         molecule = molecule.strip().title()
-        return self.mit_store.get(molecule)
+        if keep is None:
+            return self.mit_store.get(molecule)
+        record = self.mit_store.get_record(molecule)
+        if record is None:
+            return None
+        return FrozenDict((key, record[key]) for key in record.keys() if keep(key))
 
-    def handle_query_stream(self, prompt, molecule, emitter):
+    def handle_query_stream(self, prompt, molecule, emitter, cancel=None):
         """
         Handle a molecule analysis query and emit partial results via `emitter` callback.
 
@@ -229,9 +351,16 @@ class MasterAgent:
             prompt: User query/prompt
             molecule: Molecule name to analyze
             emitter: Callable that accepts a dictionary and will be used to stream updates
+            cancel: Optional CancelToken; checked before every stage and passed
+                to the LLM stream
         Returns:
-            Final result dict (also emitted with type 'done')
+            Final result dict (also emitted with type 'done'); `unmet_needs`
+            and `fto_analysis` are read-only, as in `handle_query`
+
+        Raises:
+            StreamCancelled: if `cancel` is set before the analysis completes
         """
+        cancel = cancel or CancelToken()
         start_time = time.time()
 
         if not molecule:
@@ -242,43 +371,53 @@ class MasterAgent:
         try:
             emitter({"type": "status", "message": f"Starting analysis for {molecule}"})
 
+            cancel.raise_if_cancelled()
             market = self._safe_call(self.iqvia.fetch_market, molecule, agent_name="IQVIA Market")
             emitter({"type": "agent", "agent": "iqvia", "data": market})
 
+            cancel.raise_if_cancelled()
             trade = self._safe_call(self.exim.fetch_trade, molecule, agent_name="EXIM Trade")
             emitter({"type": "agent", "agent": "exim", "data": trade})
 
+            cancel.raise_if_cancelled()
             patents = self._safe_call(self.patent.search_patents, molecule, agent_name="Patent")
             emitter({"type": "agent", "agent": "patent", "data": patents})
 
+            cancel.raise_if_cancelled()
             trials = self._safe_call(self.clinical.search_trials, molecule, agent_name="Clinical")
             emitter({"type": "agent", "agent": "clinical", "data": trials})
 
+            cancel.raise_if_cancelled()
             web = self._safe_call(self.web.search, molecule, agent_name="Web")
             emitter({"type": "agent", "agent": "web", "data": web})
 
+            cancel.raise_if_cancelled()
             # Allow the internal agent to stream via the provided emitter
-            internal = self._safe_call(self.internal.summarize_docs, molecule, emitter, agent_name="Internal")
+            internal = self._safe_call(self.internal.summarize_docs, molecule, emitter, "interactive", cancel,
+                                       agent_name="Internal")
             emitter({"type": "agent", "agent": "internal", "data": internal})
 
+            cancel.raise_if_cancelled()
             emitter({"type": "status", "message": "Building MIT profile"})
             mit = self.mit_builder.build(molecule, market, trade, patents, trials, web, internal)
             emitter({"type": "mit", "data": mit})
 
+            cancel.raise_if_cancelled()
             emitter({"type": "status", "message": "Analyzing unmet needs"})
-            unmet_needs = self.unmet_needs_analyzer.analyze_unmet_needs(
-                market, trials, patents, web
-            )
+            fingerprints = self._analysis_fingerprints_for(molecule, market, trade, patents, trials, web, internal, prompt)
+            unmet_needs = self._memo_unmet_needs(fingerprints, molecule, market, trials, patents, web, internal)
             emitter({"type": "unmet_needs", "data": unmet_needs})
 
+            cancel.raise_if_cancelled()
             emitter({"type": "status", "message": "Assessing FTO risk"})
-            fto_analysis = self.fto_assessor.assess_fto_risk(molecule, patents, trade)
+            fto_analysis = self._memo_fto(fingerprints, molecule, patents, trade, prompt)
             emitter({"type": "fto", "data": fto_analysis})
 
-            self.mit_store[molecule] = mit
+            self._store_mit(molecule, mit, fingerprints)
 
+            cancel.raise_if_cancelled()
             emitter({"type": "status", "message": "Generating report"})
-            report_path = self._safe_call(self.reporter.generate_pdf_summary, mit, "Report Generation")
+            report_path = self._safe_call(self.reporter.generate_pdf_summary, mit, agent_name="Report Generation")
             emitter({"type": "report", "data": report_path})
 
             result = {
@@ -301,18 +440,246 @@ class MasterAgent:
             emitter({"type": "done", "result": result})
             return result
 
+        except StreamCancelled:
+            raise
         except Exception as e:
             emitter({"type": "error", "message": str(e)})
             raise
 
+    def rank_portfolio(self, weights=None, preset=None, top=None):
+        """
+        Re-rank every stored MIT under a new innovation score weighting
+        
+        Args:
+            weights: Optional dict of weight overrides
+            preset: Optional weight preset name
+            top: Optional number of leading molecules to return
+        
+        Returns:
+            List of ranked molecules with their re-computed scores
+        """
+        return self.portfolio_features.rank(weights=weights, preset=preset, top=top)
+
+    def analyze_score_sensitivity(self, ranges=None, presets=None, base_preset=None, top_k=10):
+        """
+        Evaluate a grid of innovation score weightings against the whole portfolio
+        
+        Args:
+            ranges: Dict of weight keys to candidate value lists (cartesian grid)
+            presets: Optional list of preset names to include in the grid
+            base_preset: Preset the ranges are applied on top of
+            top_k: Rank threshold used for top-k frequency
+        
+        Returns:
+            Dictionary with per-molecule rank stability and feature contributions
+        """
+        grid = build_weight_grid(base_preset=base_preset, ranges=ranges, presets=presets)
+        molecules, features = self.portfolio_features.snapshot()
+        return analyze_sensitivity(molecules, features, grid, top_k=top_k)
+
+    def find_similar(self, molecule, k=5, mode="exact"):
+        """
+        Find repurposing analogues of a stored molecule
+        
+        Args:
+            molecule: Molecule name
+            k: Number of neighbours to return
+            mode: "exact" or "approx"
+        
+        Returns:
+            List of similar molecules with cosine similarity, or None if the
+            molecule has no stored MIT
+        """
+        molecule = molecule.strip().title()
+        return self.similarity_index.similar(molecule, k=k, mode=mode)
+
+    def get_unmet_needs(self, molecule):
+        """
+        Unmet needs analysis for a stored molecule, memoized on its inputs
+        
+        Returns:
+            Read-only unmet needs analysis, or None if the molecule has no MIT
+        """
+        molecule = molecule.strip().title()
+        fingerprints = self._recorded_fingerprints(molecule)
+        # Documents extracted since the fingerprint was taken invalidate it
+        if fingerprints and fingerprints.get("documents") == self.pdf_parser.document_ids(molecule):
+            cached = self.analysis_memo.get(fingerprints["unmet_needs"])
+            if cached is not None:
+                return cached
+        
+        mit = self.mit_store.get(molecule)
+        if mit is None:
+            return None
+        fingerprints = self._fingerprints_from_mit(molecule, mit)
+        return self._memo_unmet_needs(
+            fingerprints, molecule, mit.get('market'), mit.get('trials'), mit.get('patents'),
+            mit.get('web'), mit.get('internal')
+        )
+
+    def get_fto_analysis(self, molecule, use_description=None):
+        """
+        FTO assessment for a stored molecule, memoized on its inputs per calendar day
+        
+        Args:
+            molecule: Molecule name
+            use_description: Described use / formulation compared against
+                patent claims (defaults to the prompt of the last query)
+        
+        Returns:
+            Read-only FTO analysis, or None if the molecule has no MIT
+        """
+        molecule = molecule.strip().title()
+        fingerprints = self._recorded_fingerprints(molecule)
+        if fingerprints and use_description in (None, fingerprints.get("fto_use")):
+            cached = self.analysis_memo.get(self._fto_key(fingerprints))
+            if cached is not None:
+                return cached
+            use_description = fingerprints.get("fto_use")
+        
+        mit = self.mit_store.get(molecule)
+        if mit is None:
+            return None
+        patents, trade = mit.get('patents', []), mit.get('trade')
+        return self._memo_fto(
+            {"fto": fingerprint("fto", molecule, patents, trade, use_description)},
+            molecule, patents, trade, use_description
+        )
+
+    def scan_portfolio_fto(self, molecules=None):
+        """
+        FTO assessment for many stored molecules in one bulk pass
+        
+        Patents shared between molecules are assessed once (see
+        FTOAssessor.assess_portfolio). Claims are compared against each
+        molecule's default use description (the prompt of its last query),
+        as in get_fto_analysis.
+        
+        Args:
+            molecules: Optional list of molecule names (defaults to every stored MIT)
+        
+        Returns:
+            Tuple of (dict of molecule -> FTO analysis, list of molecules without an MIT)
+        """
+        if molecules:
+            names = list(dict.fromkeys(m.strip().title() for m in molecules))
+        else:
+            names = list(self.mit_store.keys())
+        
+        patents_by_molecule, use_descriptions, missing = {}, {}, []
+        for name in names:
+            record = self.mit_store.get_record(name)
+            if record is None:
+                missing.append(name)
+            else:
+                patents_by_molecule[name] = record.get('patents', [])
+                use_descriptions[name] = (self._recorded_fingerprints(name) or {}).get("fto_use")
+        return self.fto_assessor.assess_portfolio(patents_by_molecule, use_descriptions=use_descriptions), missing
+
+    def _analysis_fingerprints_for(self, molecule, market, trade, patents, trials, web, internal, use_description=None):
+        """Fingerprint the inputs of each derived analysis"""
+        documents = self.pdf_parser.document_ids(molecule)
+        return {
+            "unmet_needs": fingerprint("unmet_needs", market, trials, patents, web, internal, documents),
+            "documents": documents,
+            "fto": fingerprint("fto", molecule, patents, trade, use_description),
+            "fto_use": use_description
+        }
+
+    def _fingerprints_from_mit(self, molecule, mit):
+        previous = self._recorded_fingerprints(molecule) or {}
+        fingerprints = self._analysis_fingerprints_for(
+            molecule, mit.get('market'), mit.get('trade'), mit.get('patents'),
+            mit.get('trials'), mit.get('web'), mit.get('internal'), previous.get("fto_use")
+        )
+        self._record_fingerprints(molecule, fingerprints)
+        return fingerprints
+
+    def _recorded_fingerprints(self, molecule):
+        with self._history_lock:
+            return self._analysis_fingerprints.get(molecule)
+
+    def _record_fingerprints(self, molecule, fingerprints):
+        """Record (or with None, forget) the analysis fingerprints of a stored MIT"""
+        with self._history_lock:
+            if fingerprints is not None:
+                self._analysis_fingerprints[molecule] = fingerprints
+            else:
+                self._analysis_fingerprints.pop(molecule, None)
+
+    def _fto_key(self, fingerprints):
+        # Expiry math depends on datetime.now(), so FTO results are valid for one day;
+        # claim overlaps depend on the indexed claims
+        return (fingerprints["fto"], date.today().isoformat(), self.claim_index.version)
+
+    def _memo_unmet_needs(self, fingerprints, molecule, market, trials, patents, web, internal):
+        # Uploaded document text is only read on a memo miss
+        return self.analysis_memo.get_or_compute(
+            fingerprints["unmet_needs"],
+            lambda: freeze(self.unmet_needs_analyzer.analyze_unmet_needs(
+                market, trials, patents, web, internal, documents=self.pdf_parser.documents_for(molecule)
+            ))
+        )
+
+    def _memo_fto(self, fingerprints, molecule, patents, trade, use_description=None):
+        return self.analysis_memo.get_or_compute(
+            self._fto_key(fingerprints),
+            lambda: freeze(self.fto_assessor.assess_fto_risk(
+                molecule, patents, trade, use_description=use_description
+            ))
+        )
+
+    def _store_mit(self, molecule, mit, fingerprints=None):
+        """Store an MIT profile and refresh the portfolio indexes built from it"""
+        self.mit_store.put(molecule, mit)
+        self._record_fingerprints(molecule, fingerprints)
+        self.portfolio_features.upsert(molecule, mit)
+        self.similarity_index.upsert(molecule, mit)
+        self.patent_index.upsert_molecule(molecule, mit.get('patents'))
+        if self.claim_index.add_patents(mit.get('patents') or []):
+            self._save_claim_index(self.claim_index)
+
+    def _save_claim_index(self, index):
+        """Persist the claim index so claims indexed from stored MITs survive a restart"""
+        try:
+            index.save(self.claim_index_path)
+        except OSError as e:
+            logger.warning(f"Claim index could not be saved: {str(e)}")
+
+    def _load_claim_index(self, patent_dataset):
+        """Load the persisted claim index, rebuilding it if the patent dataset changed"""
+        params = dict(
+            num_perm=CLAIM_OVERLAP_CONFIG['NUM_PERM'],
+            bands=CLAIM_OVERLAP_CONFIG['BANDS'],
+            shingle_size=CLAIM_OVERLAP_CONFIG['SHINGLE_SIZE']
+        )
+        source = fingerprint(patent_dataset)
+        
+        index = ClaimIndex(**params)
+        if index.load(self.claim_index_path) and index.source == source:
+            return index
+        
+        index = ClaimIndex(**params)
+        index.add_patents(patent for patents in patent_dataset.values() for patent in patents)
+        index.source = source
+        if len(index):
+            self._save_claim_index(index)
+        return index
+
     def get_query_history(self):
         """Get analysis history"""
-        return self.query_history
+        with self._history_lock:
+            return list(self.query_history)
 
     def clear_history(self):
         """Clear analysis history and storage"""
         self.mit_store.clear()
-        self.query_history.clear()
+        with self._history_lock:
+            self.query_history.clear()
+            self._analysis_fingerprints.clear()
+        self.portfolio_features.clear()
+        self.similarity_index.clear()
+        self.analysis_memo.clear()
         logger.info("History and storage cleared")
 
     def extract_molecule(self, prompt):
@@ -351,6 +718,8 @@ class MasterAgent:
             result = func(*args)
             logger.debug(f"{agent_name} agent completed successfully")
             return result
+        except StreamCancelled:
+            raise
         except Exception as e:
             logger.warning(f"Error in {agent_name} agent: {str(e)}")
             return None
@@ -0,0 +1,275 @@
+"""
+Batch innovation scoring - scores whole portfolios of MIT profiles in one NumPy pass
+"""
+import threading
+
+import numpy as np
+
+
+# Weights reproducing the thresholds hard-coded in compute_innovation_score
+DEFAULT_WEIGHTS = {
+    "market_high_threshold": 1_000_000_000,
+    "market_mid_threshold": 100_000_000,
+    "market_high_points": 30,
+    "market_mid_points": 20,
+    "market_low_points": 10,
+    "points_per_trial": 5,
+    "trial_cap": 25,
+    "points_per_expired_patent": 5,
+    "expired_patent_cap": 20,
+    "points_per_paper": 5,
+    "paper_cap": 15,
+    "max_score": 100,
+}
+
+WEIGHT_PRESETS = {
+    "default": dict(DEFAULT_WEIGHTS),
+    "market_focus": dict(
+        DEFAULT_WEIGHTS,
+        market_high_points=45, market_mid_points=30, market_low_points=10,
+        points_per_trial=4, trial_cap=20,
+        expired_patent_cap=15,
+        paper_cap=10,
+    ),
+    "clinical_focus": dict(
+        DEFAULT_WEIGHTS,
+        market_high_points=20, market_mid_points=15, market_low_points=5,
+        points_per_trial=8, trial_cap=40,
+        paper_cap=15,
+    ),
+    "ip_focus": dict(
+        DEFAULT_WEIGHTS,
+        market_high_points=25, market_mid_points=15,
+        points_per_trial=4, trial_cap=20,
+        points_per_expired_patent=10, expired_patent_cap=40,
+        paper_cap=10,
+    ),
+    "evidence_focus": dict(
+        DEFAULT_WEIGHTS,
+        market_high_points=20, market_mid_points=15,
+        points_per_paper=10, paper_cap=35,
+    ),
+}
+
+FEATURE_NAMES = ("market_size", "trials", "expired_patents", "papers")
+COMPONENT_NAMES = ("market", "trials", "patents", "papers")
+
+
+def resolve_weights(weights=None, preset=None):
+    """
+    Resolve a weight configuration from a preset name and/or overrides
+
+    Args:
+        weights: Optional dict of overrides (unknown keys are rejected)
+        preset: Optional preset name from WEIGHT_PRESETS (defaults to "default")
+
+    Returns:
+        Complete weights dictionary
+    """
+    preset = preset or "default"
+    if preset not in WEIGHT_PRESETS:
+        raise ValueError(
+            f"Unknown weight preset '{preset}'. Available: {', '.join(sorted(WEIGHT_PRESETS))}"
+        )
+
+    resolved = dict(WEIGHT_PRESETS[preset])
+    if weights:
+        if not isinstance(weights, dict):
+            raise ValueError("weights must be an object of weight overrides")
+        unknown = set(weights) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown weight keys: {', '.join(sorted(unknown))}")
+        for key, value in weights.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Weight '{key}' must be numeric")
+            resolved[key] = value
+    return resolved
+
+
+def extract_features(profile):
+    """
+    Extract the raw scoring features from a single MIT profile
+
+    Mirrors the field access of compute_innovation_score, treating missing
+    or null sections as empty.
+
+    Returns:
+        Tuple of (market_size, trial_count, expired_patent_count, paper_count)
+    """
+    market = profile.get("market") or {}
+    market_size = market.get("market_size", 0) if isinstance(market, dict) else 0
+
+    trials = profile.get("trials") or []
+    patents = profile.get("patents") or []
+    expired = sum(1 for p in patents if isinstance(p, dict) and p.get("status") == "expired")
+
+    web = profile.get("web") or {}
+    papers = (web.get("top_papers") or []) if isinstance(web, dict) else []
+
+    return (market_size or 0, len(trials), expired, len(papers))
+
+
+def features_to_arrays(profiles):
+    """Pull the scoring features of many profiles into column arrays"""
+    rows = [extract_features(p) for p in profiles]
+    if not rows:
+        return {name: np.zeros(0, dtype=np.float64) for name in FEATURE_NAMES}
+    matrix = np.asarray(rows, dtype=np.float64)
+    return {name: matrix[:, i] for i, name in enumerate(FEATURE_NAMES)}
+
+
+def component_scores(features, weights):
+    """
+    Compute the per-component score contributions
+
+    Weight values may be scalars or arrays; arrays of shape (W, 1) broadcast
+    against feature arrays of shape (N,) to score W weight settings at once.
+
+    Args:
+        features: Dict of feature arrays keyed by FEATURE_NAMES
+        weights: Complete weights dictionary (see resolve_weights)
+
+    Returns:
+        Dict of contribution arrays keyed by COMPONENT_NAMES
+    """
+    ms = features["market_size"]
+    market = np.where(
+        ms > weights["market_high_threshold"],
+        weights["market_high_points"],
+        np.where(ms > weights["market_mid_threshold"], weights["market_mid_points"], weights["market_low_points"]),
+    )
+    return {
+        "market": np.asarray(market, dtype=np.float64),
+        "trials": np.minimum(features["trials"] * weights["points_per_trial"], weights["trial_cap"]),
+        "patents": np.minimum(
+            features["expired_patents"] * weights["points_per_expired_patent"], weights["expired_patent_cap"]
+        ),
+        "papers": np.minimum(features["papers"] * weights["points_per_paper"], weights["paper_cap"]),
+    }
+
+
+def score_features(features, weights):
+    """Score feature arrays under a weight configuration (capped at max_score)"""
+    components = component_scores(features, weights)
+    total = components["market"] + components["trials"] + components["patents"] + components["papers"]
+    return np.minimum(total, weights["max_score"])
+
+
+def competition_ranks(scores):
+    """
+    Rank scores in descending order, tied scores sharing the best rank ("1224" ranking)
+
+    Args:
+        scores: Array of shape (N,) or (W, N); rows are ranked independently
+
+    Returns:
+        Integer array of the same shape: 1 + the number of strictly higher
+        scores in the row
+    """
+    rows = np.atleast_2d(scores)
+    n = rows.shape[1]
+    order = np.argsort(-rows, axis=1, kind="stable")
+    ordered = np.take_along_axis(rows, order, axis=1)
+    # A run of equal scores takes the position of its first member
+    starts = np.ones(ordered.shape, dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    positions = np.broadcast_to(np.arange(1, n + 1, dtype=np.int64), ordered.shape)
+    run_ranks = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, run_ranks, axis=1)
+    return ranks.reshape(np.shape(scores))
+
+
+def _as_number(value):
+    """Convert a float score to int when integral so JSON matches the scalar scorer"""
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def score_profiles(profiles, weights=None, preset=None):
+    """
+    Score a list of MIT profiles in one vectorized pass
+
+    Returns:
+        List of scores in the same order as `profiles`; with the default
+        weights these are identical to compute_innovation_score.
+    """
+    resolved = resolve_weights(weights, preset)
+    scores = score_features(features_to_arrays(profiles), resolved)
+    return [_as_number(s) for s in scores]
+
+
+class PortfolioFeatures:
+    """Columnar, incrementally maintained scoring features for the MIT portfolio"""
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self._index = {}
+        self._molecules = []
+        self._matrix = np.zeros((capacity, len(FEATURE_NAMES)), dtype=np.float64)
+
+    def __len__(self):
+        return len(self._molecules)
+
+    def upsert(self, molecule, profile):
+        """Insert or refresh the feature row for a molecule"""
+        row = extract_features(profile)
+        with self._lock:
+            idx = self._index.get(molecule)
+            if idx is None:
+                idx = len(self._molecules)
+                if idx >= self._matrix.shape[0]:
+                    grown = np.zeros((self._matrix.shape[0] * 2, len(FEATURE_NAMES)), dtype=np.float64)
+                    grown[:idx] = self._matrix[:idx]
+                    self._matrix = grown
+                self._index[molecule] = idx
+                self._molecules.append(molecule)
+            self._matrix[idx] = row
+
+    def clear(self):
+        """Remove all rows"""
+        with self._lock:
+            self._index.clear()
+            self._molecules = []
+            self._matrix[:] = 0
+
+    def snapshot(self):
+        """
+        Return a consistent copy of the portfolio features
+
+        Returns:
+            Tuple of (molecules list, features dict of arrays)
+        """
+        with self._lock:
+            n = len(self._molecules)
+            molecules = list(self._molecules)
+            matrix = self._matrix[:n].copy()
+        return molecules, {name: matrix[:, i] for i, name in enumerate(FEATURE_NAMES)}
+
+    def rank(self, weights=None, preset=None, top=None):
+        """
+        Re-rank the whole portfolio under a weight configuration
+
+        Args:
+            weights: Optional weight overrides
+            preset: Optional preset name
+            top: Optional number of leading entries to return
+
+        Returns:
+            List of {"rank", "molecule", "innovation_score"} sorted by score;
+            tied scores share a rank (see competition_ranks)
+        """
+        resolved = resolve_weights(weights, preset)
+        molecules, features = self.snapshot()
+        scores = score_features(features, resolved)
+        ranks = competition_ranks(scores)
+
+        # Stable sort on descending score lists ties in insertion order
+        order = np.argsort(-scores, kind="stable")
+        if top is not None:
+            order = order[:top]
+
+        return [
+            {"rank": int(ranks[i]), "molecule": molecules[i], "innovation_score": _as_number(scores[i])}
+            for i in order
+        ]
@@ -0,0 +1,237 @@
+"""
+Compact MIT records - slotted profiles built from interned strings and shared sub-objects
+
+Most of a stored MIT repeats across molecules: default market/trade payloads,
+example patents and trials, and the web/internal placeholder literals that
+only differ by the molecule name. CompactMIT stores those parts once:
+
+- strings are interned;
+- every dict/list is hash-consed into a process-wide pool of read-only
+  containers, so structurally equal sub-objects are shared;
+- strings mentioning the profile's own molecule are stored as templates, so
+  "Recent advances in Aspirin research" and "Recent advances in Metformin
+  research" share one object.
+
+to_dict() renders the record back into the exact profile (same keys, key
+order and values), so it serialises to the same JSON as before.
+"""
+import hashlib
+import struct
+import sys
+import threading
+import weakref
+
+from .frozen import FrozenDict, FrozenList
+
+_SENTINEL = "\x00molecule\x00"
+
+# Templates are only used for names long enough to be unambiguous
+_MIN_TEMPLATE_LENGTH = 3
+
+
+class _Template:
+    """A string with the molecule name factored out"""
+
+    __slots__ = ("text", "__weakref__")
+
+    def __init__(self, text):
+        self.text = text
+
+    def render(self, molecule):
+        return self.text.replace(_SENTINEL, molecule)
+
+
+class _TemplatedDict(FrozenDict):
+    """Shared dict that (transitively) contains templates"""
+
+
+class _TemplatedList(FrozenList):
+    """Shared list that (transitively) contains templates"""
+
+
+class SharedPool:
+    """Hash-consing pool of read-only sub-objects, keyed by a structural digest"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._objects = weakref.WeakValueDictionary()
+        self._key_orders = {}
+        self.requests = 0
+        self.shared_hits = 0
+
+    def __len__(self):
+        return len(self._objects)
+
+    def key_order(self, keys):
+        """Return a shared tuple for a sequence of dict keys"""
+        keys = tuple(sys.intern(k) for k in keys)
+        with self._lock:
+            return self._key_orders.setdefault(keys, keys)
+
+    def _share(self, digest, factory):
+        with self._lock:
+            self.requests += 1
+            obj = self._objects.get(digest)
+            if obj is None:
+                obj = factory()
+                self._objects[digest] = obj
+            else:
+                self.shared_hits += 1
+            return obj
+
+    def get_stats(self):
+        """Get pool sharing statistics"""
+        return {
+            "shared_objects": len(self._objects),
+            "key_orders": len(self._key_orders),
+            "requests": self.requests,
+            "shared_hits": self.shared_hits
+        }
+
+    def canonical(self, value, molecule):
+        """
+        Convert a JSON-like value into its shared, read-only form
+
+        Returns:
+            Tuple of (shared value, digest bytes, contains_template flag)
+        """
+        if not (molecule and len(molecule) >= _MIN_TEMPLATE_LENGTH):
+            molecule = None
+        return self._canonical(value, molecule)
+
+    def _canonical(self, value, molecule):
+        if isinstance(value, str):
+            if molecule is not None and molecule in value and _SENTINEL not in value:
+                text = value.replace(molecule, _SENTINEL)
+                digest = hashlib.blake2b(b"t" + text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+                return self._share(digest, lambda: _Template(sys.intern(text))), digest, True
+            return sys.intern(value), b"s" + value.encode("utf-8", "surrogatepass"), False
+
+        if isinstance(value, dict):
+            # Parts are length-prefixed and hashed in one call; leaves are handled inline
+            parts, items, templated = [b"d"], [], False
+            for k, v in value.items():
+                if type(v) in _SCALARS or (type(v) is str and (molecule is None or molecule not in v)):
+                    shared, child = _leaf(v)
+                else:
+                    shared, child, child_templated = self._canonical(v, molecule)
+                    templated = templated or child_templated
+                key = repr(k).encode("utf-8", "surrogatepass")
+                parts += (_FRAME(len(key)), key, _FRAME(len(child)), child)
+                items.append((sys.intern(k) if isinstance(k, str) else k, shared))
+            digest = hashlib.blake2b(b"".join(parts), digest_size=16).digest()
+            cls = _TemplatedDict if templated else FrozenDict
+            return self._share(digest, lambda: cls(items)), digest, templated
+
+        if isinstance(value, (list, tuple)):
+            parts, items, templated = [b"l"], [], False
+            for v in value:
+                if type(v) in _SCALARS or (type(v) is str and (molecule is None or molecule not in v)):
+                    shared, child = _leaf(v)
+                else:
+                    shared, child, child_templated = self._canonical(v, molecule)
+                    templated = templated or child_templated
+                parts += (_FRAME(len(child)), child)
+                items.append(shared)
+            digest = hashlib.blake2b(b"".join(parts), digest_size=16).digest()
+            cls = _TemplatedList if templated else FrozenList
+            return self._share(digest, lambda: cls(items)), digest, templated
+
+        shared, digest = _leaf(value)
+        return shared, digest, False
+
+
+_SCALARS = frozenset((int, float, bool, type(None)))
+
+# 8-byte length prefix of each part, so no two sequences of parts hash alike
+_FRAME = struct.Struct("<Q").pack
+
+
+def _leaf(value):
+    """Shared form and digest of a string without templates or a scalar"""
+    if type(value) is str:
+        return sys.intern(value), b"s" + value.encode("utf-8", "surrogatepass")
+    # Scalars: the type tag keeps 1, 1.0 and True distinct (they encode differently)
+    return value, f"{type(value).__name__}:{value!r}".encode("utf-8")
+
+
+def _render(value, molecule):
+    """Rebuild the templated parts of a shared value for one molecule"""
+    if isinstance(value, _Template):
+        return value.render(molecule)
+    if isinstance(value, _TemplatedDict):
+        return FrozenDict((k, _render(v, molecule)) for k, v in value.items())
+    if isinstance(value, _TemplatedList):
+        return FrozenList(_render(v, molecule) for v in value)
+    return value
+
+
+class CompactMIT:
+    """Slotted, memory-compact MIT profile record"""
+
+    FIELDS = (
+        "molecule", "market", "trade", "patents", "trials", "web",
+        "internal", "highlights", "metadata", "innovation_score",
+    )
+
+    __slots__ = FIELDS + ("_keys", "_extra")
+
+    @classmethod
+    def from_profile(cls, profile, pool):
+        """
+        Build a compact record from a profile dict
+
+        Args:
+            profile: MIT profile dictionary (as built by MITBuilder)
+            pool: SharedPool used to share sub-objects between records
+        """
+        record = cls.__new__(cls)
+        molecule = profile.get("molecule")
+        molecule = sys.intern(molecule) if isinstance(molecule, str) else molecule
+        template_name = molecule if isinstance(molecule, str) else None
+
+        extra = {}
+        for field in cls.FIELDS:
+            object.__setattr__(record, field, None)
+        for key, value in profile.items():
+            if key == "molecule":
+                shared = molecule
+            else:
+                shared = pool.canonical(value, template_name)[0]
+            if key in cls.FIELDS:
+                object.__setattr__(record, key, shared)
+            else:
+                extra[key] = shared
+
+        object.__setattr__(record, "_keys", pool.key_order(profile.keys()))
+        object.__setattr__(record, "_extra", FrozenDict(extra) if extra else None)
+        return record
+
+    def __setattr__(self, name, value):
+        raise TypeError("CompactMIT records are read-only")
+
+    def _raw(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self._extra[key]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def get(self, key, default=None):
+        """Dict-style access to a rendered field"""
+        if key not in self._keys:
+            return default
+        return _render(self._raw(key), self.molecule)
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return _render(self._raw(key), self.molecule)
+
+    def keys(self):
+        return self._keys
+
+    def to_dict(self):
+        """Render the record back into a read-only profile dict"""
+        return FrozenDict((key, _render(self._raw(key), self.molecule)) for key in self._keys)
@@ -0,0 +1,41 @@
+"""
+Read-only JSON containers shared between threads and MIT records
+"""
+
+
+class FrozenDict(dict):
+    """Read-only dict; still a dict for isinstance checks and JSON encoding"""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("MIT snapshots are read-only")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+    __ior__ = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+    """Read-only list; still a list for isinstance checks and JSON encoding"""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("MIT snapshots are read-only")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = remove = pop = clear = sort = reverse = _immutable
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+
+def freeze(value):
+    """Deep-copy a JSON-like structure into read-only containers"""
+    if isinstance(value, FrozenDict) or isinstance(value, FrozenList):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(v) for v in value)
+    return value
@@ -0,0 +1,168 @@
+"""
+MIT store - lock-striped, copy-on-write storage of MIT profiles
+
+Writers serialise per stripe; readers never take a lock. Each stripe keeps
+its molecule -> profile mapping in a dict that is replaced (never mutated)
+on write, so a reader always sees a complete, consistent snapshot. Stored
+profiles are read-only, so the objects handed to readers can be shared
+between threads without copying.
+
+With compact=True profiles are kept as CompactMIT records (interned strings,
+shared sub-objects) and rendered back into read-only dicts on read. The
+snapshots of the most recently stored or read molecules are kept rendered,
+so hot molecules are read at plain-dict speed; a cached snapshot is only
+used while its record is still the stored one.
+"""
+import threading
+import zlib
+
+from .frozen import freeze
+from .compact import CompactMIT, SharedPool
+
+
+class _Stripe:
+    __slots__ = ("lock", "data")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+
+class MITStore:
+    """Concurrency-safe molecule -> MIT profile mapping"""
+
+    def __init__(self, stripes=64, compact=False, decoded_cache_size=1024):
+        """
+        Args:
+            stripes: Number of lock stripes
+            compact: Store CompactMIT records instead of frozen dicts
+            decoded_cache_size: Rendered snapshots kept in compact mode
+        """
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self.pool = SharedPool() if compact else None
+        self.decoded_cache_size = decoded_cache_size
+        self._decoded = {}          # molecule -> (record, rendered snapshot), oldest first
+        self._decoded_lock = threading.Lock()
+
+    def _stripe(self, molecule):
+        return self._stripes[zlib.crc32(molecule.encode("utf-8")) % len(self._stripes)]
+
+    def _encode(self, profile):
+        if self.pool is not None:
+            return CompactMIT.from_profile(profile, self.pool)
+        return freeze(profile)
+
+    def _decode(self, stored, molecule=None):
+        """Read-only snapshot of a stored record; with `molecule`, through the rendered-snapshot cache"""
+        if not isinstance(stored, CompactMIT):
+            return stored
+        if molecule is None or not self.decoded_cache_size:
+            return stored.to_dict()
+        cached = self._decoded.get(molecule)
+        if cached is not None and cached[0] is stored:
+            return cached[1]
+        snapshot = stored.to_dict()
+        with self._decoded_lock:
+            self._decoded.pop(molecule, None)
+            self._decoded[molecule] = (stored, snapshot)
+            while len(self._decoded) > self.decoded_cache_size:
+                del self._decoded[next(iter(self._decoded))]
+        return snapshot
+
+    def put(self, molecule, profile):
+        """
+        Store a profile, publishing a read-only snapshot to readers
+
+        Returns:
+            The read-only snapshot that was stored
+        """
+        stored = self._encode(profile)
+        stripe = self._stripe(molecule)
+        with stripe.lock:
+            data = dict(stripe.data)
+            data[molecule] = stored
+            stripe.data = data
+        return self._decode(stored, molecule)
+
+    def update(self, molecule, fn):
+        """
+        Atomically replace a profile with fn(current) (current may be None)
+
+        Returns:
+            The read-only snapshot that was stored
+        """
+        stripe = self._stripe(molecule)
+        with stripe.lock:
+            current = stripe.data.get(molecule)
+            stored = self._encode(fn(self._decode(current, molecule) if current is not None else None))
+            data = dict(stripe.data)
+            data[molecule] = stored
+            stripe.data = data
+        return self._decode(stored, molecule)
+
+    def delete(self, molecule):
+        """Remove a molecule; returns True if it was present"""
+        stripe = self._stripe(molecule)
+        with stripe.lock:
+            if molecule not in stripe.data:
+                return False
+            data = dict(stripe.data)
+            del data[molecule]
+            stripe.data = data
+        with self._decoded_lock:
+            self._decoded.pop(molecule, None)
+        return True
+
+    def get(self, molecule, default=None):
+        """Lock-free read of the current snapshot for a molecule"""
+        stored = self._stripe(molecule).data.get(molecule)
+        return default if stored is None else self._decode(stored, molecule)
+
+    def get_record(self, molecule):
+        """Lock-free read of the stored record (CompactMIT in compact mode)"""
+        return self._stripe(molecule).data.get(molecule)
+
+    def clear(self):
+        """Remove every profile"""
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.data = {}
+        with self._decoded_lock:
+            self._decoded = {}
+
+    def records(self):
+        """Iterate (molecule, stored record) pairs without rendering"""
+        for stripe in self._stripes:
+            yield from stripe.data.items()
+
+    def items(self):
+        """Iterate (molecule, snapshot) pairs from per-stripe snapshots (bypassing the snapshot cache)"""
+        for molecule, stored in self.records():
+            yield molecule, self._decode(stored)
+
+    def keys(self):
+        for molecule, _ in self.records():
+            yield molecule
+
+    def values(self):
+        for _, profile in self.items():
+            yield profile
+
+    def __len__(self):
+        return sum(len(stripe.data) for stripe in self._stripes)
+
+    def __contains__(self, molecule):
+        return molecule in self._stripe(molecule).data
+
+    def __getitem__(self, molecule):
+        return self._decode(self._stripe(molecule).data[molecule], molecule)
+
+    def __setitem__(self, molecule, profile):
+        self.put(molecule, profile)
+
+    def __delitem__(self, molecule):
+        if not self.delete(molecule):
+            raise KeyError(molecule)
+
+    def __iter__(self):
+        return self.keys()
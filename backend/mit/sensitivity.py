@@ -0,0 +1,139 @@
+"""
+Innovation score sensitivity analysis - evaluates grids of weight settings across the portfolio
+"""
+import itertools
+
+import numpy as np
+
+from .batch_scoring import COMPONENT_NAMES, DEFAULT_WEIGHTS, competition_ranks, component_scores, resolve_weights
+
+# Upper bound on the number of weight settings evaluated per request
+MAX_GRID_SIZE = 10_000
+
+# Score cells (settings x molecules) evaluated per vectorized chunk
+CHUNK_CELLS = 4_000_000
+
+
+def build_weight_grid(base_preset=None, ranges=None, presets=None):
+    """
+    Build a grid of weight settings
+
+    Args:
+        base_preset: Preset the ranges are applied on top of
+        ranges: Dict mapping weight keys to lists of candidate values; the
+            grid is their cartesian product
+        presets: Optional list of preset names added to the grid as-is
+
+    Returns:
+        Dict of weight keys to float arrays of shape (W,)
+    """
+    settings = []
+    ranges = ranges or {}
+    if not isinstance(ranges, dict):
+        raise ValueError("ranges must be an object mapping weight keys to value lists")
+
+    for key, values in ranges.items():
+        if key not in DEFAULT_WEIGHTS:
+            raise ValueError(f"Unknown weight key in ranges: {key}")
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"ranges.{key} must be a non-empty list")
+
+    grid_size = int(np.prod([len(v) for v in ranges.values()])) if ranges else 1
+    if grid_size + len(presets or []) > MAX_GRID_SIZE:
+        raise ValueError(f"Weight grid too large (max {MAX_GRID_SIZE} settings)")
+
+    keys = list(ranges)
+    for combo in itertools.product(*(ranges[k] for k in keys)):
+        settings.append(resolve_weights(dict(zip(keys, combo)), base_preset))
+
+    for name in presets or []:
+        settings.append(resolve_weights(preset=name))
+
+    return {key: np.array([s[key] for s in settings], dtype=np.float64) for key in DEFAULT_WEIGHTS}
+
+
+def analyze_sensitivity(molecules, features, grid, top_k=10, baseline=None):
+    """
+    Score every molecule under every weight setting and summarize rank stability
+
+    The (settings x molecules) score matrix is evaluated in chunks of weight
+    settings so memory stays bounded for large portfolios. Tied scores
+    share a rank (see competition_ranks), so insertion order never moves
+    a molecule in or out of the top k.
+
+    Args:
+        molecules: List of molecule names (length N)
+        features: Dict of feature arrays of shape (N,)
+        grid: Weight grid from build_weight_grid (arrays of shape (W,))
+        top_k: Rank threshold counted for top-k frequency
+        baseline: Weights used for the reference ranking (defaults to "default")
+
+    Returns:
+        Dictionary with grid size and per-molecule stability/contribution stats
+    """
+    n = len(molecules)
+    w = len(grid["max_score"])
+    if n == 0 or w == 0:
+        return {"settings_evaluated": w, "molecules": []}
+
+    rank_sum = np.zeros(n)
+    rank_sq_sum = np.zeros(n)
+    best_rank = np.full(n, n, dtype=np.int64)
+    worst_rank = np.ones(n, dtype=np.int64)
+    top_k_hits = np.zeros(n, dtype=np.int64)
+    score_sum = np.zeros(n)
+    contribution_sum = {name: np.zeros(n) for name in COMPONENT_NAMES}
+
+    chunk = max(1, CHUNK_CELLS // n)
+    for start in range(0, w, chunk):
+        weights = {key: values[start:start + chunk, None] for key, values in grid.items()}
+        components = component_scores(features, weights)
+        raw = sum(np.broadcast_to(components[name], (len(weights["max_score"]), n)) for name in COMPONENT_NAMES)
+        scores = np.minimum(raw, weights["max_score"])
+
+        ranks = competition_ranks(scores)
+
+        rank_sum += ranks.sum(axis=0)
+        rank_sq_sum += np.square(ranks, dtype=np.float64).sum(axis=0)
+        np.minimum(best_rank, ranks.min(axis=0), out=best_rank)
+        np.maximum(worst_rank, ranks.max(axis=0), out=worst_rank)
+        top_k_hits += (ranks <= top_k).sum(axis=0)
+        score_sum += scores.sum(axis=0)
+        for name in COMPONENT_NAMES:
+            contribution_sum[name] += np.broadcast_to(components[name], scores.shape).sum(axis=0)
+
+    mean_rank = rank_sum / w
+    rank_std = np.sqrt(np.maximum(rank_sq_sum / w - mean_rank ** 2, 0))
+    stability = 1 - (worst_rank - best_rank) / max(n - 1, 1)
+
+    baseline_weights = baseline or resolve_weights()
+    base_components = component_scores(features, baseline_weights)
+    base_scores = np.minimum(sum(base_components[name] for name in COMPONENT_NAMES), baseline_weights["max_score"])
+    base_ranks = competition_ranks(base_scores)
+
+    contribution_total = sum(contribution_sum.values())
+    results = []
+    for i, molecule in enumerate(molecules):
+        total = contribution_total[i]
+        results.append({
+            "molecule": molecule,
+            "baseline_rank": int(base_ranks[i]),
+            "baseline_score": round(float(base_scores[i]), 2),
+            "mean_score": round(float(score_sum[i] / w), 2),
+            "mean_rank": round(float(mean_rank[i]), 2),
+            "rank_std": round(float(rank_std[i]), 2),
+            "best_rank": int(best_rank[i]),
+            "worst_rank": int(worst_rank[i]),
+            "rank_stability": round(float(stability[i]), 4),
+            "top_k_frequency": round(float(top_k_hits[i] / w), 4),
+            "feature_contributions": {
+                name: {
+                    "mean_points": round(float(contribution_sum[name][i] / w), 2),
+                    "share": round(float(contribution_sum[name][i] / total), 4) if total else 0.0,
+                }
+                for name in COMPONENT_NAMES
+            },
+        })
+
+    results.sort(key=lambda r: (r["mean_rank"], r["baseline_rank"]))
+    return {"settings_evaluated": w, "top_k": top_k, "molecules": results}
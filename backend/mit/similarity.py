@@ -0,0 +1,221 @@
+"""
+MIT similarity index - numeric profile vectors and CPU nearest-neighbour search
+"""
+import math
+import threading
+
+import numpy as np
+
+TRIAL_PHASES = ("phase i", "phase ii", "phase iii", "phase iv")
+PATENT_STATUSES = ("active", "expired")
+
+
+class ProfileVectorizer:
+    """Turns an MIT profile into a fixed-length, L2-normalised feature vector"""
+
+    def __init__(self, therapy_keywords, classifier=None):
+        """
+        Args:
+            therapy_keywords: Dict of therapy area -> keyword list used to tag
+                the areas a profile's trials, papers and notes mention
+            classifier: Optional TherapyAreaClassifier; when given it does
+                the tagging in one automaton pass instead of per-keyword scans
+        """
+        self.classifier = classifier
+        self.therapy_areas = sorted(therapy_keywords)
+        self.therapy_keywords = {area: [k.lower() for k in therapy_keywords[area]] for area in self.therapy_areas}
+        self.feature_names = (
+            ["market_size", "market_cagr"]
+            + [f"trials_{p.replace(' ', '_')}" for p in TRIAL_PHASES]
+            + ["trial_count"]
+            + [f"patents_{s}" for s in PATENT_STATUSES]
+            + ["patents_other", "patent_count"]
+            + [f"therapy_{a}" for a in self.therapy_areas]
+            + ["trade_imports", "trade_exports", "trade_balance"]
+        )
+        self.dim = len(self.feature_names)
+
+    def _profile_text(self, profile):
+        """Collect the free text used for therapy area tagging"""
+        parts = []
+        for trial in profile.get("trials") or []:
+            if isinstance(trial, dict):
+                parts.append(str(trial.get("title", "")))
+        web = profile.get("web") or {}
+        if isinstance(web, dict):
+            for paper in web.get("top_papers") or []:
+                if isinstance(paper, dict):
+                    parts.append(str(paper.get("title", "")))
+        internal = profile.get("internal") or {}
+        if isinstance(internal, dict):
+            parts.extend(str(t) for t in internal.get("key_takeaways") or [])
+        return " ".join(parts).lower()
+
+    def therapy_vector(self, profile):
+        """Return the therapy-area block of the feature vector"""
+        text = self._profile_text(profile)
+        if self.classifier is not None:
+            tagged = {entry["area"] for entry in self.classifier.classify({"profile": [text]})}
+            return [1.0 if a in tagged else 0.0 for a in self.therapy_areas]
+        return [1.0 if any(k in text for k in self.therapy_keywords[a]) else 0.0 for a in self.therapy_areas]
+
+    def vectorize(self, profile):
+        """
+        Build the feature vector for one MIT profile
+
+        Returns:
+            float32 array of length `dim` with unit L2 norm (or all zeros)
+        """
+        market = profile.get("market") or {}
+        market = market if isinstance(market, dict) else {}
+        market_size = float(market.get("market_size") or 0)
+        cagr = float(market.get("cagr") or 0)
+
+        trials = [t for t in profile.get("trials") or [] if isinstance(t, dict)]
+        phase_counts = [0.0] * len(TRIAL_PHASES)
+        for trial in trials:
+            phase = str(trial.get("phase", "")).strip().lower()
+            if phase in TRIAL_PHASES:
+                phase_counts[TRIAL_PHASES.index(phase)] += 1
+        trial_total = max(len(trials), 1)
+
+        patents = [p for p in profile.get("patents") or [] if isinstance(p, dict)]
+        status_counts = [0.0] * (len(PATENT_STATUSES) + 1)
+        for patent in patents:
+            status = str(patent.get("status", "")).lower()
+            idx = PATENT_STATUSES.index(status) if status in PATENT_STATUSES else len(PATENT_STATUSES)
+            status_counts[idx] += 1
+        patent_total = max(len(patents), 1)
+
+        trade = profile.get("trade") or {}
+        trade = trade if isinstance(trade, dict) else {}
+        imports = float(trade.get("imports") or 0)
+        exports = float(trade.get("exports") or 0)
+        balance = (exports - imports) / (exports + imports) if exports + imports else 0.0
+
+        vector = np.array(
+            [math.log10(1 + market_size) / 10, cagr / 20]
+            + [c / trial_total for c in phase_counts]
+            + [math.log1p(len(trials)) / 3]
+            + [c / patent_total for c in status_counts]
+            + [math.log1p(len(patents)) / 3]
+            + self.therapy_vector(profile)
+            + [math.log10(1 + imports) / 10, math.log10(1 + exports) / 10, balance],
+            dtype=np.float32,
+        )
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SimilarityIndex:
+    """
+    Incrementally updated nearest-neighbour index over MIT profile vectors
+
+    Exact search is a brute-force cosine scan (one matrix-vector product).
+    Approximate search uses random-hyperplane LSH tables to shortlist
+    candidates, which are then re-ranked exactly.
+    """
+
+    def __init__(self, vectorizer, capacity=1024, n_tables=8, n_bits=20, seed=13):
+        self.vectorizer = vectorizer
+        self._lock = threading.Lock()
+        self._ids = []
+        self._rows = {}
+        self._matrix = np.zeros((capacity, vectorizer.dim), dtype=np.float32)
+
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((n_tables, n_bits, vectorizer.dim)).astype(np.float32)
+        self._bit_weights = (1 << np.arange(n_bits, dtype=np.int64))
+        self._tables = [dict() for _ in range(n_tables)]
+        self._row_keys = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, molecule):
+        return molecule in self._rows
+
+    def _hash_keys(self, vector):
+        """LSH bucket key of a vector in every table"""
+        bits = (self._planes @ vector) > 0
+        return (bits.astype(np.int64) @ self._bit_weights).tolist()
+
+    def upsert(self, molecule, profile):
+        """Add or refresh a molecule's vector without rebuilding the index"""
+        vector = self.vectorizer.vectorize(profile)
+        keys = self._hash_keys(vector)
+        with self._lock:
+            row = self._rows.get(molecule)
+            if row is None:
+                row = len(self._ids)
+                if row >= self._matrix.shape[0]:
+                    grown = np.zeros((self._matrix.shape[0] * 2, self.vectorizer.dim), dtype=np.float32)
+                    grown[:row] = self._matrix[:row]
+                    self._matrix = grown
+                self._rows[molecule] = row
+                self._ids.append(molecule)
+            else:
+                for table, key in zip(self._tables, self._row_keys[row]):
+                    table[key].discard(row)
+            self._matrix[row] = vector
+            self._row_keys[row] = keys
+            for table, key in zip(self._tables, keys):
+                table.setdefault(key, set()).add(row)
+
+    def clear(self):
+        """Remove every vector from the index"""
+        with self._lock:
+            self._ids = []
+            self._rows.clear()
+            self._row_keys.clear()
+            self._matrix[:] = 0
+            for table in self._tables:
+                table.clear()
+
+    def similar(self, molecule, k=5, mode="exact"):
+        """
+        Find the molecules whose profiles are most similar to `molecule`
+
+        Args:
+            molecule: Molecule already present in the index
+            k: Number of neighbours to return
+            mode: "exact" (brute force) or "approx" (LSH shortlist + re-rank)
+
+        Returns:
+            List of {"molecule", "similarity"} sorted by similarity, or None if
+            the molecule is not indexed
+        """
+        if mode not in ("exact", "approx"):
+            raise ValueError("mode must be 'exact' or 'approx'")
+
+        with self._lock:
+            row = self._rows.get(molecule)
+            if row is None:
+                return None
+            n = len(self._ids)
+            query = self._matrix[row].copy()
+
+            if mode == "approx":
+                candidates = set()
+                for table, key in zip(self._tables, self._row_keys[row]):
+                    candidates |= table.get(key, set())
+                candidates.discard(row)
+                # Too few candidates to fill k: fall back to the exact scan
+                if len(candidates) >= k:
+                    rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+                    sims = self._matrix[rows] @ query
+                else:
+                    mode = "exact"
+
+            if mode == "exact":
+                rows = np.arange(n, dtype=np.int64)
+                sims = self._matrix[:n] @ query
+                sims[row] = -np.inf
+            ids = self._ids
+
+        k = min(k, len(rows) - (1 if mode == "exact" else 0))
+        if k <= 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [{"molecule": ids[rows[i]], "similarity": round(float(sims[i]), 4)} for i in top]
@@ -9,6 +9,19 @@ DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 class PatentAgent:
     """Patent Landscape Analysis Agent"""
     
+    def load_all(self):
+        """Load the full patent dataset as a molecule -> patents mapping"""
+        try:
+            path = os.path.join(DATA_DIR, "mock_patents.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+            logger.warning(f"Patent data file not found")
+            return {}
+        except Exception as e:
+            logger.error(f"Patent: Error loading patent dataset: {str(e)}")
+            return {}
+    
     def search_patents(self, molecule):
         """Search for patents related to a molecule"""
         try:
@@ -0,0 +1,241 @@
+"""
+Patent Expiry Index - sorted expiry index and portfolio "patent cliff" forecasting
+"""
+import logging
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+from fto_assessor import ACTIVE_STATUSES, parse_expiry, patent_expiry
+
+logger = logging.getLogger(__name__)
+
+GRANULARITY_MONTHS = {
+    'month': 1,
+    'quarter': 3,
+    'year': 12
+}
+
+
+def _to_day(value):
+    """Coerce a date/datetime/ISO string into numpy datetime64[D]"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return np.datetime64(value.isoformat(), 'D')
+    parsed = parse_expiry(value)
+    if parsed is None:
+        raise ValueError(f"Invalid date '{value}'. Expected YYYY-MM-DD")
+    return np.datetime64(parsed.date().isoformat(), 'D')
+
+
+class PatentExpiryIndex:
+    """
+    Expiry-sorted index over the patents of every molecule in the portfolio
+
+    Expiry dates are parsed once when patents are added. Queries binary-search
+    a sorted datetime64 array, and cliff forecasts bucket it with vectorized
+    month arithmetic. Updates are applied per molecule and the sorted arrays
+    are rebuilt lazily on the next query after a molecule's patents changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_molecule = {}
+        self._dirty = False
+        self._molecules = []
+        self._expiry = np.array([], dtype='datetime64[D]')
+        self._molecule_idx = np.array([], dtype=np.int32)
+        self._active = np.array([], dtype=bool)
+        self._records = []
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(rows) for rows in self._by_molecule.values())
+
+    def load(self, patents_by_molecule):
+        """Add the patents of many molecules (e.g. the full patent dataset)"""
+        for molecule, patents in (patents_by_molecule or {}).items():
+            self.upsert_molecule(molecule, patents)
+
+    def upsert_molecule(self, molecule, patents):
+        """
+        Replace the indexed patents of one molecule
+
+        The sorted arrays are only marked for rebuilding when the molecule's
+        rows actually changed (re-storing an MIT with the same patents is free).
+        """
+        rows = []
+        for patent in patents or []:
+            if not isinstance(patent, dict):
+                continue
+            expiry = patent_expiry(patent)
+            expiry_date = parse_expiry(expiry) if expiry else None
+            if expiry_date is None:
+                continue
+            rows.append((
+                np.datetime64(expiry_date.date().isoformat(), 'D'),
+                str(patent.get('status', 'Unknown')).lower() in ACTIVE_STATUSES,
+                {
+                    "patent_id": patent.get('patent_id', 'Unknown'),
+                    "status": patent.get('status', 'Unknown'),
+                    "owner": patent.get('owner'),
+                    "expiry_date": expiry
+                }
+            ))
+        with self._lock:
+            if molecule in self._by_molecule and self._by_molecule[molecule] == rows:
+                return
+            self._by_molecule[molecule] = rows
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._by_molecule.clear()
+            self._dirty = True
+
+    def _snapshot(self):
+        """Return the sorted arrays, rebuilding them if molecules changed"""
+        with self._lock:
+            if self._dirty:
+                molecules, expiry, molecule_idx, active, records = [], [], [], [], []
+                for i, (molecule, rows) in enumerate(self._by_molecule.items()):
+                    molecules.append(molecule)
+                    for day, is_active, record in rows:
+                        expiry.append(day)
+                        molecule_idx.append(i)
+                        active.append(is_active)
+                        records.append(record)
+                expiry = np.array(expiry, dtype='datetime64[D]')
+                order = np.argsort(expiry, kind='stable')
+                self._molecules = molecules
+                self._expiry = expiry[order]
+                self._molecule_idx = np.array(molecule_idx, dtype=np.int32)[order] if molecule_idx else np.array([], dtype=np.int32)
+                self._active = np.array(active, dtype=bool)[order] if active else np.array([], dtype=bool)
+                self._records = [records[i] for i in order]
+                self._dirty = False
+            return self._molecules, self._expiry, self._molecule_idx, self._active, self._records
+
+    def expiring_between(self, start, end, active_only=True, limit=None):
+        """
+        Patents across all molecules expiring within [start, end]
+
+        Args:
+            start: Start date (date, datetime or YYYY-MM-DD)
+            end: End date (inclusive)
+            active_only: Only include active/granted patents
+            limit: Optional maximum number of results
+
+        Returns:
+            Dictionary with total count and patents sorted by expiry
+        """
+        start, end = _to_day(start), _to_day(end)
+        if end < start:
+            raise ValueError("end must not be before start")
+
+        molecules, expiry, molecule_idx, active, records = self._snapshot()
+        lo = np.searchsorted(expiry, start, side='left')
+        hi = np.searchsorted(expiry, end, side='right')
+        rows = np.arange(lo, hi)
+        if active_only:
+            rows = rows[active[lo:hi]]
+
+        total = len(rows)
+        if limit is not None:
+            rows = rows[:limit]
+        return {
+            "start": str(start),
+            "end": str(end),
+            "total": int(total),
+            "patents": [dict(records[i], molecule=molecules[molecule_idx[i]]) for i in rows]
+        }
+
+    def forecast_cliffs(self, horizon_years=5, granularity='year', today=None, active_only=True, top=10):
+        """
+        Forecast patent expiry cliffs across the portfolio
+
+        Args:
+            horizon_years: Forecast horizon in years
+            granularity: "month", "quarter" or "year" buckets
+            today: Reference date (defaults to today)
+            active_only: Only count active/granted patents
+            top: Number of molecules listed per bucket and in the full-cliff list
+
+        Returns:
+            Dictionary with per-bucket expiry counts and the molecules whose
+            last active patent expires within the horizon
+        """
+        if granularity not in GRANULARITY_MONTHS:
+            raise ValueError(f"granularity must be one of: {', '.join(GRANULARITY_MONTHS)}")
+        if horizon_years <= 0:
+            raise ValueError("horizon_years must be positive")
+
+        step = GRANULARITY_MONTHS[granularity]
+        start = _to_day(today or date.today())
+        start_month = start.astype('datetime64[M]')
+        end_month = start_month + int(round(horizon_years * 12))
+        end = end_month.astype('datetime64[D]')
+
+        molecules, expiry, molecule_idx, active, records = self._snapshot()
+        lo = np.searchsorted(expiry, start, side='left')
+        hi = np.searchsorted(expiry, end, side='left')
+        window_expiry = expiry[lo:hi]
+        window_mol = molecule_idx[lo:hi]
+        if active_only:
+            mask = active[lo:hi]
+            window_expiry, window_mol = window_expiry[mask], window_mol[mask]
+
+        n_buckets = -(-int(round(horizon_years * 12)) // step)
+        months = (window_expiry.astype('datetime64[M]') - start_month).astype(np.int64)
+        buckets = months // step
+        counts = np.bincount(buckets, minlength=n_buckets)[:n_buckets]
+
+        # Distinct molecules hit per bucket, and the most affected ones
+        n_mol = max(len(molecules), 1)
+        pair_keys, pair_counts = np.unique(buckets * n_mol + window_mol, return_counts=True)
+        pair_bucket, pair_mol = pair_keys // n_mol, pair_keys % n_mol
+
+        timeline = []
+        for b in range(n_buckets):
+            bucket_start = start_month + b * step
+            in_bucket = pair_bucket == b
+            order = np.argsort(-pair_counts[in_bucket], kind='stable')[:top]
+            timeline.append({
+                "period_start": str(bucket_start.astype('datetime64[D]')),
+                "period_end": str((bucket_start + step).astype('datetime64[D]') - 1),
+                "expiring_patents": int(counts[b]),
+                "molecules_affected": int(in_bucket.sum()),
+                "top_molecules": [
+                    {"molecule": molecules[m], "expiring_patents": int(c)}
+                    for m, c in zip(pair_mol[in_bucket][order], pair_counts[in_bucket][order])
+                ]
+            })
+
+        # Full cliffs: molecules whose latest active patent expires inside the horizon
+        full_cliffs = []
+        if len(expiry):
+            act_mask = active & (expiry >= start)
+            missing = np.iinfo(np.int64).min
+            last_day = np.full(len(molecules), missing, dtype=np.int64)
+            np.maximum.at(last_day, molecule_idx[act_mask], expiry[act_mask].astype(np.int64))
+            cliff = (last_day != missing) & (last_day < end.astype(np.int64))
+            cliff_idx = np.nonzero(cliff)[0]
+            cliff_idx = cliff_idx[np.argsort(last_day[cliff_idx], kind='stable')][:top]
+            full_cliffs = [
+                {
+                    "molecule": molecules[m],
+                    "loses_active_protection": str(np.datetime64(int(last_day[m]), 'D'))
+                }
+                for m in cliff_idx
+            ]
+
+        return {
+            "as_of": str(start),
+            "horizon_years": horizon_years,
+            "granularity": granularity,
+            "total_expiring": int(counts.sum()),
+            "molecules_indexed": len(molecules),
+            "timeline": timeline,
+            "full_cliffs": full_cliffs
+        }
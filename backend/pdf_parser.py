@@ -1,12 +1,124 @@
 """
 PDF Parser for extracting insights from internal company documents
 """
+import heapq
 import os
+import re
 import logging
+import sqlite3
 from datetime import datetime
 
+from config import DOCUMENT_CONFIG, INTERNAL_INSIGHTS_CONFIG
+from document_extraction import DocumentExtractor, PAGE_SEPARATOR, extract_to_file
+from document_index import DocumentIndex
+from embedding_store import EmbeddingStore, HashingEmbedder
+from document_store import DocumentStore
+from upload_manifest import UploadManifest
+
 logger = logging.getLogger(__name__)
 
+# Sentence cues for each insight category (matched as whole words, case-insensitive)
+FINDING_CUES = ("demonstrated", "showed", "shown", "significant", "significantly", "results",
+                "efficacy", "observed", "improved", "reduced", "increased", "endpoint")
+UNMET_NEED_CUES = ("unmet need", "unmet needs", "limited treatment", "no approved", "lack of",
+                   "resistant", "compliance", "insufficient", "inadequate", "poorly served")
+RECOMMENDATION_CUES = ("recommend", "recommended", "should", "consider", "propose", "proposed",
+                       "next step", "next steps", "suggest", "suggests")
+
+# Sentences outside this length range are headings, fragments or run-on tables
+MIN_SENTENCE_CHARS = 30
+MAX_SENTENCE_CHARS = 400
+INSIGHTS_PER_CATEGORY = 5
+_READ_CHUNK = 64 * 1024
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n\s*\n|' + PAGE_SEPARATOR)
+
+
+def _cue_pattern(cues):
+    return re.compile(r'\b(?:' + '|'.join(re.escape(c) for c in cues) + r')\b', re.IGNORECASE)
+
+
+_FINDING_PATTERN = _cue_pattern(FINDING_CUES)
+_UNMET_NEED_PATTERN = _cue_pattern(UNMET_NEED_CUES)
+_RECOMMENDATION_PATTERN = _cue_pattern(RECOMMENDATION_CUES)
+
+
+def iter_sentences(text_path):
+    """Stream whitespace-normalized sentences out of an extracted-text file"""
+    tail = ""
+    with open(text_path, encoding='utf-8', errors='replace') as f:
+        while True:
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                break
+            parts = _SENTENCE_END.split(tail + chunk)
+            tail = parts.pop()
+            for part in parts:
+                yield " ".join(part.split())
+    if tail.strip():
+        yield " ".join(tail.split())
+
+
+def top_sentences(text_path, pattern, limit=INSIGHTS_PER_CATEGORY):
+    """
+    Sentences with the most cue matches, in document order
+
+    A bounded heap keeps memory constant however long the document is.
+    """
+    heap, seen = [], set()
+    for position, sentence in enumerate(iter_sentences(text_path)):
+        if not MIN_SENTENCE_CHARS <= len(sentence) <= MAX_SENTENCE_CHARS:
+            continue
+        score = len(pattern.findall(sentence))
+        if not score:
+            continue
+        key = sentence.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        # Ties go to the earlier sentence
+        entry = (score, -position, sentence)
+        if len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+    return [sentence for _, _, sentence in sorted(heap, key=lambda e: -e[1])]
+
+
+def _extract_key_findings(text_path):
+    """Extract key findings from extracted text"""
+    return top_sentences(text_path, _FINDING_PATTERN)
+
+
+def _extract_unmet_needs(text_path):
+    """Extract unmet needs from extracted text"""
+    return top_sentences(text_path, _UNMET_NEED_PATTERN)
+
+
+def _extract_recommendations(text_path):
+    """Extract recommendations from extracted text"""
+    return top_sentences(text_path, _RECOMMENDATION_PATTERN)
+
+
+def extract_insights(text_path):
+    """
+    Extract key findings, unmet needs and recommendations from extracted text
+
+    Module-level so worker processes can run it under any start method.
+    Depends only on the text, so results are cached by content hash.
+
+    Args:
+        text_path: Extracted-text file (see document_extraction)
+
+    Returns:
+        Dictionary of insight lists
+    """
+    return {
+        "key_findings": _extract_key_findings(text_path),
+        "unmet_needs": _extract_unmet_needs(text_path),
+        "recommendations": _extract_recommendations(text_path)
+    }
+
 
 class PDFParser:
     """Parses uploaded PDFs and extracts key insights"""
@@ -14,11 +126,57 @@ class PDFParser:
     def __init__(self):
         self.upload_dir = os.path.join(os.path.dirname(__file__), 'uploads')
         os.makedirs(self.upload_dir, exist_ok=True)
+        self.store = DocumentStore(
+            self.upload_dir,
+            near_duplicate_bits=DOCUMENT_CONFIG['NEAR_DUPLICATE_BITS'],
+            min_shared_pages=DOCUMENT_CONFIG['NEAR_DUPLICATE_MIN_SHARED']
+        )
+        self.text_dir = self.store.text_dir
+        self.extractor = DocumentExtractor(
+            self.store.tmp_dir,
+            analyze=extract_insights,
+            workers=DOCUMENT_CONFIG['EXTRACT_WORKERS'],
+            timeout=DOCUMENT_CONFIG['EXTRACT_TIMEOUT'],
+            max_pending=DOCUMENT_CONFIG['MAX_PENDING'],
+            max_page_chars=DOCUMENT_CONFIG['MAX_PAGE_CHARS'],
+            max_document_chars=DOCUMENT_CONFIG['MAX_DOCUMENT_CHARS'],
+            memory_limit_mb=DOCUMENT_CONFIG['WORKER_MEMORY_MB'],
+            on_complete=self._on_extracted,
+            planner=self._plan_reuse,
+            on_finish=self._on_finished
+        )
+        self.manifest = UploadManifest(os.path.join(self.upload_dir, 'manifest.sqlite3'), self.upload_dir)
+        self.index = DocumentIndex(
+            passage_words=DOCUMENT_CONFIG['PASSAGE_WORDS'],
+            snippet_chars=DOCUMENT_CONFIG['SNIPPET_CHARS']
+        )
+        self.embeddings = EmbeddingStore(
+            os.path.join(self.upload_dir, 'embeddings', 'chunks'),
+            HashingEmbedder(INTERNAL_INSIGHTS_CONFIG['EMBEDDING_DIM']),
+            chunk_words=DOCUMENT_CONFIG['PASSAGE_WORDS']
+        )
+        self._load_index()
+    
+    def _load_index(self):
+        """Index the extracted text of every finished upload in the manifest"""
+        for molecule, content_hash, job_id, filename, text_path in self.manifest.completed():
+            if os.path.exists(text_path):
+                self._index_document(content_hash or job_id, text_path, molecule, filename)
+        if self.index.document_count:
+            logger.info(f"Indexed {self.index.document_count} documents ({len(self.index)} passages)")
+    
+    def _index_document(self, key, text_path, molecule, filename):
+        """Add a document to the passage index and the chunk-embedding store"""
+        self.index.add(key, text_path, molecule, filename)
+        # Appends only when the document has no stored embeddings yet
+        self.embeddings.add_document(key, text_path)
     
     def parse_pdf(self, file_path, molecule=None):
         """
         Parse PDF and extract key information
         
+        Runs in the calling thread; uploads go through `submit` instead.
+        
         Args:
             file_path: Path to uploaded PDF
             molecule: Optional molecule name for context
@@ -27,25 +185,26 @@ class PDFParser:
             Dictionary with extracted insights
         """
         try:
-            # For now, extract basic file info and simulate content parsing
-            # In production, use PyPDF2 or pdfplumber for actual extraction
-            
             if not os.path.exists(file_path):
                 logger.warning(f"File not found: {file_path}")
                 return None
             
             file_size = os.path.getsize(file_path)
             file_name = os.path.basename(file_path)
+            text_path = os.path.join(self.text_dir, file_name + '.txt')
+            pages, chars, truncated = extract_to_file(
+                file_path, text_path, DOCUMENT_CONFIG['MAX_PAGE_CHARS'], DOCUMENT_CONFIG['MAX_DOCUMENT_CHARS']
+            )
             
-            # Simulate PDF content extraction
             insights = {
                 "file_name": file_name,
                 "file_size": file_size,
                 "parsed_date": datetime.utcnow().isoformat(),
                 "molecule": molecule,
-                "key_findings": self._extract_key_findings(file_path),
-                "unmet_needs": self._extract_unmet_needs(file_path),
-                "recommendations": self._extract_recommendations(file_path)
+                "pages": pages,
+                "characters": chars,
+                "truncated": truncated,
+                **extract_insights(text_path)
             }
             
             logger.info(f"Successfully parsed PDF: {file_name}")
@@ -55,30 +214,136 @@ class PDFParser:
             logger.error(f"Error parsing PDF: {str(e)}")
             return None
     
-    def _extract_key_findings(self, file_path):
-        """Extract key findings from PDF"""
-        # Simulated key findings
-        return [
-            "Strong market potential identified",
-            "Competitive landscape analysis complete",
-            "Regulatory pathway clear for new indication"
-        ]
-    
-    def _extract_unmet_needs(self, file_path):
-        """Extract unmet needs from document"""
-        return [
-            "Limited treatment options for resistant cases",
-            "Patient compliance issues with current therapy",
-            "Safety concerns with existing alternatives"
-        ]
-    
-    def _extract_recommendations(self, file_path):
-        """Extract recommendations from document"""
-        return [
-            "Consider combination therapy approach",
-            "Target patient population: 50+ with comorbidities",
-            "Timeline: 18-24 months for Phase 2 initiation"
-        ]
+    def store_upload(self, file_obj, filename, alias=None):
+        """
+        Stream an upload into the content-addressed store
+        
+        Args:
+            file_obj: Readable binary stream
+            filename: Original file name
+            alias: Optional path under which the stored blob is also linked
+            
+        Returns:
+            Tuple of (content_hash, blob_path, size, created)
+        """
+        content_hash, blob_path, size, created = self.store.save_stream(file_obj, filename)
+        if alias:
+            self.store.link(blob_path, alias)
+        logger.info(f"Stored upload {filename} as {content_hash[:12]} ({'new' if created else 'existing'} content)")
+        return content_hash, blob_path, size, created
+    
+    def submit(self, file_path, molecule=None, filename=None, content_hash=None):
+        """
+        Queue an uploaded document for extraction in a worker process
+        
+        Content already extracted under `content_hash` is served from the
+        cache: the returned job is finished immediately.
+        
+        Returns:
+            ExtractionJob tracking progress and, once done, the insights
+        
+        Raises:
+            RuntimeError: if the extraction queue is full
+        """
+        record = self.store.get(content_hash) if content_hash else None
+        if record is None:
+            job = self.extractor.submit(file_path, molecule, filename, content_hash)
+        else:
+            job = self.extractor.add_completed(
+                file_path, self.store.text_path(content_hash), record, molecule, filename, content_hash
+            )
+            job.near_duplicate_of = record.get("near_duplicate_of")
+            self._record_document(job)
+            logger.info(f"Extraction cache hit for {job.filename} ({content_hash[:12]})")
+        self.manifest.sync(job, size=os.path.getsize(file_path))
+        return job
+    
+    def get_job(self, job_id):
+        """Extraction job by id, or None"""
+        return self.extractor.get(job_id)
+    
+    def get_upload(self, job_id):
+        """
+        Status and insights of an upload, from its live job or the manifest
+        
+        Returns:
+            Job dictionary, or None for an unknown job id
+        """
+        job = self.extractor.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        row = self.manifest.get(job_id)
+        if row is None:
+            return None
+        record = self.store.get(row["content_hash"]) if row["content_hash"] else None
+        return {
+            "job_id": job_id,
+            "filename": row["filename"],
+            "molecule": row["molecule"],
+            "status": row["status"],
+            "total_pages": row["pages"],
+            "pages_done": row["pages"],
+            "characters": row["characters"],
+            "truncated": record["truncated"] if record else None,
+            "content_hash": row["content_hash"],
+            "cached": False,
+            "reused_pages": 0,
+            "near_duplicate_of": record.get("near_duplicate_of") if record else None,
+            "error": None,
+            "created_at": row["uploaded_at"],
+            "finished_at": row["finished_at"],
+            "insights": record["insights"] if record else None
+        }
+    
+    def _plan_reuse(self, job, page_keys):
+        """Reuse plan for a document's pages (DocumentExtractor planner)"""
+        if not job.content_hash:
+            return None
+        plan, job.near_duplicate_of = self.store.plan_reuse(job.content_hash, page_keys)
+        return plan
+    
+    def _on_extracted(self, job):
+        """Cache a finished extraction by content hash and attach it to its molecule"""
+        if job.content_hash:
+            if job.near_duplicate_of is None:
+                job.near_duplicate_of = self.store.find_near_duplicate(job.page_keys, exclude=job.content_hash)
+            job.text_path = self.store.record_extraction(
+                job.content_hash, job.text_path, job.filename, job.pages_done, job.characters,
+                job.truncated, job.insights, job.page_keys, job.near_duplicate_of
+            )
+        self._record_document(job)
+    
+    def _on_finished(self, job):
+        self.manifest.sync(job)
+    
+    def _record_document(self, job):
+        """Add a finished document to the retrieval indexes under its molecule"""
+        self._index_document(job.content_hash or job.job_id, job.text_path, job.molecule, job.filename)
+    
+    def document_ids(self, molecule):
+        """Content ids of a molecule's extracted documents (part of analysis fingerprints)"""
+        return tuple(doc["key"] for doc in self.index.documents(molecule))
+    
+    def documents_for(self, molecule, max_chars=None):
+        """
+        Extracted text of a molecule's uploaded documents
+        
+        Args:
+            molecule: Molecule name
+            max_chars: Characters read per document (default ANALYSIS_CHARS)
+            
+        Returns:
+            List of document text excerpts
+        """
+        max_chars = max_chars or DOCUMENT_CONFIG['ANALYSIS_CHARS']
+        texts = []
+        for doc in self.index.documents(molecule):
+            try:
+                with open(doc["text_path"], encoding='utf-8', errors='replace') as f:
+                    texts.append(f.read(max_chars))
+            except OSError as e:
+                logger.warning(f"Extracted text unavailable for {doc['filename']}: {str(e)}")
+        return texts
     
     def save_upload(self, file_obj, molecule):
         """
@@ -104,23 +369,23 @@ class PDFParser:
             logger.error(f"Error saving file: {str(e)}")
             return None
     
-    def get_upload_history(self, molecule=None):
-        """Get history of uploaded documents"""
-        try:
-            uploads = []
-            for filename in os.listdir(self.upload_dir):
-                if filename.endswith('.pdf'):
-                    file_path = os.path.join(self.upload_dir, filename)
-                    file_stat = os.stat(file_path)
-                    
-                    if molecule is None or molecule.lower() in filename.lower():
-                        uploads.append({
-                            "filename": filename,
-                            "size": file_stat.st_size,
-                            "uploaded": datetime.fromtimestamp(file_stat.st_mtime).isoformat()
-                        })
+    def get_upload_history(self, molecule=None, limit=50, cursor=None):
+        """
+        History of uploaded documents, newest first, from the upload manifest
+        
+        Args:
+            molecule: Optional molecule name
+            limit: Page size
+            cursor: `next_cursor` of the previous page
             
-            return sorted(uploads, key=lambda x: x['uploaded'], reverse=True)
-        except Exception as e:
+        Returns:
+            Dict with uploads, next_cursor and total
+            
+        Raises:
+            ValueError: if `cursor` is not a valid cursor
+        """
+        try:
+            return self.manifest.page(molecule, limit=limit, cursor=cursor)
+        except sqlite3.Error as e:
             logger.error(f"Error getting upload history: {str(e)}")
-            return []
+            return {"uploads": [], "next_cursor": None, "total": 0}
@@ -0,0 +1,115 @@
+"""
+Projection - `fields=` / `exclude=` selection of response data
+
+A spec is a comma separated list (or a JSON list) of dotted paths, e.g.
+`fields=mit.innovation_score,fto_analysis`. `fields` keeps only the
+listed paths, `exclude` drops them; when both are given the exclusions
+apply within the kept fields. A path through a list applies to each
+element (`patents.patent_id`). Paths that do not exist select nothing.
+
+Endpoints use `top_level()` to find which top-level fields a projection
+can return, and skip computing the others.
+"""
+
+
+def _parse(spec):
+    """Path tree of a spec: {"mit": {"innovation_score": {}}, "fto_analysis": {}}; {} selects a whole subtree"""
+    if spec is None or spec == "":
+        return None
+    paths = spec.split(",") if isinstance(spec, str) else spec
+    if not isinstance(paths, (list, tuple)) or not all(isinstance(p, str) for p in paths):
+        raise ValueError("fields / exclude must be a comma separated string or a list of strings")
+    tree = {}
+    for path in paths:
+        parts = [part.strip() for part in path.split(".")]
+        if not all(parts):
+            if path.strip():
+                raise ValueError(f"Invalid field path: {path}")
+            continue
+        node = tree
+        for i, part in enumerate(parts):
+            if part in node and not node[part]:
+                break  # the whole subtree is already selected
+            if i == len(parts) - 1:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree or None
+
+
+def _select(value, tree):
+    if isinstance(value, dict):
+        return {key: value[key] if not sub else _select(value[key], sub)
+                for key, sub in tree.items()
+                if key in value and (not sub or isinstance(value[key], (dict, list)))}
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    return value
+
+
+def _drop(value, tree):
+    if isinstance(value, dict):
+        return {key: item if key not in tree else _drop(item, tree[key])
+                for key, item in value.items() if key not in tree or tree[key]}
+    if isinstance(value, list):
+        return [_drop(item, tree) for item in value]
+    return value
+
+
+class Projection:
+    """Parsed `fields` / `exclude` specs"""
+
+    def __init__(self, fields=None, exclude=None):
+        """
+        Args:
+            fields: Paths to keep (None keeps everything)
+            exclude: Paths to drop
+
+        Raises:
+            ValueError: for a malformed spec
+        """
+        self.fields = _parse(fields)
+        self.exclude = _parse(exclude)
+
+    @classmethod
+    def from_params(cls, *sources):
+        """Projection from request parameters; `fields` and `exclude` are each taken from the first source setting them"""
+        fields = exclude = None
+        for source in sources:
+            if source:
+                fields = fields if fields is not None else source.get('fields')
+                exclude = exclude if exclude is not None else source.get('exclude')
+        return cls(fields, exclude)
+
+    def __bool__(self):
+        return self.fields is not None or self.exclude is not None
+
+    def keeps(self, key):
+        """Whether the projection can return anything of top-level field `key`"""
+        if self.fields is not None and key not in self.fields:
+            return False
+        return self.exclude is None or key not in self.exclude or bool(self.exclude[key])
+
+    def top_level(self, available):
+        """
+        Top-level fields of `available` the projection can return
+
+        Returns:
+            Set of field names
+        """
+        return {key for key in available if self.keeps(key)}
+
+    def unknown(self, available):
+        """Top-level names in the specs that are not in `available`"""
+        named = set(self.fields or ()) | set(self.exclude or ())
+        return sorted(named - set(available))
+
+    def apply(self, value):
+        """
+        Projected copy of `value` (unselected containers are not copied)
+        """
+        if self.fields is not None:
+            value = _select(value, self.fields)
+        if self.exclude is not None:
+            value = _drop(value, self.exclude)
+        return value
@@ -0,0 +1,243 @@
+"""
+Response Encoding - fast JSON and compression for API responses
+
+JSON is encoded by the fastest installed encoder (orjson, then ujson,
+then the standard library) with Flask's conversions for dates, UUIDs,
+decimals and dataclasses. With the standard library encoder, sub-objects
+referenced more than once in one value are encoded once and their text
+reused: the query result carries market, trade, patents, trials and web
+both at the top level and inside `mit`, as the same objects.
+
+Bodies above a size threshold are compressed with brotli (when installed)
+or gzip, as negotiated from Accept-Encoding. Streamed responses (SSE) and
+file downloads are sent as they are.
+"""
+import gzip
+import json
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+from config import RESPONSE_CONFIG
+
+try:
+    import orjson
+except ImportError:  # optional dependency: ujson or the standard library is used without it
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # optional dependency
+    ujson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency: gzip only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Mimetypes worth compressing (prefixes)
+COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+ENCODERS = tuple(name for name, module in (("orjson", orjson), ("ujson", ujson), ("json", json)) if module)
+
+
+class JSONEncoder:
+    """Encodes values to compact UTF-8 JSON bytes, optionally each shared sub-object once"""
+
+    def __init__(self, name="auto", default=None, shared_depth=3):
+        """
+        Args:
+            name: "auto" (first of ENCODERS), "orjson", "ujson" or "json";
+                an encoder that is not installed falls back to "auto"
+            default: Called for values the encoder cannot serialize (as in json.dumps)
+            shared_depth: Dict nesting depth searched for sub-objects
+                referenced more than once (0 disables the search)
+        """
+        if name not in ENCODERS:
+            if name != "auto":
+                logger.warning(f"JSON encoder {name} is not installed, using {ENCODERS[0]}")
+            name = ENCODERS[0]
+        self.name = name
+        self.default = default
+        self.shared_depth = shared_depth
+
+    def encode(self, value, sort_keys=False):
+        """Encode one value with the selected encoder"""
+        if self.name == "orjson":
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(value, default=self.default, option=option)
+            except TypeError:
+                pass  # e.g. integers beyond 64 bits; the standard library encodes them (or raises)
+        elif self.name == "ujson":
+            try:
+                return ujson.dumps(value, ensure_ascii=False, sort_keys=sort_keys, default=self.default).encode("utf-8")
+            except (TypeError, OverflowError):
+                pass
+        return json.dumps(value, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"),
+                          default=self.default).encode("utf-8")
+
+    def dumps(self, value, sort_keys=False):
+        """
+        Encode `value`, encoding sub-objects it references more than once only once
+
+        Returns:
+            JSON bytes (the same document as encoding `value` directly)
+        """
+        shared = self._shared(value)
+        if not shared:
+            return self.encode(value, sort_keys)
+        splits = set()
+        self._find_splits(value, shared, 0, splits)
+        return self._spliced(value, shared, splits, {}, sort_keys)
+
+    def _shared(self, value):
+        """Ids of dicts and lists reached more than once through dicts within shared_depth"""
+        if not self.shared_depth or not isinstance(value, dict):
+            return set()
+        seen, shared = set(), set()
+        stack = [(value, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if id(node) in seen:
+                shared.add(id(node))
+                continue
+            seen.add(id(node))
+            # Lists are not descended into: walking long result lists would cost more than encoding them
+            if isinstance(node, dict) and depth < self.shared_depth:
+                stack.extend((child, depth + 1) for child in node.values()
+                             if child and isinstance(child, (dict, list)))
+        return shared
+
+    def _find_splits(self, node, shared, depth, splits):
+        """Adds the dicts on a path to a shared sub-object to `splits`; True if `node` is on one"""
+        if not isinstance(node, dict) or depth >= self.shared_depth or not all(isinstance(k, str) for k in node):
+            return False
+        found = False
+        for child in node.values():
+            if isinstance(child, (dict, list)) and (id(child) in shared or
+                                                    self._find_splits(child, shared, depth + 1, splits)):
+                found = True
+        if found:
+            splits.add(id(node))
+        return found
+
+    def _spliced(self, node, shared, splits, memo, sort_keys):
+        key = id(node)
+        if key in memo:
+            return memo[key]
+        if key in splits:
+            items = sorted(node.items()) if sort_keys else node.items()
+            encoded = b"{" + b",".join(
+                self.encode(name) + b":" + self._spliced(child, shared, splits, memo, sort_keys)
+                for name, child in items
+            ) + b"}"
+        else:
+            encoded = self.encode(node, sort_keys)
+        if key in shared:
+            memo[key] = encoded
+        return encoded
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Content coding to use for a client's Accept-Encoding header
+
+    Returns:
+        "br", "gzip" or None (send uncompressed)
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = (("br", brotli is not None), ("gzip", True))
+    best, best_q = None, 0.0
+    for coding, available in candidates:
+        q = weights.get(coding, wildcard)
+        if available and q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, encoding):
+    """Compress `body` bytes with a coding returned by `negotiate_encoding`"""
+    if encoding == "br":
+        return brotli.compress(body, quality=RESPONSE_CONFIG.get('BROTLI_QUALITY', 4))
+    return gzip.compress(body, compresslevel=RESPONSE_CONFIG.get('GZIP_LEVEL', 6), mtime=0)
+
+
+def compressible(mimetype, size):
+    """Whether a body of this mimetype and size is worth compressing"""
+    return size >= RESPONSE_CONFIG.get('COMPRESS_MIN_BYTES', 1024) and bool(mimetype) and \
+        mimetype.startswith(COMPRESSIBLE)
+
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a Flask response in place when the client accepts it
+
+    Streamed and pass-through (file) responses, responses that already
+    have a Content-Encoding and bodies below RESPONSE_CONFIG['COMPRESS_MIN_BYTES']
+    are left as they are.
+
+    Returns:
+        The response
+    """
+    if (response.is_streamed or response.direct_passthrough or response.status_code < 200
+            or response.status_code in (204, 206, 304) or "Content-Encoding" in response.headers):
+        return response
+    body = response.get_data()
+    if not compressible(response.mimetype, len(body)):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding with `JSONEncoder` (pretty-printed output in debug mode is unchanged)"""
+
+    sort_keys = RESPONSE_CONFIG.get('SORT_KEYS', False)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.encoder = JSONEncoder(RESPONSE_CONFIG.get('JSON_ENCODER', 'auto'), default=self.default)
+        # orjson / ujson encode a shared sub-object again faster than its text can be spliced in
+        self.encoder.shared_depth = RESPONSE_CONFIG.get('SHARED_DEPTH', 3) if self.encoder.name == "json" else 0
+
+    def dumps_bytes(self, obj):
+        """Compact JSON bytes for `obj`"""
+        return self.encoder.dumps(obj, sort_keys=self.sort_keys)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,719 @@
+"""
+Streaming - resumable Server-Sent Events for query streams
+
+Each streamed analysis runs once, in its own thread, into an
+`AnalysisStream`. Every event is serialized exactly once, consecutive LLM
+token deltas are merged into one `llm_token` frame per flush interval (or
+byte threshold), and every frame gets a monotonic SSE id
+(`<stream id>:<seq>`) and a place in a bounded replay buffer. Connections
+only read that buffer, so a browser that reconnects with `Last-Event-ID`
+resumes from the buffer instead of re-running the analysis.
+
+Analyses run on a bounded executor: past `max_active` running and
+`max_queued` waiting analyses new ones are rejected. A producer that gets
+a full replay buffer ahead of its reader waits for the reader, and an
+analysis nobody has been reading for `abandon_after` seconds is
+cancelled through its CancelToken, which stops the agents and the LLM
+stream at their next checkpoint.
+
+Streams started with `delta=True` send each payload once: a dict or list
+already sent as an earlier event's data (an agent payload, the MIT, ...)
+is replaced in later events by `{"$ref": <key of that event>}`, so the
+MIT event refers to the agent events and the `done` result to all of
+them (`reassemble` / frontend/src/utils/sseReassembly.js resolve them).
+
+`AsyncStreamRegistry` / `AsyncAnalysisStream` are the asyncio versions
+(used by asgi_app.py): analyses are tasks on the event loop, producers
+and readers are coroutines, and an abandoned analysis' task is cancelled.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+TOKEN_EVENT = "llm_token"
+
+# SSE comment sent while an analysis is idle, so proxies keep the connection open
+HEARTBEAT = ": keep-alive\n\n"
+
+
+class StreamCancelled(Exception):
+    """The analysis was cancelled (its client went away)"""
+
+
+class StreamRejected(Exception):
+    """Too many analyses are running or queued"""
+
+
+class CancelToken:
+    """Cancellation flag shared by an analysis, its agents and its LLM stream"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Sleep up to `timeout` seconds, waking early on cancellation; True if cancelled"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise StreamCancelled(self.reason)
+
+
+def encode_event(event):
+    """Serialize an event dict as JSON (compact); unserializable events become error events"""
+    try:
+        return json.dumps(event, separators=(',', ':'), default=str)
+    except (TypeError, ValueError) as e:
+        logger.error(f"Failed to serialize stream event: {str(e)}")
+        return json.dumps({"type": "error", "message": "Failed to serialize event"})
+
+
+def sse_frame(data, event_id=None):
+    """One SSE frame carrying a serialized event"""
+    if event_id is None:
+        return f"data: {data}\n\n"
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+
+class TokenCoalescer:
+    """Event emitter that serializes events once and micro-batches LLM token deltas"""
+
+    def __init__(self, sink, flush_interval=0.05, max_bytes=1024):
+        """
+        Args:
+            sink: Callable receiving each serialized event (JSON text), in order
+            flush_interval: Seconds token deltas may be held back before they
+                are sent (0 sends every delta on its own)
+            max_bytes: Buffered token text (UTF-8 bytes) that forces a flush
+        """
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._parts = []
+        self._size = 0
+        self._deadline = None
+        self.events = 0
+        self.tokens = 0
+
+    def __call__(self, event):
+        with self._lock:
+            self.events += 1
+            if isinstance(event, dict) and event.get("type") == TOKEN_EVENT:
+                self.tokens += 1
+                if self.flush_interval > 0:
+                    text = event.get("data") or ""
+                    if not self._parts:
+                        self._deadline = time.monotonic() + self.flush_interval
+                    self._parts.append(text)
+                    self._size += len(text.encode('utf-8'))
+                    if self._size >= self.max_bytes or time.monotonic() >= self._deadline:
+                        self._flush()
+                    return
+            # Keep order: buffered tokens go before the next event
+            self._flush()
+            self.sink(encode_event(event))
+
+    def _flush(self):
+        if self._parts:
+            self.sink(encode_event({"type": TOKEN_EVENT, "data": "".join(self._parts), "tokens": len(self._parts)}))
+            self._parts, self._size, self._deadline = [], 0, None
+
+    def due_in(self):
+        """Seconds until buffered deltas are due (None if nothing is buffered)"""
+        deadline = self._deadline
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def flush(self, force=False):
+        """
+        Send buffered deltas if they are due (or unconditionally with force)
+
+        Without force this never blocks: if the producer holds the lock it is
+        emitting, and flushes due deltas itself.
+        """
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            if self._parts and (force or time.monotonic() >= self._deadline):
+                self._flush()
+        finally:
+            self._lock.release()
+
+
+def event_key(event):
+    """Reference key of an event's payload: its type, plus the agent for agent events ("agent/iqvia")"""
+    agent = event.get("agent")
+    return f"{event.get('type')}/{agent}" if agent else event.get("type")
+
+
+def _payload_field(event):
+    return "result" if "result" in event else "data"
+
+
+class EventReferencer:
+    """
+    Replaces payloads sent by earlier events with `{"$ref": key}`
+
+    Payloads are matched by identity, so the producer must not mutate a
+    payload after emitting it (the pipeline never does).
+    """
+
+    def __init__(self, depth=2):
+        """
+        Args:
+            depth: Container nesting depth searched for already sent payloads
+        """
+        self.depth = depth
+        self._sent = {}     # id -> (key, payload); holding the payload keeps its id from being reused
+        self._lock = threading.Lock()
+        self.refs = 0
+
+    def __call__(self, event):
+        """
+        The event with already sent payloads replaced by references
+
+        Returns:
+            A new event dict when anything was replaced, else `event` itself
+        """
+        if not isinstance(event, dict) or event.get("type") == TOKEN_EVENT:
+            return event
+        field = _payload_field(event)
+        payload = event.get(field)
+        if not payload or not isinstance(payload, (dict, list)):
+            return event
+        with self._lock:
+            replaced = self._replace(payload, self.depth)
+            self._sent.setdefault(id(payload), (event_key(event), payload))
+        if replaced is payload:
+            return event
+        return {**event, field: replaced}
+
+    def _replace(self, value, depth):
+        sent = self._sent.get(id(value))
+        if sent is not None:
+            self.refs += 1
+            return {"$ref": sent[0]}
+        if depth <= 0:
+            return value
+        if isinstance(value, dict):
+            items = {key: self._replace(item, depth - 1) if item and isinstance(item, (dict, list)) else item
+                     for key, item in value.items()}
+            changed = any(items[key] is not value[key] for key in value)
+        elif isinstance(value, list):
+            items = [self._replace(item, depth - 1) if item and isinstance(item, (dict, list)) else item
+                     for item in value]
+            changed = any(new is not old for new, old in zip(items, value))
+        else:
+            return value
+        return items if changed else value
+
+
+def _is_ref(value):
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get("$ref"), str)
+
+
+def reassemble(events):
+    """
+    Resolve the `$ref`s of a delta stream's decoded events, in order
+
+    Args:
+        events: Event dicts as received
+
+    Returns:
+        Tuple of (events with every resolvable reference replaced by the
+        payload it names, sorted keys of references that could not be
+        resolved, e.g. because a stream_gap skipped their event)
+    """
+    sent, missing = {}, set()
+
+    def resolve(value):
+        if _is_ref(value):
+            key = value["$ref"]
+            if key in sent:
+                return sent[key]
+            missing.add(key)
+            return None
+        if isinstance(value, dict):
+            return {key: resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [resolve(item) for item in value]
+        return value
+
+    resolved = []
+    for event in events:
+        field = _payload_field(event)
+        if isinstance(event.get(field), (dict, list)):
+            event = {**event, field: resolve(event[field])}
+            sent[event_key(event)] = event[field]
+        resolved.append(event)
+    return resolved, sorted(missing)
+
+
+class AnalysisStream:
+    """One streamed analysis: id-stamped SSE frames in a bounded replay buffer"""
+
+    def __init__(self, stream_id, max_events=2048, flush_interval=0.05, max_bytes=1024, delta=False):
+        """
+        Args:
+            stream_id: Stream id (prefix of every event id)
+            max_events: Frames kept for replay; once full, the producer waits
+                for readers rather than dropping frames they have not seen
+            flush_interval: Token coalescing interval in seconds
+            max_bytes: Token text per coalesced frame
+            delta: Send already sent payloads as `$ref`s (EventReferencer)
+        """
+        self.stream_id = stream_id
+        self.delta = delta
+        self._referencer = EventReferencer() if delta else None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_token = CancelToken()
+        self._frames = deque(maxlen=max_events)    # (seq, frame text)
+        self._last_seq = 0
+        self._delivered = 0                         # highest seq handed to a reader
+        self.bytes = 0
+        self.stalls = 0
+        self.readers = 0
+        self.detached_at = time.monotonic()         # no reader since (None while one is attached)
+        self._cond = threading.Condition()
+        self._coalescer = TokenCoalescer(self._append, flush_interval, max_bytes)
+
+    def emit(self, event):
+        """
+        Event emitter for the analysis
+
+        Raises:
+            StreamCancelled: once the analysis has been cancelled
+        """
+        self.cancel_token.raise_if_cancelled()
+        self._coalescer(self._referencer(event) if self._referencer else event)
+
+    def _append(self, payload):
+        with self._cond:
+            if self._backlogged():
+                # Backpressure: wait for a reader instead of dropping unread frames
+                self.stalls += 1
+                while self._backlogged() and not self.cancel_token.is_set():
+                    self._cond.wait(1.0)
+            self._push(payload)
+
+    def _push(self, payload):
+        self._last_seq += 1
+        frame = sse_frame(payload, f"{self.stream_id}:{self._last_seq}")
+        self._frames.append((self._last_seq, frame))
+        self.bytes += len(frame)
+        self._notify()
+
+    def _notify(self):
+        """Wake readers and a waiting producer (called holding the lock)"""
+        self._cond.notify_all()
+
+    def _backlogged(self):
+        return len(self._frames) == self._frames.maxlen and self._frames[0][0] > self._delivered
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    def cancel(self, reason="cancelled"):
+        """Cancel the analysis; its next emit or cancellation checkpoint raises StreamCancelled"""
+        self.cancel_token.cancel(reason)
+        with self._cond:
+            self._notify()
+
+    def finish(self):
+        """Flush buffered tokens and mark the stream complete"""
+        self._coalescer.flush(force=True)
+        with self._cond:
+            self.finished_at = time.time()
+            self._notify()
+
+    def attach(self):
+        """Register a connected reader (an attached stream is never abandoned)"""
+        with self._cond:
+            self.readers += 1
+            self.detached_at = None
+
+    def detach(self):
+        with self._cond:
+            self.readers -= 1
+            if self.readers == 0:
+                self.detached_at = time.monotonic()
+
+    def read(self, after=0, timeout=15.0):
+        """
+        Frames after sequence number `after`, waiting up to `timeout` for new ones
+
+        While token deltas are buffered the reader sleeps until their flush
+        deadline rather than waking for every delta.
+
+        Args:
+            after: Last sequence number the client has seen
+            timeout: Seconds to wait when nothing new is available
+
+        Returns:
+            Tuple of (frames, last seq returned, frames missed because they
+            already left the replay buffer, whether the stream is complete
+            and the client has seen all of it)
+        """
+        end = time.monotonic() + timeout
+        while True:
+            self._coalescer.flush()
+            with self._cond:
+                if self._last_seq > after or self.finished:
+                    break
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                due = self._coalescer.due_in()
+                self._cond.wait(remaining if due is None else min(remaining, due))
+        return self._collect(after)
+
+    def _collect(self, after):
+        with self._cond:
+            if self._last_seq <= after:
+                return [], after, 0, self.finished
+            first = self._frames[0][0]
+            missed = max(0, first - after - 1)
+            frames = [frame for _, frame in itertools.islice(self._frames, max(0, after - first + 1), None)]
+            if self._last_seq > self._delivered:
+                self._delivered = self._last_seq
+                self._notify()
+            return frames, self._last_seq, missed, False
+
+
+class AsyncAnalysisStream(AnalysisStream):
+    """AnalysisStream owned by one event loop: its producer and readers are coroutines"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+
+    async def _wait_changed(self, timeout):
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def aemit(self, event):
+        """
+        Event emitter for coroutine producers; waits for readers instead of
+        blocking the loop when the replay buffer is full of unread frames
+
+        Raises:
+            StreamCancelled: once the analysis has been cancelled
+        """
+        self.cancel_token.raise_if_cancelled()
+        if self._backlogged():
+            self.stalls += 1
+            while self._backlogged() and not self.cancel_token.is_set():
+                await self._wait_changed(1.0)
+        self._coalescer(self._referencer(event) if self._referencer else event)
+
+    def _append(self, payload):
+        # aemit already waited for room; a token flush may add one frame more
+        with self._cond:
+            self._push(payload)
+
+    async def aread(self, after=0, timeout=15.0):
+        """Coroutine version of `read` (same arguments and return value)"""
+        end = time.monotonic() + timeout
+        while True:
+            self._coalescer.flush()
+            if self._last_seq > after or self.finished:
+                break
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            due = self._coalescer.due_in()
+            await self._wait_changed(remaining if due is None else min(remaining, due))
+        return self._collect(after)
+
+
+class StreamRegistry:
+    """Runs streamed analyses on a bounded executor and keeps them resumable for a while"""
+
+    def __init__(self, max_streams=256, ttl=300, max_events=2048, flush_interval=0.05, max_bytes=1024,
+                 max_active=16, max_queued=32, abandon_after=20.0):
+        """
+        Args:
+            max_streams: Streams kept (the oldest finished ones are dropped first)
+            ttl: Seconds a finished stream stays resumable
+            max_events: Replay buffer size per stream
+            flush_interval: Default token coalescing interval in seconds
+            max_bytes: Token text per coalesced frame
+            max_active: Analyses running at once (executor threads)
+            max_queued: Analyses waiting for a thread before new ones are rejected
+            abandon_after: Seconds without a connected reader before a running
+                analysis is cancelled (longer than a client's reconnect delay)
+        """
+        self.max_streams = max_streams
+        self.ttl = ttl
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.abandon_after = abandon_after
+        self._executor = ThreadPoolExecutor(max_workers=max_active, thread_name_prefix="stream")
+        self._lock = threading.Lock()
+        self._streams = OrderedDict()
+        self._pending = 0           # submitted analyses not finished yet
+        self._active = 0            # of which running on an executor thread
+        self._reaper = None
+        self.started = 0
+        self.resumed = 0
+        self.rejected = 0
+        self.outcomes = {"completed": 0, "failed": 0, "cancelled": 0}
+
+    def start(self, run, flush_interval=None, delta=False):
+        """
+        Run `run(emit, cancel)` once on the executor, streaming into a new AnalysisStream
+
+        The first event of every stream is `{"type": "stream", "stream_id": ...}`
+        (with `"delta": true` for delta streams); errors raised by `run`
+        become an `error` event. `cancel` is the stream's CancelToken.
+
+        Args:
+            run: Callable taking the stream's event emitter and cancel token
+            flush_interval: Token coalescing interval (default: the registry's)
+            delta: Send already sent payloads as `$ref`s
+
+        Returns:
+            AnalysisStream
+
+        Raises:
+            StreamRejected: if max_active analyses are running and max_queued waiting
+        """
+        self._admit()
+        stream = self._new_stream(AnalysisStream, flush_interval, delta)
+        try:
+            self._executor.submit(self._run, stream, run)
+        except RuntimeError:
+            self._settle(None)
+            raise
+        return stream
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_active + self.max_queued:
+                self.rejected += 1
+                raise StreamRejected(f"{self._pending} streamed analyses running or queued")
+            self._pending += 1
+            if self._reaper is None:
+                self._reaper = self._start_reaper()
+
+    def _new_stream(self, stream_class, flush_interval, delta=False):
+        stream = stream_class(
+            uuid.uuid4().hex[:16], self.max_events,
+            self.flush_interval if flush_interval is None else flush_interval, self.max_bytes, delta
+        )
+        first = {"type": "stream", "stream_id": stream.stream_id}
+        if delta:
+            first["delta"] = True
+        stream.emit(first)
+        with self._lock:
+            self._evict()
+            self._streams[stream.stream_id] = stream
+            self.started += 1
+        return stream
+
+    def _settle(self, outcome, was_active=False):
+        with self._lock:
+            self._pending -= 1
+            if was_active:
+                self._active -= 1
+            if outcome is not None:
+                self.outcomes[outcome] += 1
+
+    def _run(self, stream, run):
+        with self._lock:
+            self._active += 1
+        stream.started_at = time.time()
+        outcome = "completed"
+        try:
+            # Cancelled while queued: never start the pipeline
+            stream.cancel_token.raise_if_cancelled()
+            run(stream.emit, stream.cancel_token)
+        except StreamCancelled:
+            outcome = "cancelled"
+            logger.info(f"Stream {stream.stream_id} cancelled: {stream.cancel_token.reason}")
+        except Exception as e:
+            outcome = "failed"
+            logger.error(f"Stream {stream.stream_id} failed: {str(e)}")
+            try:
+                stream.emit({"type": "error", "message": str(e)})
+            except StreamCancelled:
+                pass
+        finally:
+            stream.finish()
+            self._settle(outcome, was_active=True)
+
+    def _start_reaper(self):
+        reaper = threading.Thread(target=self._reap, name="stream-reaper", daemon=True)
+        reaper.start()
+        return reaper
+
+    def _reap(self):
+        """Cancel analyses nobody is reading and drop expired ones"""
+        while True:
+            time.sleep(self._reap_interval())
+            for stream in self._abandoned():
+                stream.cancel(f"no client for {self.abandon_after:g}s")
+
+    def _reap_interval(self):
+        return min(1.0, self.abandon_after / 4)
+
+    def _abandoned(self):
+        """Running streams without a reader for abandon_after (expired streams are dropped)"""
+        now = time.monotonic()
+        with self._lock:
+            streams = list(self._streams.values())
+            self._evict(make_room=False)
+        return [stream for stream in streams
+                if not stream.finished and not stream.cancel_token.is_set() and stream.detached_at is not None
+                and now - stream.detached_at >= self.abandon_after]
+
+    def resume(self, last_event_id):
+        """
+        Stream and sequence number named by a Last-Event-ID
+
+        Returns:
+            Tuple of (AnalysisStream, seq), or (None, 0) if the id is
+            malformed or the stream is no longer kept
+        """
+        stream_id, _, seq = (last_event_id or "").strip().partition(":")
+        try:
+            seq = int(seq)
+        except ValueError:
+            return None, 0
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                return None, 0
+            self.resumed += 1
+        return stream, seq
+
+    def _evict(self, make_room=True):
+        now = time.time()
+        for stream_id, stream in list(self._streams.items()):
+            if stream.finished and now - stream.finished_at > self.ttl:
+                del self._streams[stream_id]
+        while make_room and len(self._streams) >= self.max_streams:
+            finished = next((sid for sid, s in self._streams.items() if s.finished), None)
+            # A running analysis is only dropped when every kept stream is running
+            del self._streams[finished if finished is not None else next(iter(self._streams))]
+
+    def get_stats(self):
+        """Executor load, admission and cancellation counts, and replay buffer usage"""
+        with self._lock:
+            streams = list(self._streams.values())
+            stats = {
+                "active": self._active,
+                "queued": self._pending - self._active,
+                "max_active": self.max_active,
+                "max_queued": self.max_queued,
+                "started": self.started,
+                **self.outcomes,
+                "rejected": self.rejected,
+                "resumed": self.resumed
+            }
+        stats.update({
+            "streams": len(streams),
+            "readers": sum(s.readers for s in streams),
+            "producer_stalls": sum(s.stalls for s in streams),
+            "bytes_framed": sum(s.bytes for s in streams),
+            "delta_streams": sum(1 for s in streams if s.delta),
+            "payload_refs": sum(s._referencer.refs for s in streams if s.delta),
+            "max_streams": self.max_streams,
+            "replay_events": self.max_events,
+            "ttl_seconds": self.ttl,
+            "abandon_after_seconds": self.abandon_after
+        })
+        return stats
+
+
+class AsyncStreamRegistry(StreamRegistry):
+    """StreamRegistry whose analyses are coroutines on the running event loop"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._executor = None
+        self._slots = None
+        self._tasks = {}
+
+    def start(self, run, flush_interval=None, delta=False):
+        """
+        Schedule `await run(emit, cancel)` as a task streaming into a new AsyncAnalysisStream
+
+        Must be called from the event loop. Same events, limits and errors
+        as `StreamRegistry.start`; `emit` is a coroutine function.
+        """
+        self._admit()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_active)
+        stream = self._new_stream(AsyncAnalysisStream, flush_interval, delta)
+        self._tasks[stream.stream_id] = asyncio.ensure_future(self._arun(stream, run))
+        return stream
+
+    async def _arun(self, stream, run):
+        outcome, active = "completed", False
+        try:
+            async with self._slots:
+                with self._lock:
+                    self._active += 1
+                active = True
+                stream.started_at = time.time()
+                stream.cancel_token.raise_if_cancelled()
+                await run(stream.aemit, stream.cancel_token)
+        except (StreamCancelled, asyncio.CancelledError):
+            outcome = "cancelled"
+            logger.info(f"Stream {stream.stream_id} cancelled: {stream.cancel_token.reason or 'task cancelled'}")
+        except Exception as e:
+            outcome = "failed"
+            logger.error(f"Stream {stream.stream_id} failed: {str(e)}")
+            if not stream.cancel_token.is_set():
+                stream.emit({"type": "error", "message": str(e)})
+        finally:
+            stream.finish()
+            self._tasks.pop(stream.stream_id, None)
+            self._settle(outcome, was_active=active)
+
+    def _start_reaper(self):
+        return asyncio.ensure_future(self._areap())
+
+    async def _areap(self):
+        while True:
+            await asyncio.sleep(self._reap_interval())
+            for stream in self._abandoned():
+                stream.cancel(f"no client for {self.abandon_after:g}s")
+                # Interrupt whatever the analysis is awaiting (agent, LLM read) right away
+                task = self._tasks.get(stream.stream_id)
+                if task is not None:
+                    task.cancel()
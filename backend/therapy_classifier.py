@@ -0,0 +1,189 @@
+"""
+Therapy Area Classifier - single-pass multi-pattern keyword tagging (Aho-Corasick)
+"""
+import bisect
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Suffixes accepted after a term so "tumor" also matches "tumors"
+_PLURAL_SUFFIXES = ("s", "es")
+
+
+def _lower(text):
+    """
+    Lower-cased text for matching
+
+    Returns:
+        Tuple of (lowered text, original index of each lowered character),
+        the index list being None when lowering keeps every character one
+        character long (e.g. not for "İ", which lowers to two)
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered, None
+    chars, positions = [], []
+    for i, ch in enumerate(text):
+        ch = ch.lower()
+        chars.append(ch)
+        positions.extend([i] * len(ch))
+    return "".join(chars), positions
+
+
+class TherapyAreaClassifier:
+    """
+    Tags therapy areas in free text using one Aho-Corasick automaton
+
+    All keywords and synonyms of every area are compiled into a single
+    automaton, so scanning costs O(text length + matches) regardless of how
+    many terms the dictionary holds. Matches must start on a word boundary
+    and end on one (optionally after a plural suffix).
+    """
+
+    def __init__(self, area_terms=None):
+        """
+        Args:
+            area_terms: Optional dict of therapy area -> list of terms
+        """
+        self._terms = []          # term id -> (term, area)
+        self._term_ids = {}       # (term, area) -> term id
+        self._tables = ([{}], [0], [()])   # goto, fail, output; replaced as a whole by build()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        for area, terms in (area_terms or {}).items():
+            self.add_terms(area, terms)
+
+    @property
+    def areas(self):
+        return sorted({area for _, area in self._terms})
+
+    def __len__(self):
+        return len(self._terms)
+
+    def add_terms(self, area, terms):
+        """Add terms for a therapy area; the automaton is rebuilt lazily"""
+        with self._lock:
+            for term in terms:
+                term = " ".join(str(term).lower().split())
+                if term and (term, area) not in self._term_ids:
+                    self._term_ids[(term, area)] = len(self._terms)
+                    self._terms.append((term, area))
+                    self._dirty = True
+
+    def build(self):
+        """Compile all terms into the goto/fail/output tables"""
+        with self._lock:
+            self._build()
+
+    def _build(self):
+        goto, outputs = [{}], [[]]
+        for term_id, (term, _) in enumerate(self._terms):
+            state = 0
+            for ch in term:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(term_id)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+                outputs[nxt].extend(outputs[fail[nxt]])
+
+        self._tables = (goto, fail, [tuple(o) for o in outputs])
+        self._dirty = False
+        logger.debug(f"Therapy classifier built: {len(self._terms)} terms, {len(goto)} states")
+
+    def scan(self, text):
+        """
+        Find all whole-word term occurrences in `text` in one pass
+
+        Returns:
+            List of (term_id, start, end) tuples; offsets index `text` itself
+        """
+        if self._dirty:
+            # Concurrent first scans build once; the others wait and use the result
+            with self._lock:
+                if self._dirty:
+                    self._build()
+
+        text, positions = _lower(text)
+        (goto, fail, output), terms = self._tables, self._terms
+        length = len(text)
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+            for term_id in output[state]:
+                start = i - len(terms[term_id][0]) + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                end = i + 1
+                if end < length and text[end].isalnum():
+                    for suffix in _PLURAL_SUFFIXES:
+                        tail = end + len(suffix)
+                        if text.startswith(suffix, end) and (tail >= length or not text[tail].isalnum()):
+                            end = tail
+                            break
+                    else:
+                        continue
+                if positions is not None:
+                    start, end = positions[start], positions[end - 1] + 1
+                matches.append((term_id, start, end))
+        return matches
+
+    def classify(self, sources):
+        """
+        Tag therapy areas across several named text sources in a single scan
+
+        Args:
+            sources: Dict of source name -> list of text strings
+
+        Returns:
+            List of {"area", "mentions", "matched_terms", "sources"} sorted by
+            mentions (descending)
+        """
+        segments, offsets, owners = [], [], []
+        position = 0
+        for source, texts in sources.items():
+            for text in texts or []:
+                if not text:
+                    continue
+                offsets.append(position)
+                owners.append(source)
+                segments.append(str(text))
+                position += len(segments[-1]) + 1
+
+        found = {}
+        for term_id, start, _ in self.scan("\n".join(segments)):
+            term, area = self._terms[term_id]
+            source = owners[bisect.bisect_right(offsets, start) - 1]
+            entry = found.setdefault(area, {"area": area, "mentions": 0, "matched_terms": set(), "sources": set()})
+            entry["mentions"] += 1
+            entry["matched_terms"].add(term)
+            entry["sources"].add(source)
+
+        results = []
+        for entry in found.values():
+            entry["matched_terms"] = sorted(entry["matched_terms"])
+            entry["sources"] = sorted(entry["sources"])
+            results.append(entry)
+        return sorted(results, key=lambda e: (-e["mentions"], e["area"]))
@@ -3,6 +3,8 @@ Unmet Needs Analyzer - Identifies therapeutic gaps and opportunities
 """
 import logging
 
+from therapy_classifier import TherapyAreaClassifier
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,8 +21,24 @@ class UnmetNeedsAnalyzer:
             'respiratory': ['asthma', 'copd', 'bronchitis', 'pneumonia'],
             'gastrointestinal': ['crohn', 'ulcerative', 'ibd', 'gastric']
         }
+        self.therapy_synonyms = {
+            'cardiovascular': ['cardiac', 'cardiovascular', 'myocardial', 'atrial fibrillation', 'heart failure', 'stroke'],
+            'oncology': ['oncology', 'neoplasm', 'leukemia', 'melanoma', 'metastatic', 'malignancy'],
+            'neurology': ['dementia', 'multiple sclerosis', 'migraine', 'neuropathy', 'neurodegenerative'],
+            'endocrinology': ['insulin', 'obesity', 'glycemic', 'type 2 diabetes', 'endocrine'],
+            'infectious': ['viral', 'bacterial', 'hiv', 'hepatitis', 'sepsis', 'antimicrobial'],
+            'respiratory': ['pulmonary', 'lung', 'cystic fibrosis', 'respiratory'],
+            'gastrointestinal': ['colitis', 'inflammatory bowel', 'irritable bowel', 'gastrointestinal']
+        }
+        
+        # One automaton over every keyword and synonym
+        self.therapy_classifier = TherapyAreaClassifier()
+        for area in self.therapy_keywords:
+            self.therapy_classifier.add_terms(area, self.therapy_keywords[area])
+            self.therapy_classifier.add_terms(area, self.therapy_synonyms.get(area, []))
     
-    def analyze_unmet_needs(self, market_data, clinical_data, patent_data, web_data):
+    def analyze_unmet_needs(self, market_data, clinical_data, patent_data, web_data,
+                            internal_data=None, documents=None):
         """
         Analyze multiple data sources to identify unmet needs
         
@@ -29,15 +47,20 @@ class UnmetNeedsAnalyzer:
             clinical_data: Clinical trials data
             patent_data: Patent information
             web_data: Web research findings
+            internal_data: Optional internal insights summary
+            documents: Optional list of uploaded document texts
             
         Returns:
             Dictionary with identified unmet needs and opportunities
         """
+        therapy_areas = self.classify_therapy_areas(clinical_data, web_data, internal_data, documents)
+        
         unmet_needs = {
-            "therapy_gaps": self._identify_therapy_gaps(market_data, clinical_data),
+            "therapy_areas": therapy_areas,
+            "therapy_gaps": self._identify_therapy_gaps(market_data, clinical_data, therapy_areas),
             "patient_populations": self._identify_underserved_populations(clinical_data),
             "dosage_opportunities": self._identify_dosage_opportunities(patent_data),
-            "indication_opportunities": self._identify_new_indications(web_data, patent_data),
+            "indication_opportunities": self._identify_new_indications(web_data, patent_data, therapy_areas),
             "safety_gaps": self._identify_safety_gaps(clinical_data),
             "opportunity_score": 0
         }
@@ -48,7 +71,31 @@ class UnmetNeedsAnalyzer:
         logger.info(f"Unmet needs analysis complete. Opportunity Score: {unmet_needs['opportunity_score']}")
         return unmet_needs
     
-    def _identify_therapy_gaps(self, market_data, clinical_data):
+    def classify_therapy_areas(self, clinical_data, web_data, internal_data=None, documents=None):
+        """
+        Tag therapy areas mentioned across trials, literature, internal notes and documents
+        
+        Returns:
+            List of {"area", "mentions", "matched_terms", "sources"} sorted by mentions
+        """
+        trials = clinical_data if isinstance(clinical_data, list) else []
+        papers = web_data.get('top_papers', []) if isinstance(web_data, dict) else []
+        
+        internal_texts = []
+        if isinstance(internal_data, dict):
+            internal_texts.extend(str(t) for t in internal_data.get('key_takeaways') or [])
+            for key in ('strategic_implications', 'internal_notes', 'summary'):
+                if internal_data.get(key):
+                    internal_texts.append(str(internal_data[key]))
+        
+        return self.therapy_classifier.classify({
+            "trials": [t.get('title', '') for t in trials if isinstance(t, dict)],
+            "literature": [p.get('title', '') for p in papers if isinstance(p, dict)],
+            "internal": internal_texts,
+            "documents": list(documents or [])
+        })
+    
+    def _identify_therapy_gaps(self, market_data, clinical_data, therapy_areas=None):
         """Identify gaps in current therapeutic options"""
         gaps = []
         
@@ -73,6 +120,16 @@ class UnmetNeedsAnalyzer:
                     "potential_impact": "First-mover advantage possible"
                 })
         
+        # Areas discussed in literature/internal evidence but without trials
+        for area in therapy_areas or []:
+            if "trials" not in area["sources"]:
+                gaps.append({
+                    "gap": f"No clinical trials in {area['area']}",
+                    "significance": "Medium",
+                    "description": f"Evidence mentions {', '.join(area['matched_terms'])} but no trial targets it",
+                    "potential_impact": "Repurposing signal worth validating"
+                })
+        
         return gaps
     
     def _identify_underserved_populations(self, clinical_data):
@@ -129,9 +186,18 @@ class UnmetNeedsAnalyzer:
         
         return opportunities[:3]  # Return top 3
     
-    def _identify_new_indications(self, web_data, patent_data):
+    def _identify_new_indications(self, web_data, patent_data, therapy_areas=None):
         """Identify potential new indications for molecule"""
-        indications = []
+        indications = [
+            {
+                "indication": f"{area['area'].title()} repurposing",
+                "clinical_rationale": f"Mentioned {area['mentions']}x across {', '.join(area['sources'])}",
+                "patient_population": "To be sized",
+                "market_opportunity": "To be assessed",
+                "regulatory_pathway": "505(b)(2) new indication"
+            }
+            for area in (therapy_areas or [])[:3]
+        ]
         
         # Simulate finding new indication opportunities
         potential_indications = [
@@ -158,7 +224,7 @@ class UnmetNeedsAnalyzer:
             }
         ]
         
-        return potential_indications
+        return indications + potential_indications
     
     def _identify_safety_gaps(self, clinical_data):
         """Identify safety-related opportunities"""
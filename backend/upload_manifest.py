@@ -0,0 +1,243 @@
+"""
+Upload Manifest - persistent, indexed record of uploaded documents
+
+One SQLite row per upload holds its metadata and pointers to its
+extraction (content hash, extracted-text file, job id). Rows are indexed
+by (molecule, upload time) and paged with keyset cursors, so a history
+lookup reads only the rows it returns instead of scanning the uploads
+directory.
+"""
+import base64
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTENSIONS = ('.pdf', '.txt', '.docx')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT UNIQUE,
+    molecule TEXT,
+    molecule_key TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_type TEXT,
+    size INTEGER,
+    content_hash TEXT,
+    status TEXT,
+    pages INTEGER,
+    characters INTEGER,
+    text_path TEXT,
+    uploaded_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_molecule_time ON uploads (molecule_key, uploaded_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_uploads_time ON uploads (uploaded_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS upload_counts (
+    molecule_key TEXT PRIMARY KEY,
+    uploads INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS manifest_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = ("id", "job_id", "molecule", "filename", "file_type", "size", "content_hash",
+            "status", "pages", "characters", "uploaded_at", "finished_at")
+
+# Key of the all-molecules total in upload_counts
+_ALL = "\0"
+
+
+def _molecule_key(molecule):
+    return (molecule or "").strip().lower()
+
+
+def _encode_cursor(uploaded_at, row_id):
+    return base64.urlsafe_b64encode(f"{uploaded_at}|{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        uploaded_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return uploaded_at, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+class UploadManifest:
+    """SQLite-backed upload history, indexed by molecule and upload time"""
+
+    def __init__(self, db_path, upload_dir=None):
+        """
+        Args:
+            db_path: SQLite database file
+            upload_dir: Uploads directory to backfill from on first use
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        if upload_dir:
+            self._backfill(upload_dir)
+
+    def sync(self, job, size=None):
+        """
+        Insert or refresh the row of an extraction job
+
+        Safe to call in any order from the upload request and the job's
+        completion: the job's current state is read under the manifest
+        lock, so the last writer always records the latest state.
+
+        Args:
+            job: ExtractionJob
+            size: Upload size in bytes (kept if omitted)
+        """
+        with self._lock, self._conn:
+            values = (
+                job.molecule, _molecule_key(job.molecule), job.filename,
+                os.path.splitext(job.filename)[1].lower().lstrip('.'), size, job.content_hash,
+                job.status, job.pages_done, job.characters,
+                job.text_path if job.status == "done" else None,
+                job.created_at, job.finished_at
+            )
+            cursor = self._conn.execute(
+                "UPDATE uploads SET status = ?, pages = ?, characters = ?, text_path = ?, "
+                "finished_at = ?, size = COALESCE(?, size) WHERE job_id = ?",
+                (values[6], values[7], values[8], values[9], values[11], size, job.job_id)
+            )
+            if cursor.rowcount == 0:
+                self._conn.execute(
+                    "INSERT INTO uploads (molecule, molecule_key, filename, file_type, size, content_hash, "
+                    "status, pages, characters, text_path, uploaded_at, finished_at, job_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    values + (job.job_id,)
+                )
+                self._increment(values[1])
+
+    def _increment(self, molecule_key, by=1):
+        for key in {molecule_key, _ALL}:
+            self._conn.execute(
+                "INSERT INTO upload_counts (molecule_key, uploads) VALUES (?, ?) "
+                "ON CONFLICT(molecule_key) DO UPDATE SET uploads = uploads + excluded.uploads",
+                (key, by)
+            )
+
+    def get(self, job_id):
+        """Manifest row of an upload by job id (with its text_path), or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM uploads WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def completed(self):
+        """
+        Finished uploads with extracted text, oldest first
+
+        Returns:
+            List of (molecule, content_hash, job_id, filename, text_path) tuples
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT molecule, content_hash, job_id, filename, text_path FROM uploads "
+                "WHERE status = 'done' AND text_path IS NOT NULL ORDER BY uploaded_at, id"
+            ).fetchall()
+
+    def page(self, molecule=None, limit=50, cursor=None):
+        """
+        One page of upload history, newest first
+
+        Args:
+            molecule: Optional molecule name (case-insensitive exact match)
+            limit: Maximum rows to return
+            cursor: `next_cursor` of the previous page
+
+        Returns:
+            Dict with uploads, next_cursor (None on the last page) and total
+
+        Raises:
+            ValueError: on a malformed cursor
+        """
+        clauses, params = [], []
+        if molecule is not None:
+            clauses.append("molecule_key = ?")
+            params.append(_molecule_key(molecule))
+        if cursor:
+            uploaded_at, row_id = _decode_cursor(cursor)
+            clauses.append("(uploaded_at < ? OR (uploaded_at = ? AND id < ?))")
+            params.extend([uploaded_at, uploaded_at, row_id])
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM uploads {where}"
+                f"ORDER BY uploaded_at DESC, id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+            total = self._conn.execute(
+                "SELECT uploads FROM upload_counts WHERE molecule_key = ?",
+                (_ALL if molecule is None else _molecule_key(molecule),)
+            ).fetchone()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]["uploaded_at"], rows[-1]["id"])
+        return {
+            "uploads": [self._to_dict(row) for row in rows],
+            "next_cursor": next_cursor,
+            "total": total["uploads"] if total else 0
+        }
+
+    @staticmethod
+    def _to_dict(row):
+        data = {column: row[column] for column in _COLUMNS if column != "id"}
+        data["uploaded"] = row["uploaded_at"]
+        if row["job_id"]:
+            data["insights_url"] = f"/api/v1/upload/{row['job_id']}"
+        return data
+
+    def _backfill(self, upload_dir):
+        """Import uploads saved before the manifest existed (runs once)"""
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT value FROM manifest_meta WHERE key = 'backfilled'"
+            ).fetchone()
+        if done:
+            return
+        rows = []
+        with os.scandir(upload_dir) as entries:
+            files = [entry for entry in entries
+                     if entry.is_file() and entry.name.lower().endswith(DOCUMENT_EXTENSIONS)]
+        for entry in files:
+            stat = entry.stat()
+            # Nothing recorded the molecule of these files and their names ("<molecule>_<name>",
+            # sanitised) cannot be split reliably, so they are listed only in the all-molecules history
+            uploaded_at = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+            rows.append((
+                None, _molecule_key(None), entry.name,
+                os.path.splitext(entry.name)[1].lower().lstrip('.'), stat.st_size,
+                # Naive UTC like the rows written by sync(), so both sort together
+                uploaded_at.replace(tzinfo=None).isoformat()
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO uploads (molecule, molecule_key, filename, file_type, size, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            for row in rows:
+                self._increment(row[1])
+            self._conn.execute("INSERT INTO manifest_meta (key, value) VALUES ('backfilled', ?)",
+                               (datetime.utcnow().isoformat(),))
+        if rows:
+            logger.info(f"Backfilled {len(rows)} existing uploads into the manifest")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
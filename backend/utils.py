@@ -1,5 +1,7 @@
 import json
 import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
 import logging
@@ -13,14 +15,16 @@ class CacheManager:
         self.ttl = ttl
         self.timestamps = {}
     
-    def get_key(self, molecule, prompt):
-        """Generate cache key from molecule and prompt"""
+    def get_key(self, molecule, prompt, variant=None):
+        """Generate cache key from molecule and prompt (and a variant such as the fields computed)"""
         key_str = f"{molecule}:{prompt}".lower()
+        if variant:
+            key_str += f":{variant}"
         return hashlib.md5(key_str.encode()).hexdigest()
     
-    def get(self, molecule, prompt):
+    def get(self, molecule, prompt, variant=None):
         """Get value from cache if not expired"""
-        key = self.get_key(molecule, prompt)
+        key = self.get_key(molecule, prompt, variant)
         if key in self.cache:
             if datetime.utcnow() < self.timestamps[key]:
                 logger.info(f"Cache hit for molecule: {molecule}")
@@ -32,9 +36,9 @@ class CacheManager:
                 logger.info(f"Cache expired for molecule: {molecule}")
         return None
     
-    def set(self, molecule, prompt, value):
+    def set(self, molecule, prompt, value, variant=None):
         """Store value in cache with expiration"""
-        key = self.get_key(molecule, prompt)
+        key = self.get_key(molecule, prompt, variant)
         self.cache[key] = value
         self.timestamps[key] = datetime.utcnow() + timedelta(seconds=self.ttl)
         logger.info(f"Cache set for molecule: {molecule}")
@@ -53,6 +57,68 @@ class CacheManager:
         }
 
 
+def fingerprint(*parts):
+    """Stable content fingerprint of JSON-like values"""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class FingerprintMemo:
+    """Thread-safe LRU memo of derived results keyed by input fingerprints"""
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Return the memoized value for key (None on miss)"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+    
+    def set(self, key, value):
+        """Memoize value under key, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_compute(self, key, compute):
+        """Return the memoized value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+    
+    def clear(self):
+        """Clear all memoized entries"""
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self):
+        """Get memo statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
 class RequestValidator:
     """Validates incoming requests"""
     
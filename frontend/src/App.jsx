@@ -3,6 +3,7 @@ import './App.css'
 import QueryPanel from './components/QueryPanel'
 import ResultsDisplay from './components/ResultsDisplay'
 import LoadingSpinner from './components/LoadingSpinner'
+import { createReassembler } from './utils/sseReassembly'
 
 function App() {
   const [results, setResults] = useState(null)
@@ -16,17 +17,35 @@ function App() {
 
     // Real-time streaming via Server-Sent Events (SSE)
     try {
-      const url = `http://localhost:8000/stream-query?molecule=${encodeURIComponent(molecule)}&prompt=${encodeURIComponent(prompt)}`
+      // delta=1: payloads already sent by an earlier event arrive as $refs, resolved by the reassembler
+      const url = `http://localhost:8000/stream-query?molecule=${encodeURIComponent(molecule)}&prompt=${encodeURIComponent(prompt)}&delta=1`
       const es = new EventSource(url)
+      const reassembler = createReassembler()
 
-      es.onmessage = (evt) => {
+      es.onmessage = async (evt) => {
         try {
-          const payload = JSON.parse(evt.data)
-          // Handle types: status, agent, mit, unmet_needs, fto, report, done, error, llm_token
+          const payload = reassembler.add(JSON.parse(evt.data))
+          // Handle types: stream, status, agent, mit, unmet_needs, fto, report, done, error, llm_token
+          if (payload.type === 'stream' || payload.type === 'stream_gap') return
+
           if (payload.type === 'done') {
-            setResults(payload.result)
-            setLoading(false)
             es.close()
+            let result = payload.result
+            if (reassembler.missing().length) {
+              // A reconnect skipped events the result refers to: fetch it in full
+              try {
+                const response = await fetch('http://localhost:8000/api/v1/query', {
+                  method: 'POST',
+                  headers: { 'Content-Type': 'application/json' },
+                  body: JSON.stringify({ molecule, prompt })
+                })
+                result = (await response.json()).data
+              } catch (err) {
+                setError('Failed to load the full result: ' + err.message)
+              }
+            }
+            setResults(result)
+            setLoading(false)
             return
           }
 
@@ -67,6 +86,8 @@ function App() {
       }
 
       es.onerror = (err) => {
+        // The browser reconnects on its own and resumes via Last-Event-ID
+        if (es.readyState === EventSource.CONNECTING) return
         console.error('EventSource error', err)
         setError('Streaming connection error')
         setLoading(false)
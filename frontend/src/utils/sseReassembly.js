@@ -0,0 +1,46 @@
+// Reassembly of /stream-query events sent with delta=1.
+//
+// A delta stream sends every payload once: a payload already sent as an
+// earlier event's data is replaced by {"$ref": "<key of that event>"},
+// where the key is the event type, plus the agent for agent events
+// ("agent/iqvia", "mit", "fto", ...). The MIT event refers to the agent
+// events and the done result to all of them.
+
+export const eventKey = (event) => (event.agent ? `${event.type}/${event.agent}` : event.type)
+
+const isRef = (value) =>
+  value !== null && typeof value === 'object' && !Array.isArray(value) &&
+  typeof value.$ref === 'string' && Object.keys(value).length === 1
+
+export function createReassembler() {
+  const sent = new Map()
+  const missing = new Set()
+
+  const resolve = (value) => {
+    if (isRef(value)) {
+      if (sent.has(value.$ref)) return sent.get(value.$ref)
+      // The referenced event was skipped (stream_gap)
+      missing.add(value.$ref)
+      return null
+    }
+    if (Array.isArray(value)) return value.map(resolve)
+    if (value !== null && typeof value === 'object') {
+      return Object.fromEntries(Object.entries(value).map(([key, item]) => [key, resolve(item)]))
+    }
+    return value
+  }
+
+  return {
+    // Returns the event with its references resolved, and remembers its payload
+    add(event) {
+      const field = 'result' in event ? 'result' : 'data'
+      const payload = event[field]
+      if (payload === null || typeof payload !== 'object') return event
+      const resolved = { ...event, [field]: resolve(payload) }
+      sent.set(eventKey(resolved), resolved[field])
+      return resolved
+    },
+    // Keys of references that could not be resolved so far
+    missing: () => [...missing]
+  }
+}